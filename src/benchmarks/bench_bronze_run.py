@@ -0,0 +1,134 @@
+"""
+End-to-end bronze runs (run_bronze: category pages, link extraction,
+streamed downloads, hashing, content store writes) against a local PBOC
+site stand-in and moto S3, fully offline.
+
+Scenarios, for each table count:
+    cold           empty bucket, no validators: every table is downloaded and stored
+    warm_unchanged validators from the previous run: every table answers 304
+    warm_changed   every table published a new version: all downloaded and stored
+    rehash         validators dropped, nothing changed: all downloaded, hashes match
+
+Results (wall time, throughput, request and byte counts, and the run's
+metrics summary) are written as JSON so runs can be compared over time.
+From the src directory:
+    python -m benchmarks.bench_bronze_run [--tables 10 100 1000] [--latency 0.005]
+    python -m benchmarks.bench_bronze_run --compare benchmarks/results/<earlier>.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from datetime import datetime, timezone
+import boto3
+from moto import mock_aws
+from common.s3_utils import S3Utility
+from common.metrics import metrics
+from layers.bronze.main import run_bronze
+from benchmarks.pboc_site import PbocSite
+
+BUCKET = 'bench-bucket'
+BRONZE_KEY = 'pboc/bronze/'
+VALIDATOR_KEY = f'{BRONZE_KEY}_manifests/http_validators.json'
+SCENARIOS = ['cold', 'warm_unchanged', 'warm_changed', 'rehash']
+
+def bench_config(site: PbocSite, max_workers: int) -> dict:
+    return {
+        'aws': {
+            's3_bucket': BUCKET,
+            'pboc': {'s3_bronze_key': BRONZE_KEY, 's3_content_store_key': f'{BRONZE_KEY}store/'},
+        },
+        'webscraping': {
+            'concurrency': {'max_workers': max_workers, 'max_in_flight_per_host': max_workers, 'min_request_interval': 0},
+            'http': {'max_retries': 0},
+            'scheduling': {'enabled': False}, # Every scenario checks every table
+            'urls': {'pboc': site.config_urls()},
+        },
+    }
+
+def run_scenario(name: str, site: PbocSite, config: dict) -> dict:
+    if name == 'warm_changed':
+        site.bump()
+    elif name == 'rehash':
+        S3Utility.client().delete_object(Bucket=BUCKET, Key=VALIDATOR_KEY)
+    site.reset_counters()
+    metrics.reset()
+    start = time.perf_counter()
+    bronze = run_bronze(config)
+    seconds = time.perf_counter() - start
+    result = bronze['result']
+    return {
+        'scenario': name,
+        'tables': site.tables,
+        'seconds': round(seconds, 4),
+        'tables_per_second': round(site.tables / seconds, 2),
+        'updated': len(result.updated),
+        'unchanged': len(result.unchanged),
+        'not_modified': len(result.not_modified),
+        'failed': len(result.failed),
+        'bytes_downloaded': result.bytes_downloaded,
+        'http_requests': site.requests,
+        'metrics': metrics.summary(),
+    }
+
+def run_suite(table_counts, xlsx_size: int, latency: float, max_workers: int) -> list:
+    results = []
+    for tables in table_counts:
+        # Fresh bucket per table count so every 'cold' run really is cold.
+        with mock_aws(), PbocSite(tables=tables, categories=max(1, tables // 50),
+                                  xlsx_size=xlsx_size, latency=latency) as site:
+            boto3.client('s3', region_name='us-east-1').create_bucket(Bucket=BUCKET)
+            S3Utility.set_client(None)
+            S3Utility.configure(region_name='us-east-1')
+            config = bench_config(site, max_workers)
+            for name in SCENARIOS:
+                outcome = run_scenario(name, site, config)
+                results.append(outcome)
+                print(f"{tables:>5} tables  {name:<15} {outcome['seconds']:8.3f} s  "
+                      f"{outcome['tables_per_second']:8.1f} tables/s  {outcome['http_requests']:>5} requests  "
+                      f"{outcome['bytes_downloaded'] / 1e6:8.2f} MB")
+            S3Utility.set_client(None)
+    return results
+
+def compare(results: list, previous_path: str) -> None:
+    with open(previous_path, 'r') as file:
+        previous = {(r['tables'], r['scenario']): r for r in json.load(file)['scenarios']}
+    print(f"\nCompared with {previous_path}:")
+    for outcome in results:
+        before = previous.get((outcome['tables'], outcome['scenario']))
+        if before is None:
+            continue
+        change = outcome['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+        print(f"{outcome['tables']:>5} tables  {outcome['scenario']:<15} "
+              f"{before['seconds']:8.3f} s -> {outcome['seconds']:8.3f} s  ({change:+.1%})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end bronze benchmarks.")
+    parser.add_argument('--tables', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--xlsx-size', type=int, default=64 * 1024, help="Bytes per synthetic spreadsheet")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds added to every response")
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--output', default='benchmarks/results')
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    output_dir = os.path.abspath(args.output)
+    started_at = datetime.now(timezone.utc)
+    results = run_suite(args.tables, args.xlsx_size, args.latency, args.max_workers)
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"bronze_{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    with open(path, 'w') as file:
+        json.dump({
+            'benchmark': 'bronze_run',
+            'created_at': started_at.isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'parameters': {'xlsx_size': args.xlsx_size, 'latency': args.latency, 'max_workers': args.max_workers},
+            'scenarios': results,
+        }, file, indent=1)
+    print(f"\nResults written to {path}")
+    if args.compare:
+        compare(results, args.compare)
@@ -0,0 +1,62 @@
+"""
+Link extraction over saved PBOC category pages: the old approach (two
+BeautifulSoup html.parser parses per page, one per extension) versus a
+single extract_links pass on each available backend.
+
+From the src directory:
+    python -m benchmarks.bench_link_extraction [iterations] [page.htm ...]
+Defaults to the fixture pages under tests/fixtures.
+"""
+import sys
+import glob
+import time
+import statistics
+from layers.bronze.links import BACKENDS, extract_links
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+EXTENSIONS = ['xlsx', 'htm']
+
+def beautifulsoup_twice(html: str) -> dict:
+    links = {}
+    for extension in EXTENSIONS:
+        soup = BeautifulSoup(html, 'html.parser')
+        found = links[extension] = {}
+        for table in soup.find_all('table', class_='data_table'):
+            for row in table.find_all('tr'):
+                cells = row.find_all('td')
+                if cells:
+                    for link in row.find_all('a', href=True):
+                        if link['href'].endswith(f'.{extension}'):
+                            found[cells[0].text.strip()] = link['href']
+    return links
+
+def time_pages(fn, pages: list, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for html in pages:
+            fn(html)
+        timings.append((time.perf_counter() - start) * 1000 / len(pages))
+    return timings
+
+def summarize(label: str, timings: list) -> None:
+    print(f"{label:<28} mean {statistics.mean(timings):7.3f} ms/page   median {statistics.median(timings):7.3f} ms/page")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    paths = sys.argv[2:] or sorted(glob.glob('tests/fixtures/pboc_*.htm'))
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            pages.append(file.read())
+    print(f"{len(pages)} page(s), {iterations} iterations")
+
+    if BeautifulSoup is not None:
+        summarize("bs4 html.parser x2", time_pages(beautifulsoup_twice, pages, iterations))
+    for backend in BACKENDS:
+        summarize(f"extract_links [{backend}]",
+                  time_pages(lambda html: extract_links(html, EXTENSIONS, backend=backend), pages, iterations))
@@ -0,0 +1,45 @@
+"""
+Per-call latency of S3Utility with a fresh boto3 client per call (the old
+behaviour) versus the shared cached client.
+
+Runs offline against moto. From the src directory:
+    python -m benchmarks.bench_s3_client [calls]
+"""
+import sys
+import time
+import statistics
+import boto3
+from moto import mock_aws
+from common.s3_utils import S3Utility
+
+BUCKET = 'bench-bucket'
+KEY = 'bronze/table_20240101.xlsx'
+
+def time_calls(fn, calls: int) -> list:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def summarize(label: str, timings: list) -> None:
+    print(f"{label:<28} mean {statistics.mean(timings):7.2f} ms   "
+          f"median {statistics.median(timings):7.2f} ms   first {timings[0]:7.2f} ms")
+
+def head_with_fresh_client():
+    boto3.client('s3', region_name='us-east-1').head_object(Bucket=BUCKET, Key=KEY)
+
+def head_with_cached_client():
+    S3Utility.client().head_object(Bucket=BUCKET, Key=KEY)
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with mock_aws():
+        setup_client = boto3.client('s3', region_name='us-east-1')
+        setup_client.create_bucket(Bucket=BUCKET)
+        setup_client.put_object(Bucket=BUCKET, Key=KEY, Body=b'x' * 1024)
+
+        S3Utility.configure(region_name='us-east-1')
+        summarize("fresh client per call", time_calls(head_with_fresh_client, calls))
+        summarize("cached S3Utility.client()", time_calls(head_with_cached_client, calls))
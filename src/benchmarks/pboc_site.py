@@ -0,0 +1,263 @@
+"""
+A local stand-in for the PBOC statistics site, for offline benchmarks.
+
+Serves category pages in the PBOC layout (a data_table with one row per
+table linking to .xlsx/.pdf/.htm files) and synthetic xlsx workbooks of a
+fixed size, with a configurable per-request latency. Each version of a
+table is a different real workbook (random values in a PBOC-like sheet), so
+bronze fingerprints and diffs them as it would the site's files. Spreadsheets carry
+ETag and Last-Modified headers and honour If-None-Match, like the real
+site; bump() changes some or all of them, as on a release day.
+
+    with PbocSite(tables=100, xlsx_size=64 * 1024, latency=0.005) as site:
+        site.config_urls()   # webscraping.urls.pboc section for config.yml
+        site.bump()          # every table changes
+"""
+import io
+import time
+import zlib
+import random
+import string
+import zipfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Iterable
+
+LAST_MODIFIED = 'Mon, 01 Jul 2024 00:00:00 GMT'
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+PERIODS = [f'{year}.{month:02d}' for year in (2023, 2024) for month in range(1, 13)]
+WORKBOOK_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<workbook xmlns="{SPREADSHEET_NS}" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+VALUE_CELLS = '<c><v>%.2f</v></c>' * len(PERIODS)
+
+def _text_cell(value: str) -> str:
+    return f'<c t="inlineStr"><is><t>{value}</t></is></c>'
+
+def synthetic_workbook(title: str, seed: str, size: int) -> bytes:
+    """
+    An xlsx workbook of about size bytes: a title, a unit and a header row
+    of monthly periods, then one row of random values per series, as many
+    as fit. The zip comment pads it to exactly size where possible. Equal
+    seeds give identical bytes.
+    """
+    rng = random.Random(seed)
+    head = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><worksheet xmlns="{SPREADSHEET_NS}"><sheetData>'
+            f'<row r="1">{_text_cell(title)}</row>'
+            f'<row r="2">{_text_cell("Unit: 100 million Yuan")}</row>'
+            f'<row r="3">{_text_cell("Item")}{"".join(_text_cell(period) for period in PERIODS)}</row>')
+    tail = '</sheetData></worksheet>'
+    # Track the deflated size of the sheet as it grows to stop near size.
+    budget = size - 1500 # Other parts and zip headers
+    compressor = zlib.compressobj(wbits=-15)
+    compressed = len(compressor.compress(head.encode('utf-8')))
+    rows = []
+    while not rows or len(rows) % 10 or compressed + len(compressor.copy().flush()) < budget:
+        cells = VALUE_CELLS % tuple(rng.random() * 1e6 for _ in PERIODS)
+        row = f'<row r="{len(rows) + 4}">{_text_cell(f"Series {len(rows) + 1}")}{cells}</row>'
+        compressed += len(compressor.compress(row.encode('utf-8')))
+        rows.append(row)
+
+    while True:
+        body = _package(head + ''.join(rows) + tail)
+        excess = len(body) - size
+        if excess <= 0 or len(rows) == 1:
+            break
+        # Drop the rows the estimate overshot by, then pack again.
+        rows = rows[:max(1, len(rows) - excess * len(rows) // len(body) - 1)]
+    return _package(head + ''.join(rows) + tail, padding=max(0, min(-excess, 0xFFFF)))
+
+def _package(sheet: str, padding: int = 0) -> bytes:
+    """The workbook parts zipped, with padding bytes of zip comment."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in WORKBOOK_PARTS.items():
+            archive.writestr(zipfile.ZipInfo(name, (2024, 7, 1, 0, 0, 0)), xml)
+        archive.writestr(zipfile.ZipInfo('xl/worksheets/sheet1.xml', (2024, 7, 1, 0, 0, 0)), sheet,
+                         compress_type=zipfile.ZIP_DEFLATED)
+        archive.comment = b' ' * padding
+    return buffer.getvalue()
+
+def table_title(index: int) -> str:
+    """Letters-only titles ('Table aab') so cleaned table names stay unique."""
+    letters = ''
+    for _ in range(3):
+        index, remainder = divmod(index, 26)
+        letters = string.ascii_lowercase[remainder] + letters
+    return f'Table {letters}'
+
+class PbocSite:
+
+    def __init__(self, tables: int = 10, categories: int = 1, xlsx_size: int = 64 * 1024, latency: float = 0.0):
+        self.tables = tables
+        self.categories = max(1, min(categories, tables))
+        self.xlsx_size = xlsx_size
+        self.latency = latency
+        self.versions = [0] * tables
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_served = 0
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    ############################################################################
+    # Content
+    ############################################################################
+    def bump(self, tables: Optional[Iterable[int]] = None) -> None:
+        """Publishes a new version of the given tables (default: all of them)."""
+        indexes = list(range(self.tables) if tables is None else tables)
+        for index in indexes:
+            self.versions[index] += 1
+        self._build(indexes)
+
+    def _build(self, indexes: Iterable[int]) -> None:
+        """Builds the current bodies up front, so requests never time workbook generation."""
+        for index in indexes:
+            self._bodies.pop((index, self.versions[index] - 1), None)
+            self.body(index)
+
+    def etag(self, index: int) -> str:
+        return f'"{index}-{self.versions[index]}"'
+
+    def body(self, index: int) -> bytes:
+        key = (index, self.versions[index])
+        if key not in self._bodies:
+            self._bodies[key] = synthetic_workbook(table_title(index), f'{index}:{self.versions[index]}', self.xlsx_size)
+        return self._bodies[key]
+
+    def category_page(self, category: int) -> bytes:
+        rows = []
+        for index in range(category, self.tables, self.categories):
+            rows.append(
+                f'<tr><td class="data_title">{table_title(index)}</td>'
+                f'<td><a href="/files/{index}/{index}.xlsx">xlsx</a></td>'
+                f'<td><a href="/files/{index}/{index}.pdf">pdf</a></td>'
+                f'<td><a href="/files/{index}/{index}.htm">htm</a></td></tr>'
+            )
+        return (
+            '<html><body><div class="portlet"><table class="data_table"><tbody>'
+            '<tr><th>Table</th><th>Excel</th><th>PDF</th><th>HTML</th></tr>'
+            + ''.join(rows) +
+            '</tbody></table></div></body></html>'
+        ).encode('utf-8')
+
+    ############################################################################
+    # Server
+    ############################################################################
+    @property
+    def root(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def config_urls(self) -> dict:
+        """The webscraping.urls.pboc section pointing at this site."""
+        return {
+            'base': self.root,
+            '2024': {
+                'base': f'{self.root}/en/index.html',
+                'extensions': {f'category-{category}': f'cat{category}' for category in range(self.categories)},
+            },
+        }
+
+    def start(self) -> "PbocSite":
+        self._build(range(self.tables))
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real site
+
+            def do_GET(self):
+                site._serve(self, head=False)
+
+            def do_HEAD(self):
+                site._serve(self, head=True)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = self.not_modified = self.bytes_served = 0
+
+    def _serve(self, handler: BaseHTTPRequestHandler, head: bool) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+        path = handler.path.split('?', 1)[0]
+        parts = path.strip('/').split('/')
+        headers = {}
+        status = 200
+        if len(parts) == 3 and parts[0] == 'en' and parts[1].startswith('cat'):
+            body = self.category_page(int(parts[1][3:]))
+            content_type = 'text/html; charset=utf-8'
+        elif len(parts) == 3 and parts[0] == 'files' and parts[2].endswith('.xlsx') and int(parts[1]) < self.tables:
+            index = int(parts[1])
+            headers = {'ETag': self.etag(index), 'Last-Modified': LAST_MODIFIED}
+            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            if handler.headers.get('If-None-Match') == self.etag(index):
+                status, body = 304, b''
+                with self._lock:
+                    self.not_modified += 1
+            else:
+                body = self.body(index)
+        else:
+            status, body, content_type = 404, b'not found', 'text/plain'
+
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if not head and body:
+            handler.wfile.write(body)
+            with self._lock:
+                self.bytes_served += len(body)
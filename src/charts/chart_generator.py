@@ -0,0 +1,140 @@
+import io
+import os
+import json
+import hashlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, List
+from common.s3_utils import S3Utility
+
+# Bump whenever rendering code or styling changes, so every chart is redrawn.
+STYLE_VERSION = '1'
+
+################################################################################
+# Jobs
+################################################################################
+class ChartJob:
+    """
+    One chart: a data slice (period index, one column per line) and a spec
+    such as {'title': ..., 'y_label': ..., 'format': 'png'}.
+    """
+
+    def __init__(self, name: str, data: pd.DataFrame, spec: dict):
+        self.name = name
+        self.data = data
+        self.spec = spec
+
+    @property
+    def format(self) -> str:
+        return self.spec.get('format', 'png')
+
+    def cache_key(self) -> str:
+        """SHA-256 of (data slice, chart spec, style version)."""
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(self.data, index=True).to_numpy().tobytes())
+        digest.update(json.dumps([str(column) for column in self.data.columns]).encode('utf-8'))
+        digest.update(json.dumps(self.spec, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(STYLE_VERSION.encode('utf-8'))
+        return digest.hexdigest()
+
+def render_chart(job: ChartJob) -> bytes:
+    """Renders a job to PNG/SVG bytes. Module-level so process pools can pickle it."""
+    import matplotlib
+    matplotlib.use('Agg') # Headless
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=job.spec.get('size', (8, 4.5)), dpi=job.spec.get('dpi', 100))
+    try:
+        for column in job.data.columns:
+            ax.plot(job.data.index, job.data[column], label=str(column), linewidth=1.5)
+        ax.set_title(job.spec.get('title', job.name))
+        ax.set_ylabel(job.spec.get('y_label', ''))
+        ax.grid(True, alpha=0.3)
+        if len(job.data.columns) > 1:
+            ax.legend(loc='best', fontsize='small')
+        fig.autofmt_xdate()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=job.format, bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+################################################################################
+# Generator
+################################################################################
+class ChartGenerator:
+    """
+    Renders charts only when their cache key is new. Rendered charts are
+    stored under {prefix}{key[:2]}/{key}.{format} in S3 (and in cache_dir
+    when given); an index {prefix}index.json maps chart name -> current key
+    for every chart generated so far, not only the latest run's. Charts that do need rendering are drawn in a process pool.
+    """
+
+    def __init__(self, bucket: str, prefix: str, cache_dir: Optional[str] = None, max_workers: Optional[int] = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._existing = None
+
+    def object_key(self, cache_key: str, fmt: str) -> str:
+        return f'{self.prefix}{cache_key[:2]}/{cache_key}.{fmt}'
+
+    @property
+    def index_key(self) -> str:
+        return f'{self.prefix}index.json'
+
+    def _local_path(self, object_key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, object_key.rsplit('/', 1)[-1])
+
+    def existing_keys(self) -> set:
+        """Every rendered chart in S3, from one listing."""
+        if self._existing is None:
+            self._existing = {obj['Key'] for obj in S3Utility.list_objects(self.bucket, self.prefix)}
+        return self._existing
+
+    def is_cached(self, object_key: str) -> bool:
+        local_path = self._local_path(object_key)
+        if local_path and os.path.exists(local_path):
+            return True
+        return object_key in self.existing_keys()
+
+    def generate(self, jobs: List[ChartJob]) -> Dict[str, str]:
+        """
+        Renders the jobs whose keys are not cached, uploads them, and returns
+        {chart name: S3 key} for every job.
+        """
+        keys = {job.name: self.object_key(job.cache_key(), job.format) for job in jobs}
+        stale = [job for job in jobs if not self.is_cached(keys[job.name])]
+        print(f"{len(stale)} of {len(jobs)} charts need rendering")
+
+        rendered = {}
+        for job, image in zip(stale, self._render_all(stale)):
+            rendered[keys[job.name]] = image
+            local_path = self._local_path(keys[job.name])
+            if local_path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(local_path, 'wb') as file:
+                    file.write(image)
+        # Runs for a subset of tables keep the other tables' entries.
+        raw_index = S3Utility.download_obj_s3(self.bucket, self.index_key)
+        index = json.loads(raw_index) if raw_index else {}
+        index.update(keys)
+        uploads = dict(rendered)
+        uploads[self.index_key] = json.dumps(index, indent=1, sort_keys=True)
+        S3Utility.upload_many(self.bucket, uploads).raise_for_failures()
+        self.existing_keys().update(rendered)
+        return keys
+
+    def _render_all(self, jobs: List[ChartJob]) -> List[bytes]:
+        if len(jobs) < 2 or self.max_workers < 2:
+            return [render_chart(job) for job in jobs]
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+                return list(executor.map(render_chart, jobs))
+        except OSError as e:
+            # e.g. Lambda, which has no /dev/shm for multiprocessing.
+            print(f"Process pool unavailable ({e}); rendering serially.")
+            return [render_chart(job) for job in jobs]
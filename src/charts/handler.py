@@ -0,0 +1,35 @@
+from typing import Optional, Iterable
+from charts.chart_generator import ChartGenerator
+from layers.gold.aggregator import GoldAggregator
+from layers.gold.visualizer import series_chart_jobs
+from layers.silver.ledger import SilverLedger
+from layers.silver import handler as silver_handler
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+
+def run(config: dict, tables: Optional[Iterable[str]] = None) -> dict:
+    """
+    Builds chart jobs from the gold aggregates of each table (default: every
+    table silver knows) and renders the ones whose data changed.
+    """
+    s3_bucket = config['aws']['s3_bucket']
+    pboc = config['aws']['pboc']
+    charts = config.get('charts') or {}
+    aggregator = GoldAggregator.from_config(config)
+    generator = ChartGenerator(
+        s3_bucket,
+        pboc.get('s3_charts_key', f"{pboc['s3_gold_key']}charts/"),
+        cache_dir=charts.get('cache_dir'),
+        max_workers=charts.get('max_workers')
+    )
+    if tables is None:
+        tables = SilverLedger.load_s3(s3_bucket, silver_handler.ledger_key(config)).entries
+    jobs = []
+    for table in tables:
+        jobs.extend(series_chart_jobs(aggregator.read_aggregates(table), table, years=charts.get('years', 5)))
+    return generator.generate(jobs)
+
+def lambda_handler(event, context):
+    config = load_config("common/config.yml")
+    S3Utility.from_config(config)
+    return run(config, tables=(event or {}).get('tables'))
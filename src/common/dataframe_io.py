@@ -0,0 +1,240 @@
+import io
+import os
+from typing import Any, Optional, Dict, List, Tuple, BinaryIO, TYPE_CHECKING
+from common.metrics import metrics
+
+# pandas (and pyarrow, for parquet) are imported by the functions that need
+# them, like the DataFrame helpers in s3_utils.
+if TYPE_CHECKING:
+    import pandas as pd
+
+################################################################################
+# Formats
+################################################################################
+# file_type -> (format, default compression). A file type is a format name
+# with an optional compression suffix ('csv.gz', 'jsonl.zst'); the same
+# strings are recognised as key extensions. Parquet compresses internally
+# (per column chunk), so its compression is a codec name, not a suffix.
+FORMATS = ('csv', 'jsonl', 'json', 'parquet', 'xlsx')
+COMPRESSION_SUFFIXES = {'gz': 'gzip', 'zst': 'zstd'}
+PARQUET_CODECS = ('zstd', 'snappy', 'gzip', 'lz4', 'brotli', 'none')
+DEFAULT_PARQUET_COMPRESSION = 'zstd'
+# Rows per parquet row group: small enough that predicate filters can skip
+# most of a large file, large enough to keep per-group metadata negligible.
+DEFAULT_ROW_GROUP_SIZE = 128 * 1024
+
+class DataFrameFormatError(Exception):
+    """Unsupported file type or compression."""
+
+def resolve_format(file_type: Optional[str] = None, key: Optional[str] = None,
+                   compression: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    (format, compression) from an explicit file_type or, failing that, the
+    key's extension: 'csv.gz' -> ('csv', 'gzip'), 'parquet' -> ('parquet',
+    'zstd'). An explicit compression wins over the suffix.
+    """
+    if file_type is None:
+        if key is None:
+            raise DataFrameFormatError("Either file_type or key is needed")
+        name = key.rsplit('/', 1)[-1].lower()
+        parts = name.split('.')
+        file_type = '.'.join(parts[-2:]) if len(parts) > 2 and parts[-1] in COMPRESSION_SUFFIXES else parts[-1]
+    fmt, _, suffix = file_type.lower().partition('.')
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in FORMATS:
+        raise DataFrameFormatError(f"Unsupported file format: {fmt}")
+    if suffix and suffix not in COMPRESSION_SUFFIXES:
+        raise DataFrameFormatError(f"Unsupported compression suffix: .{suffix}")
+
+    if compression is None:
+        compression = COMPRESSION_SUFFIXES.get(suffix)
+        if fmt == 'parquet':
+            compression = compression or DEFAULT_PARQUET_COMPRESSION
+    if compression == 'none' and fmt != 'parquet':
+        compression = None
+    if fmt == 'parquet':
+        if compression not in PARQUET_CODECS:
+            raise DataFrameFormatError(f"Unsupported parquet compression: {compression}")
+    elif fmt in ('xlsx', 'json') and compression is not None:
+        raise DataFrameFormatError(f"{fmt} does not take a compression")
+    elif compression not in (None, 'gzip', 'zstd'):
+        raise DataFrameFormatError(f"Unsupported compression: {compression}")
+    return fmt, compression
+
+################################################################################
+# Write
+################################################################################
+def write_dataframe(df: "pd.DataFrame", file_type: str, target: Optional[BinaryIO] = None,
+                    compression: Optional[str] = None, **options) -> BinaryIO:
+    """
+    Serializes df straight into target (a new BytesIO if None) and returns
+    it rewound, ready for upload_fileobj; no intermediate str/bytes copy of
+    the payload is made. A BytesIO target is truncated first, so one buffer
+    can be reused across many writes.
+
+        csv, csv.gz, csv.zst     no index; options go to to_csv
+        jsonl, jsonl.gz, ...     one record per line; options go to to_json
+        json                     pandas' column-oriented JSON (as before)
+        parquet                  pyarrow, zstd by default, dictionary-encoded
+                                 columns and row groups of row_group_size
+        xlsx                     a real workbook, one sheet (sheet_name)
+    """
+    fmt, compression = resolve_format(file_type, compression=compression)
+    if target is None:
+        target = io.BytesIO()
+    elif isinstance(target, io.BytesIO):
+        target.seek(0)
+        target.truncate()
+
+    with metrics.timer(f'dataframe.write.{fmt}.seconds'):
+        if fmt == 'csv':
+            options.setdefault('index', False)
+            df.to_csv(target, compression=compression, **options)
+        elif fmt == 'jsonl':
+            df.to_json(target, orient='records', lines=True, date_format='iso', compression=compression, **options)
+        elif fmt == 'json':
+            df.to_json(target, **options)
+        elif fmt == 'parquet':
+            _write_parquet(df, target, compression, **options)
+        else:
+            options.setdefault('index', False)
+            df.to_excel(target, **options)
+    metrics.observe(f'dataframe.write.{fmt}.bytes', target.tell(), unit='Bytes')
+    target.seek(0)
+    return target
+
+def _write_parquet(df: "pd.DataFrame", target: BinaryIO, compression: str, index: Optional[bool] = None,
+                   row_group_size: int = DEFAULT_ROW_GROUP_SIZE, use_dictionary: Any = True, **options) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=index)
+    pq.write_table(
+        table, target,
+        compression=None if compression == 'none' else compression,
+        use_dictionary=use_dictionary,
+        row_group_size=row_group_size,
+        **options
+    )
+
+################################################################################
+# Read
+################################################################################
+def read_dataframe(source: Any, file_type: str, compression: Optional[str] = None,
+                   columns: Optional[List[str]] = None, filters: Optional[list] = None,
+                   dtype: Optional[Dict[str, Any]] = None, **options) -> "pd.DataFrame":
+    """
+    Reads bytes or a binary file object written by write_dataframe.
+
+    columns   only these columns are decoded (parquet reads only their
+              column chunks; csv parses only them)
+    filters   parquet predicates in pyarrow's form, e.g.
+              [('period', '>=', pd.Timestamp('2024-01-01'))]; row groups
+              whose statistics rule the predicate out are skipped
+    dtype     {column: dtype}, applied while parsing csv/json and after
+              decoding otherwise
+    """
+    import pandas as pd
+
+    fmt, compression = resolve_format(file_type, compression=compression)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if filters is not None and fmt != 'parquet':
+        raise DataFrameFormatError(f"Predicate filters need parquet, not {fmt}")
+
+    with metrics.timer(f'dataframe.read.{fmt}.seconds'):
+        if fmt == 'parquet':
+            df = _read_parquet(source, columns, filters, **options)
+        elif fmt == 'csv':
+            df = pd.read_csv(source, compression=compression, usecols=columns, dtype=dtype, **options)
+            dtype = None
+        elif fmt == 'jsonl':
+            df = pd.read_json(source, orient='records', lines=True, compression=compression, dtype=dtype, **options)
+            dtype = None
+        elif fmt == 'json':
+            df = pd.read_json(source, dtype=dtype, **options)
+            dtype = None
+        else:
+            df = pd.read_excel(source, usecols=columns, dtype=dtype, **options)
+            dtype = None
+    if columns is not None and fmt in ('jsonl', 'json'):
+        df = df[columns]
+    if dtype:
+        df = df.astype(dtype)
+    return df
+
+def _read_parquet(source: Any, columns: Optional[List[str]], filters: Optional[list], **options) -> "pd.DataFrame":
+    import pyarrow.parquet as pq
+
+    # pre_buffer coalesces the selected column chunks into as few reads as
+    # possible, which matters when source is a ranged S3 object.
+    table = pq.read_table(source, columns=columns, filters=filters, pre_buffer=True, **options)
+    return table.to_pandas()
+
+################################################################################
+# Ranged S3 reads
+################################################################################
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only, seekable view of an S3 object that fetches bytes with ranged
+    GETs as they are read. Parquet readers seek to the footer, then to the
+    column chunks they need, so a projected or filtered read transfers only
+    those ranges instead of the whole object.
+    """
+
+    def __init__(self, client, bucket: str, key: str, size: Optional[int] = None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        if size is None:
+            size = client.head_object(Bucket=bucket, Key=key)['ContentLength']
+        self.size = size
+        self.position = 0
+        self.bytes_read = 0
+        self.requests = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self.position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self.position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self.position)
+        if length <= 0:
+            return 0
+        end = self.position + length - 1
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f'bytes={self.position}-{end}')
+        data = response['Body'].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        self.bytes_read += len(data)
+        self.requests += 1
+        metrics.incr('s3.get.ranges')
+        metrics.observe('s3.get.bytes', len(data), unit='Bytes')
+        return len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self.position
+        buffer = bytearray(max(0, min(size, self.size - self.position)))
+        read = self.readinto(buffer)
+        return bytes(buffer[:read])
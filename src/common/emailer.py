@@ -1,14 +1,19 @@
-import smtplib
+import io
 import re
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from typing import Optional, List
+import html
+import hashlib
+import smtplib
+import zipfile
+import mimetypes
+from string import Template
+from contextlib import contextmanager
+from email.message import EmailMessage
+from typing import Any, Optional, Dict, List, Iterable, Union
+from common.metrics import metrics
 
 def format_title(s: str) -> str:
     # List of words not to capitalize in titles
-    small_words = {"a", "an", "the", "and", "but", "for", "nor", "or", "so", "yet", "at", 
+    small_words = {"a", "an", "the", "and", "but", "for", "nor", "or", "so", "yet", "at",
                    "by", "in", "of", "on", "to", "up", "for", "with", "over", "into", "onto", "from"}
     caps_words = {"rmb, cgpi"}
     words = s.split('-')
@@ -23,58 +28,310 @@ def format_title(s: str) -> str:
 
     return ' '.join(title_words)
 
+################################################################################
+# Templates
+################################################################################
+# Compiled once at import; create_email_body only substitutes into them.
+_NON_ALPHA = re.compile(r'[^a-zA-Z\s]')
+BODY_TEMPLATE = Template("<h2 style='font-weight:bold;'>$header</h2><br><ul>\n$parents\n</ul>")
+PARENT_TEMPLATE = Template('<li>$name (<a href="$url">link</a>)</li>\n<ul>\n$categories\n</ul>')
+CATEGORY_TEMPLATE = Template('<li>$new$name (<a href="$url">view</a>)</li>')
+LINKS_TEMPLATE = Template("<p>Attachments too large to send are available for $days day(s):</p><ul>\n$items\n</ul>")
+LINK_TEMPLATE = Template('<li><a href="$url">$name</a></li>')
+UNAVAILABLE_TEMPLATE = Template('<li>$name (unavailable)</li>')
+DEFAULT_HEADER = "Updates from the official People's Bank of China website"
+PBOC_HOST = 'http://www.pbc.gov.cn'
+
+################################################################################
+# Attachments
+################################################################################
+class Attachment:
+    """
+    An attachment built from memory: bytes, or a binary file object that is
+    read when the message is built. The MIME type defaults to a guess from
+    the file name.
+    """
+
+    def __init__(self, filename: str, data: Union[bytes, Any], mimetype: Optional[str] = None):
+        self.filename = filename
+        self.data = data
+        self.mimetype = mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    @classmethod
+    def from_path(cls, path: str) -> "Attachment":
+        with open(path, 'rb') as file:
+            return cls(path.split('/')[-1], file.read())
+
+    def read(self) -> bytes:
+        if isinstance(self.data, (bytes, bytearray)):
+            return bytes(self.data)
+        self.data.seek(0)
+        self.data = self.data.read()
+        return self.data
+
+    @property
+    def size(self) -> int:
+        return len(self.read())
+
+def zip_attachments(attachments: List[Attachment], filename: str = 'attachments.zip') -> Attachment:
+    """Bundles attachments into one deflate-compressed zip, built in memory."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for attachment in attachments:
+            bundle.writestr(attachment.filename, attachment.read())
+    return Attachment(filename, buffer.getvalue(), 'application/zip')
+
+def attachments_from_s3(bucket: str, objects: Dict[str, str], extension: str = 'xlsx') -> List[Attachment]:
+    """
+    {name: S3 key} -> attachments named {name}.{extension}, downloaded
+    concurrently straight into memory. Objects that fail to download are
+    skipped (and reported).
+    """
+    from common.s3_utils import S3Utility
+
+    result = S3Utility.download_many(bucket, objects.values())
+    for key, error in result.failed.items():
+        print(f"Not attaching {key}: {error}")
+    return [Attachment(f'{name}.{extension}', result.succeeded[key])
+            for name, key in objects.items() if key in result.succeeded]
+
+################################################################################
+# Emailer
+################################################################################
 class Emailer():
+    """
+    Sends HTML email over SMTP (Gmail by default). Messages sent inside
+    session() share one authenticated connection; outside a session each
+    send opens and closes its own.
+
+    Attachments are built from memory. zip_attachments bundles them into
+    one compressed zip. When their total size exceeds max_attachment_bytes,
+    the ones that do not fit are uploaded under link_prefix in link_bucket,
+    keyed by content hash, and linked from the body with presigned URLs (or
+    left out, with a note, if no bucket is set or the upload fails).
+    """
 
-    def __init__(self, sender: str, gmail_app_password: str):
+    def __init__(
+        self,
+        sender: str,
+        gmail_app_password: Optional[str],
+        host: str = 'smtp.gmail.com',
+        port: int = 465,
+        use_ssl: bool = True,
+        starttls: bool = False,
+        timeout: float = 30,
+        zip_attachments: bool = False,
+        max_attachment_bytes: Optional[int] = None,
+        link_bucket: Optional[str] = None,
+        link_prefix: str = 'email/attachments/',
+        link_expires_seconds: int = 7 * 24 * 3600
+    ):
         self.sender = sender
         self.gmail_app_password = gmail_app_password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.timeout = timeout
+        self.zip_attachments = zip_attachments
+        self.max_attachment_bytes = max_attachment_bytes
+        self.link_bucket = link_bucket
+        self.link_prefix = link_prefix
+        self.link_expires_seconds = link_expires_seconds
+        self._server = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Emailer":
+        """Builds an Emailer from the `email` section of config.yml."""
+        email = config['email']
+        smtp = email.get('smtp') or {}
+        attachments = email.get('attachments') or {}
+        link_bucket = config.get('aws', {}).get('s3_bucket') if attachments.get('link_prefix') else None
+        options = {
+            'host': smtp.get('host'),
+            'port': smtp.get('port'),
+            'use_ssl': smtp.get('use_ssl'),
+            'starttls': smtp.get('starttls'),
+            'timeout': smtp.get('timeout'),
+            'zip_attachments': attachments.get('zip'),
+            'max_attachment_bytes': attachments.get('max_bytes'),
+            'link_prefix': attachments.get('link_prefix'),
+            'link_expires_seconds': attachments.get('link_expires_seconds'),
+        }
+        return cls(email['sender'], email.get('gmail_app_password'), link_bucket=link_bucket,
+                   **{name: value for name, value in options.items() if value is not None})
+
+    ############################################################################
+    # Sessions
+    ############################################################################
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        if self.starttls:
+            server.starttls()
+            server.ehlo()
+        if self.gmail_app_password:
+            server.login(self.sender, self.gmail_app_password)
+        metrics.incr('email.sessions')
+        return server
+
+    @contextmanager
+    def session(self):
+        """
+        One authenticated SMTP connection for every message sent inside the
+        block. Nested sessions reuse the outer connection.
+        """
+        if self._server is not None:
+            yield self
+            return
+        self._server = self._connect()
+        try:
+            yield self
+        finally:
+            server, self._server = self._server, None
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+    def send(self, message: EmailMessage) -> bool:
+        """Sends a built message on the current session (or a one-off connection)."""
+        try:
+            if self._server is None:
+                with self.session():
+                    return self._send(message)
+            return self._send(message)
+        except Exception as e:
+            print(f"Failed to send email: {e}")
+            metrics.incr('email.failed')
+            return False
+
+    def _send(self, message: EmailMessage) -> bool:
+        try:
+            self._server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Servers drop idle sessions; reconnect once.
+            try:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = self._connect()
+            self._server.send_message(message)
+        metrics.incr('email.sent')
+        return True
+
+    def send_many(self, messages: Iterable[EmailMessage]) -> List[bool]:
+        """Sends messages over one session; returns whether each was sent."""
+        messages = list(messages)
+        try:
+            with self.session():
+                return [self.send(message) for message in messages]
+        except Exception as e:
+            print(f"Failed to open SMTP session: {e}")
+            metrics.incr('email.failed')
+            return [False for _ in messages]
+
+    ############################################################################
+    # Messages
+    ############################################################################
+    def _fit_attachments(self, attachments: List[Attachment]):
+        """(attachments to send, [(name, url or None)] moved out of the message)."""
+        if self.zip_attachments and attachments:
+            attachments = [zip_attachments(attachments)]
+        if not self.max_attachment_bytes:
+            return attachments, []
+        attached, overflow, total = [], [], 0
+        for attachment in attachments:
+            if total + attachment.size <= self.max_attachment_bytes:
+                attached.append(attachment)
+                total += attachment.size
+            else:
+                overflow.append(attachment)
+        links = [(attachment.filename, self._upload_link(attachment)) for attachment in overflow]
+        return attached, links
+
+    def _upload_link(self, attachment: Attachment) -> Optional[str]:
+        if not self.link_bucket:
+            print(f"{attachment.filename} exceeds the attachment size limit; not sent.")
+            return None
+        from boto3.exceptions import S3UploadFailedError
+        from botocore.exceptions import BotoCoreError, ClientError
+        from common.s3_utils import S3Utility
+
+        data = attachment.read()
+        # Same-named attachments of different emails must not overwrite each other.
+        key = f'{self.link_prefix}{hashlib.sha256(data).hexdigest()[:16]}/{attachment.filename}'
+        try:
+            S3Utility.upload_buffer_s3(self.link_bucket, key, data)
+            return S3Utility.client().generate_presigned_url(
+                'get_object', Params={'Bucket': self.link_bucket, 'Key': key}, ExpiresIn=self.link_expires_seconds)
+        except (ClientError, BotoCoreError, S3UploadFailedError) as e:
+            print(f"Could not upload {attachment.filename} for linking: {e}")
+            metrics.incr('email.link_failed')
+            return None
+
+    def build_message(
+        self,
+        recipients: list,
+        title: str,
+        body: str,
+        attachments: Optional[List[Union[str, Attachment]]] = None
+    ) -> EmailMessage:
+        """
+        An HTML message with attachments (Attachment objects, or paths to
+        files), zipped and size-limited as configured.
+        """
+        attachments = [Attachment.from_path(a) if isinstance(a, str) else a for a in attachments or []]
+        attached, links = self._fit_attachments(attachments)
+        if links:
+            body += LINKS_TEMPLATE.substitute(
+                days=self.link_expires_seconds // 86400,
+                items='\n'.join(LINK_TEMPLATE.substitute(name=html.escape(name), url=html.escape(url)) if url
+                                else UNAVAILABLE_TEMPLATE.substitute(name=html.escape(name))
+                                for name, url in links))
+
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = ', '.join(recipients)
+        message['Subject'] = title
+        message.set_content(body, subtype='html')
+        for attachment in attached:
+            maintype, _, subtype = attachment.mimetype.partition('/')
+            message.add_attachment(attachment.read(), maintype=maintype, subtype=subtype, filename=attachment.filename)
+        metrics.observe('email.attachment.bytes', sum(attachment.size for attachment in attached), unit='Bytes')
+        return message
 
     def send_gmail(
         self,
         recipients: list,
         title: str,
         body: str,
-        attachments: Optional[List[str]] = None
+        attachments: Optional[List[Union[str, Attachment]]] = None
     ) -> bool:
         """
         Send an email via Gmail with specified details and attachments.
 
         Parameters:
-        sender (str): Your Gmail address.
         recipients (list): List of recipient email addresses.
         title (str): Email subject.
-        body (str): Email body.
-        attachments (list): List of paths to attachment files.
+        body (str): Email body (HTML).
+        attachments (list): Attachment objects or paths to attachment files.
         """
-        msg = MIMEMultipart()
-        msg['From'] = self.sender
-        msg['To'] = ', '.join(recipients)
-        msg['Subject'] = title
-        msg.attach(MIMEText(body, 'html'))
-
-        if attachments:
-            # Attach files
-            for file_path in attachments:
-                with open(file_path, 'rb') as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', f"attachment; filename= {file_path.split('/')[-1]}")
-                    msg.attach(part)
-        # Send email
         try:
-            server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-            server.ehlo()
-            server.login(self.sender, self.gmail_app_password)
-            server.sendmail(self.sender, recipients, msg.as_string())
-            server.close()
-            print("Email sent successfully!")
-            return True
+            message = self.build_message(recipients, title, body, attachments)
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            print(f"Failed to build email: {e}")
             return False
-        
-    def create_email_body(self, email_input: dict, parent_category_urls: dict, updated: dict) -> str:
+        sent = self.send(message)
+        if sent:
+            print("Email sent successfully!")
+        return sent
+
+    def create_email_body(self, email_input: dict, parent_category_urls: dict, updated: dict,
+                          header: str = DEFAULT_HEADER) -> str:
         """
         Generate email body with categories and URLs. If a category is marked as updated,
         it is noted in the body.
@@ -86,25 +343,17 @@ class Emailer():
         Returns:
         str: The generated email body.
         """
-
-        header = "<h2 style='font-weight:bold;'>Updates from the official People's Bank of China website</h2>"
-        lines = ["<ul>"]  # Start the bullet point list
+        parents = []
         for parent_category, category_url_ext_dict in email_input.items():
-            parent_url = parent_category_urls[parent_category]
-            line = "<li>"
-            line += f'{parent_category} (<a href="{parent_url}">link</a>)'
-            line += "</li>"
-            lines.append(line)
-            lines.append("<ul>")
-            for category, url_ext in category_url_ext_dict.items():
-                formatted_category = re.sub(r'[^a-zA-Z\s]', '', category).lower().replace(' ', '_')
-                line = "<li>"
-                if formatted_category in updated:
-                    line += "<b>(New!)</b> "
-                line += f'{category} (<a href="http://www.pbc.gov.cn{url_ext}">view</a>)'
-                line += "</li>"
-                lines.append(line)
-            lines.append("</ul>")
-        lines.append("</ul>")  # End the bullet point list
-        
-        return header + "<br>" + "\n".join(lines)
\ No newline at end of file
+            categories = [
+                CATEGORY_TEMPLATE.substitute(
+                    new="<b>(New!)</b> " if _NON_ALPHA.sub('', category).lower().replace(' ', '_') in updated else '',
+                    name=html.escape(category),
+                    url=html.escape(f'{PBOC_HOST}{url_ext}'))
+                for category, url_ext in category_url_ext_dict.items()
+            ]
+            parents.append(PARENT_TEMPLATE.substitute(
+                name=html.escape(parent_category),
+                url=html.escape(parent_category_urls[parent_category]),
+                categories='\n'.join(categories)))
+        return BODY_TEMPLATE.substitute(header=html.escape(header), parents='\n'.join(parents))
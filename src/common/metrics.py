@@ -0,0 +1,164 @@
+import sys
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from typing import Optional, Dict, List
+
+################################################################################
+# Registry
+################################################################################
+# Metric names are dotted, e.g. 'http.get.seconds', 's3.put.bytes'. A timer
+# records one observation (in seconds) per timed block; counters are running
+# totals. Every value of a histogram is kept for the run, which is fine at
+# the scale of one scrape (hundreds of observations).
+
+class Metrics:
+    """
+    Thread-safe registry of counters and histograms for one run:
+
+        with metrics.timer('s3.list.seconds'):
+            ...
+        @metrics.timed('links.extract.seconds')
+        def extract(...): ...
+        metrics.incr('http.retries')
+        metrics.observe('s3.put.bytes', len(body), unit='Bytes')
+
+    summary() gives counts and percentiles per metric; emit() prints it as
+    JSON or as CloudWatch Embedded Metric Format (EMF) documents, which
+    Lambda's log pipeline turns into CloudWatch metrics without API calls.
+    """
+
+    # EMF limits: metrics per document, and values per metric.
+    EMF_MAX_METRICS = 100
+    EMF_MAX_VALUES = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.units = {}
+            self.started = time.time()
+
+    ############################################################################
+    # Recording
+    ############################################################################
+    def incr(self, name: str, value: float = 1, unit: str = 'Count') -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self.units.setdefault(name, unit)
+
+    def observe(self, name: str, value: float, unit: str = 'None') -> None:
+        with self._lock:
+            self.histograms.setdefault(name, []).append(value)
+            self.units.setdefault(name, unit)
+
+    @contextmanager
+    def timer(self, name: str):
+        """Records the wall time of the block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, unit='Seconds')
+
+    def timed(self, name: str):
+        """Decorator form of timer()."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    ############################################################################
+    # Reporting
+    ############################################################################
+    def summary(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: list(values) for name, values in self.histograms.items()}
+        return {
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'counters': counters,
+            'histograms': {name: _describe(values) for name, values in sorted(histograms.items())},
+        }
+
+    def emf_documents(self, namespace: str, dimensions: Optional[Dict[str, str]] = None) -> List[dict]:
+        """
+        The run's metrics as EMF documents. Counters are single values;
+        histograms are value arrays, so CloudWatch computes their statistics.
+        """
+        dimensions = dimensions or {}
+        with self._lock:
+            series = [(name, [value]) for name, value in sorted(self.counters.items())]
+            series += sorted((name, list(values)) for name, values in self.histograms.items())
+            units = dict(self.units)
+
+        documents = []
+        current = {}
+        for name, values in series:
+            for start in range(0, len(values), self.EMF_MAX_VALUES):
+                if name in current or len(current) >= self.EMF_MAX_METRICS:
+                    documents.append(current)
+                    current = {}
+                chunk = values[start:start + self.EMF_MAX_VALUES]
+                current[name] = chunk[0] if len(chunk) == 1 else chunk
+        if current:
+            documents.append(current)
+
+        timestamp = int(time.time() * 1000)
+        return [{
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': namespace,
+                    'Dimensions': [sorted(dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': units.get(name, 'None')} for name in values],
+                }],
+            },
+            **dimensions,
+            **values,
+        } for values in documents]
+
+    def emit(self, fmt: str = 'json', namespace: str = 'TLG/Scrapers', dimensions: Optional[Dict[str, str]] = None, stream=None) -> None:
+        """Writes the run's metrics to stdout: one JSON summary, or EMF documents (one per line)."""
+        stream = stream or sys.stdout
+        if fmt == 'emf':
+            for document in self.emf_documents(namespace, dimensions):
+                stream.write(json.dumps(document) + '\n')
+        else:
+            stream.write(json.dumps({'metrics': self.summary(), **(dimensions or {})}) + '\n')
+        stream.flush()
+
+    def emit_from_config(self, config: dict, **dimensions) -> None:
+        """emit() with the format and namespace from the `metrics` section of config.yml."""
+        settings = config.get('metrics') or {}
+        if settings.get('enabled', True):
+            self.emit(settings.get('format', 'json'), settings.get('namespace', 'TLG/Scrapers'), dimensions)
+
+def _describe(values: List[float]) -> dict:
+    ordered = sorted(values)
+    count = len(ordered)
+
+    def percentile(q):
+        return ordered[min(count - 1, int(q * count))]
+
+    return {
+        'count': count,
+        'sum': round(sum(ordered), 6),
+        'min': ordered[0],
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+        'p99': percentile(0.99),
+        'max': ordered[-1],
+    }
+
+# Process-wide registry used by the scraper, S3 utility and pipelines.
+metrics = Metrics()
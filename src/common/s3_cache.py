@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Any, Callable, Optional
+from botocore.exceptions import ClientError
+from common.metrics import metrics
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 's3_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024 # Half of Lambda's default /tmp
+CHUNK_SIZE = 1024 * 1024
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+################################################################################
+# Read-through cache
+################################################################################
+class S3ObjectCache:
+    """
+    Read-through disk cache of S3 objects, keyed by (bucket, key) and
+    validated by ETag. Each object is two files in directory:
+
+        {digest}.data    the body
+        {digest}.json    {'bucket', 'key', 'etag', 'size', 'validated_at'}
+
+    A cached object is revalidated with a conditional GET (If-None-Match):
+    a 304 serves the local copy, anything else replaces it, in one request
+    either way. Within max_age_seconds of the last validation no request is
+    made at all (0, the default, always revalidates).
+
+    The data files' mtimes are the LRU clock: every hit touches its file,
+    and after each store the least recently used objects are deleted until
+    the directory is within max_bytes. The directory survives warm Lambda
+    invocations (under /tmp) and repeated local runs, and can be shared by
+    several processes: files are replaced atomically.
+    """
+
+    def __init__(
+        self,
+        client: Callable,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float = 0,
+        memory_map: bool = False
+    ):
+        self.client = client
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.memory_map = memory_map
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, bucket: str, key: str):
+        digest = hashlib.sha256(f'{bucket}/{key}'.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return f'{base}.data', f'{base}.json'
+
+    def _entry(self, bucket: str, key: str) -> Optional[dict]:
+        data_path, meta_path = self._paths(bucket, key)
+        try:
+            with open(meta_path, 'r') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(data_path) or entry.get('key') != key or entry.get('bucket') != bucket:
+            return None
+        return entry
+
+    def _write_meta(self, meta_path: str, entry: dict) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(entry, file)
+        os.replace(temp_path, meta_path)
+
+    def _hit(self, data_path: str) -> str:
+        os.utime(data_path) # Most recently used
+        with self._lock:
+            self.hits += 1
+        metrics.incr('s3.cache.hits')
+        return data_path
+
+    def path(self, bucket: str, key: str) -> str:
+        """
+        Local path of an up-to-date copy of the object, fetched on a miss.
+        Raises botocore's ClientError if the object does not exist.
+        """
+        data_path, meta_path = self._paths(bucket, key)
+        entry = self._entry(bucket, key)
+        if entry is not None and time.time() - entry.get('validated_at', 0) < self.max_age_seconds:
+            return self._hit(data_path)
+
+        request = {'Bucket': bucket, 'Key': key}
+        if entry is not None:
+            request['IfNoneMatch'] = f'"{entry["etag"]}"'
+        try:
+            with metrics.timer('s3.get.seconds'):
+                response = self.client().get_object(**request)
+        except ClientError as e:
+            status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+            code = e.response.get('Error', {}).get('Code')
+            if entry is not None and (status == 304 or code in ('304', 'NotModified')):
+                entry['validated_at'] = time.time()
+                self._write_meta(meta_path, entry)
+                return self._hit(data_path)
+            if code in ('NoSuchKey', '404'):
+                self.invalidate(bucket, key)
+            raise
+
+        with self._lock:
+            self.misses += 1
+        metrics.incr('s3.cache.misses')
+        size = self._store(response['Body'], data_path)
+        metrics.observe('s3.get.bytes', size, unit='Bytes')
+        self._write_meta(meta_path, {
+            'bucket': bucket,
+            'key': key,
+            'etag': response['ETag'].strip('"'),
+            'size': size,
+            'validated_at': time.time(),
+        })
+        self.evict(keep=data_path)
+        return data_path
+
+    def _store(self, body, data_path: str) -> int:
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in iter(lambda: body.read(CHUNK_SIZE), b''):
+                    file.write(chunk)
+                    size += len(chunk)
+            os.replace(temp_path, data_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return size
+
+    def with_path(self, bucket: str, key: str, use: Callable[[str], Any]) -> Any:
+        """
+        use(local path) on an up-to-date copy of the object. If an eviction
+        by another thread or process deletes the file between path() and
+        use, the object is fetched again and use retried once.
+        """
+        try:
+            return use(self.path(bucket, key))
+        except FileNotFoundError:
+            return use(self.path(bucket, key))
+
+    def get(self, bucket: str, key: str) -> bytes:
+        """The object's body, from the cache when its ETag still matches."""
+        return self.with_path(bucket, key, _read_file)
+
+    def invalidate(self, bucket: str, key: str) -> None:
+        for path in self._paths(bucket, key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def usage(self) -> int:
+        """Bytes of cached bodies on disk."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.data'))
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Deletes least recently used objects until within max_bytes; returns
+        how many. The data file at keep (the object just stored, which may
+        alone exceed the budget) is never deleted.
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.data'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            for stale in (path, path[:-len('.data')] + '.json'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+            metrics.incr('s3.cache.evictions', evicted)
+        return evicted
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(('.data', '.json', '.tmp')):
+                os.remove(entry.path)
@@ -1,32 +1,315 @@
+import os
 import re
-import boto3
-import pandas as pd
-from typing import Any
-from datetime import datetime
-from botocore.exceptions import NoCredentialsError, ClientError
+import io
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Dict, List, Iterable, Union, BinaryIO, TYPE_CHECKING
+from datetime import datetime, timezone
+from common.metrics import metrics
 
+# boto3 is imported when the first client is built, botocore's exceptions
+# only by the functions that catch them and pandas only by the DataFrame
+# helpers, so importing this module stays cheap on Lambda cold starts (the
+# bronze path never needs pandas).
+if TYPE_CHECKING:
+    import pandas as pd
+    from boto3.s3.transfer import TransferConfig
+
+################################################################################
+# Manifest
+################################################################################
+class S3Manifest:
+    """
+    In-memory index of the objects under a prefix: table -> latest object.
+
+    Table names are derived from keys directly under the prefix by dropping
+    the trailing YYYYMMDD timestamp and extension, e.g.
+    'bronze/money_supply_20240701.xlsx' -> 'money_supply'. Keys in
+    sub-folders (e.g. '_manifests/') are not tables and are ignored.
+    """
+    TIMESTAMP_PATTERN = re.compile(r'[_-]?\d{8}$')
+
+    def __init__(self, bucket: str, prefix: str, entries: Optional[Dict[str, dict]] = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.entries = entries or {}
+
+    def table_for_key(self, key: str) -> Optional[str]:
+        if not key.startswith(self.prefix):
+            return None
+        relative = key[len(self.prefix):]
+        if not relative or '/' in relative:
+            return None
+        stem = relative.rsplit('.', 1)[0]
+        return self.TIMESTAMP_PATTERN.sub('', stem) or None
+
+    def add(self, key: str, etag: str, size: int, last_modified: datetime) -> None:
+        """Adds an object, keeping it only if it is the newest seen for its table."""
+        table = self.table_for_key(key)
+        if table is None:
+            return
+        last_modified = last_modified.astimezone(timezone.utc).isoformat()
+        current = self.entries.get(table)
+        if current is None or last_modified >= current['last_modified']:
+            self.entries[table] = {
+                'key': key,
+                'etag': etag.strip('"'),
+                'size': size,
+                'last_modified': last_modified,
+            }
+
+    def record_upload(self, key: str, etag: str, size: int) -> None:
+        """Updates the index after this process uploaded a new object."""
+        self.add(key, etag, size, datetime.now(timezone.utc))
+
+    def latest(self, table: str) -> Optional[dict]:
+        return self.entries.get(table)
+
+    def tables(self) -> List[str]:
+        return sorted(self.entries)
+
+    def to_json(self) -> str:
+        return json.dumps({'bucket': self.bucket, 'prefix': self.prefix, 'tables': self.entries}, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, raw) -> "S3Manifest":
+        data = json.loads(raw)
+        return cls(data['bucket'], data['prefix'], data.get('tables', {}))
+
+    def save(self, manifest_key: str) -> None:
+        """Persists the manifest as a compact JSON object so the next run needs one GET."""
+        S3Utility.upload_obj_s3(self.bucket, manifest_key, self.to_json())
+
+################################################################################
+# Batch transfers
+################################################################################
+class S3BatchResult:
+    """
+    Aggregated outcome of S3Utility.upload_many / download_many.
+
+    `succeeded` maps key -> result (None for uploads, bytes or the local path
+    for downloads); `failed` maps key -> error message.
+    """
+
+    def __init__(self):
+        self.succeeded = {}
+        self.failed = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    def raise_for_failures(self) -> None:
+        if self.failed:
+            details = '; '.join(f'{key}: {error}' for key, error in sorted(self.failed.items()))
+            raise Exception(f"{len(self.failed)} S3 transfer(s) failed: {details}")
+
+    def __repr__(self) -> str:
+        return f"S3BatchResult(succeeded={len(self.succeeded)}, failed={len(self.failed)})"
+
+def _body_size(obj: Any) -> int:
+    """Length of a str/bytes body, or the remaining length of a seekable file."""
+    if isinstance(obj, str):
+        return len(obj.encode('utf-8'))
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    try:
+        position = obj.tell()
+        size = obj.seek(0, os.SEEK_END) - position
+        obj.seek(position)
+        return size
+    except (AttributeError, OSError, TypeError):
+        return 0
+
+################################################################################
+# S3
+################################################################################
 class S3Utility:
+    # One boto3 client per process, shared by every call (and by every warm
+    # Lambda invocation). Building a client loads botocore's service models,
+    # which is one of the most expensive steps of a cold start.
+    _client = None
+    _client_lock = threading.Lock()
+    region_name = None
+    max_pool_connections = 32
+    # Managed transfers: objects at or above the threshold are split into
+    # chunks that are sent (or fetched with ranged GETs) max_concurrency at a
+    # time. batch_max_workers bounds how many objects upload_many /
+    # download_many move at once.
+    multipart_threshold = 8 * 1024 * 1024
+    multipart_chunksize = 8 * 1024 * 1024
+    max_concurrency = 10
+    batch_max_workers = 8
+    # Optional read-through disk cache (S3ObjectCache) used by
+    # download_buffer_s3, download_s3_to_dataframe and
+    # download_s3_file_to_local; see configure_cache.
+    cache = None
+
+    @classmethod
+    def configure(
+        cls,
+        region_name: Optional[str] = None,
+        max_pool_connections: Optional[int] = None,
+        multipart_threshold: Optional[int] = None,
+        multipart_chunksize: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        batch_max_workers: Optional[int] = None
+    ) -> None:
+        """
+        Sets client and transfer options. The cached client is rebuilt on next use.
+        """
+        with cls._client_lock:
+            if region_name is not None:
+                cls.region_name = region_name
+            if max_pool_connections is not None:
+                cls.max_pool_connections = max_pool_connections
+            if multipart_threshold is not None:
+                cls.multipart_threshold = multipart_threshold
+            if multipart_chunksize is not None:
+                cls.multipart_chunksize = multipart_chunksize
+            if max_concurrency is not None:
+                cls.max_concurrency = max_concurrency
+            if batch_max_workers is not None:
+                cls.batch_max_workers = batch_max_workers
+            cls._client = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "S3Utility":
+        """
+        Configures the shared client from the `aws` section of config.yml.
+        """
+        aws = config.get('aws', {})
+        transfer = aws.get('s3_transfer') or {}
+        cls.configure(
+            region_name=aws.get('region'),
+            max_pool_connections=(aws.get('s3_client') or {}).get('max_pool_connections'),
+            multipart_threshold=transfer.get('multipart_threshold'),
+            multipart_chunksize=transfer.get('multipart_chunksize'),
+            max_concurrency=transfer.get('max_concurrency'),
+            batch_max_workers=transfer.get('batch_max_workers')
+        )
+        cache = dict(aws.get('s3_cache') or {})
+        if cache.pop('enabled', False):
+            cls.configure_cache(**cache)
+        return cls()
+
+    @classmethod
+    def configure_cache(cls, enabled: bool = True, **options) -> None:
+        """
+        Turns the read-through disk cache on (options go to S3ObjectCache:
+        directory, max_bytes, max_age_seconds, memory_map) or off.
+        """
+        if not enabled:
+            cls.cache = None
+            return
+        from common.s3_cache import S3ObjectCache
+
+        cls.cache = S3ObjectCache(cls.client, **options)
+
+    @classmethod
+    def transfer_config(cls) -> "TransferConfig":
+        """
+        TransferConfig used by every managed upload and download.
+        """
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(
+            multipart_threshold=cls.multipart_threshold,
+            multipart_chunksize=cls.multipart_chunksize,
+            max_concurrency=cls.max_concurrency,
+            use_threads=cls.max_concurrency > 1
+        )
+
+    @classmethod
+    def client(cls):
+        """
+        Returns the shared S3 client, creating it on first use.
+        """
+        if cls._client is None:
+            with cls._client_lock:
+                if cls._client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    cls._client = boto3.client(
+                        's3',
+                        region_name=cls.region_name,
+                        config=Config(max_pool_connections=cls.max_pool_connections)
+                    )
+        return cls._client
+
+    @classmethod
+    def set_client(cls, client) -> None:
+        """
+        Injects a client (e.g. a moto or stubbed client in tests). Pass None
+        to drop the cached client.
+        """
+        with cls._client_lock:
+            cls._client = client
+
     @staticmethod
-    def get_latest_file_key(bucket: str, prefix: str) -> str:
+    def list_objects(bucket: str, prefix: str) -> List[dict]:
         """
-        Retrieves the most recent file (based on Last Modified date) from an S3 bucket for a given prefix.
+        Lists every object under a prefix, following pagination past 1000 keys.
         """
-        s3_client = boto3.client('s3')
+        from botocore.exceptions import ClientError
+
+        s3_client = S3Utility.client()
+        paginator = s3_client.get_paginator('list_objects_v2')
+        files = []
         try:
-            response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix)
-            files = response.get('Contents', [])
+            with metrics.timer('s3.list.seconds'):
+                for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                    metrics.incr('s3.list.pages')
+                    files.extend(page.get('Contents', []))
         except ClientError as e:
             raise Exception(f"Failed to list files in S3: {e}")
+        metrics.incr('s3.list.objects', len(files))
+        return files
 
+    @staticmethod
+    def get_latest_file_key(bucket: str, prefix: str) -> str:
+        """
+        Retrieves the most recent file (based on Last Modified date) from an S3 bucket for a given prefix.
+        """
+        files = S3Utility.list_objects(bucket, prefix)
         if not files:
             raise Exception("No files found under the specified bucket and prefix.")
 
         latest_file = max(files, key=lambda x: x['LastModified'])
         return latest_file['Key']
+
+    @staticmethod
+    def build_manifest(bucket: str, prefix: str) -> S3Manifest:
+        """
+        Builds a table -> latest object index (key, ETag, size, LastModified)
+        from a single paginated listing of the prefix.
+        """
+        manifest = S3Manifest(bucket, prefix)
+        for obj in S3Utility.list_objects(bucket, prefix):
+            manifest.add(obj['Key'], obj['ETag'], obj['Size'], obj['LastModified'])
+        return manifest
+
+    @staticmethod
+    def load_manifest(bucket: str, prefix: str, manifest_key: Optional[str] = None) -> S3Manifest:
+        """
+        Loads the persisted manifest object if there is one, otherwise builds
+        the manifest from a listing of the prefix.
+        """
+        if manifest_key:
+            raw = S3Utility.download_obj_s3(bucket, manifest_key)
+            if raw:
+                manifest = S3Manifest.from_json(raw)
+                if manifest.bucket == bucket and manifest.prefix == prefix:
+                    return manifest
+                print(f"Manifest {manifest_key} is for another prefix; rebuilding.")
+        return S3Utility.build_manifest(bucket, prefix)
     
     @staticmethod
     def download_etag(bucket: str, key: str) -> str:
-        s3_client = boto3.client('s3')
+        s3_client = S3Utility.client()
         try:
             s3_object = s3_client.head_object(Bucket=bucket, Key=key)
             s3_etag = s3_object['ETag'].strip('"')  # Remove double quotes from ETag
@@ -38,89 +321,298 @@ class S3Utility:
             print(f"An error occurred: {e}")
             return None
 
+    @staticmethod
+    def object_exists(bucket: str, key: str) -> bool:
+        """
+        True if the object exists (one HEAD request).
+        """
+        from botocore.exceptions import ClientError
+
+        try:
+            S3Utility.client().head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return False
+            raise Exception(f"Failed to check object in S3: {e}")
+        return True
+
+    @staticmethod
+    def download_obj_s3(bucket: str, key: str) -> Optional[bytes]:
+        """
+        Downloads an object's body from S3. Returns None if the object does not exist.
+        """
+        from botocore.exceptions import ClientError
+
+        s3_client = S3Utility.client()
+        with metrics.timer('s3.get.seconds'):
+            try:
+                obj = s3_client.get_object(Bucket=bucket, Key=key)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                    return None
+                raise Exception(f"Failed to get object from S3: {e}")
+            body = obj['Body'].read()
+        metrics.observe('s3.get.bytes', len(body), unit='Bytes')
+        return body
+
     @staticmethod
     def upload_local_file_to_s3(local_file_path: str, bucket: str, key: str) -> None:
         """
         Uploads a file from the local file system to an S3 bucket.
         """
-        s3_client = boto3.client('s3')
+        from botocore.exceptions import ClientError, NoCredentialsError
+
+        s3_client = S3Utility.client()
+        S3Utility._invalidate_cached(bucket, key)
         try:
-            response = s3_client.upload_file(local_file_path, bucket, key)
-            print(f"Successfully uploaded:\n{response}")
+            s3_client.upload_file(local_file_path, bucket, key, Config=S3Utility.transfer_config())
+            print(f"Successfully uploaded {local_file_path} to s3://{bucket}/{key}")
         except (ClientError, NoCredentialsError) as e:
             raise Exception(f"Failed to upload file to S3: {e}")
 
     @staticmethod
     def download_s3_file_to_local(local_file_path: str, bucket: str, key: str) -> None:
         """
-        Downloads a file from an S3 bucket to the local file system.
+        Downloads a file from an S3 bucket to the local file system (copied
+        from the disk cache when it is on).
         """
-        s3_client = boto3.client('s3')
+        from botocore.exceptions import ClientError
+
+        s3_client = S3Utility.client()
         try:
-            s3_client.download_file(bucket, key, local_file_path)
+            if S3Utility.cache is not None:
+                S3Utility.cache.with_path(bucket, key, lambda path: shutil.copyfile(path, local_file_path))
+                return
+            s3_client.download_file(bucket, key, local_file_path, Config=S3Utility.transfer_config())
         except ClientError as e:
             raise Exception(f"Failed to download file from S3: {e}")
 
     @staticmethod
-    def download_s3_to_dataframe(bucket: str, key: str) -> pd.DataFrame:
+    def download_s3_to_dataframe(
+        bucket: str,
+        key: str,
+        file_type: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        filters: Optional[list] = None,
+        dtype: Optional[Dict[str, Any]] = None,
+        compression: Optional[str] = None,
+        **options
+    ) -> "pd.DataFrame":
         """
-        Reads an S3 file into a pandas DataFrame. Supports xlsx, csv, json, and parquet formats.
+        Reads an S3 object into a pandas DataFrame. The format (csv, jsonl,
+        json, parquet or xlsx, optionally .gz/.zst compressed) comes from
+        file_type or the key's extension; columns, filters and dtype are
+        passed to dataframe_io.read_dataframe.
+
+        A parquet read with columns or filters from an object at or above
+        multipart_threshold fetches only the footer and the column chunks it
+        needs, with ranged GETs; anything smaller is one GET. With the disk
+        cache on, objects are read from the cache instead, memory-mapped
+        for parquet if the cache's memory_map is set.
         """
-        s3_client = boto3.client('s3')
+        from botocore.exceptions import ClientError
+        from common.dataframe_io import read_dataframe, resolve_format, S3RangeReader, DataFrameFormatError
+
+        try:
+            fmt, compression = resolve_format(file_type, key=key, compression=compression)
+        except DataFrameFormatError as e:
+            raise Exception(str(e))
         try:
-            obj = s3_client.get_object(Bucket=bucket, Key=key)
+            source = None
+            if S3Utility.cache is not None:
+                if fmt == 'parquet' and S3Utility.cache.memory_map:
+                    import pyarrow as pa
+
+                    source = S3Utility.cache.with_path(bucket, key, pa.memory_map)
+                else:
+                    source = io.BytesIO(S3Utility.cache.get(bucket, key))
+            elif fmt == 'parquet' and (columns is not None or filters is not None):
+                size = S3Utility.client().head_object(Bucket=bucket, Key=key)['ContentLength']
+                if size >= S3Utility.multipart_threshold:
+                    source = S3RangeReader(S3Utility.client(), bucket, key, size=size)
+            if source is None:
+                source = io.BytesIO(S3Utility.download_buffer_s3(bucket, key))
         except ClientError as e:
             raise Exception(f"Failed to get file from S3: {e}")
-
-        file_extension = key.split('.')[-1].lower()
-
-        if file_extension == 'csv':
-            return pd.read_csv(obj['Body'])
-        elif file_extension == 'json':
-            return pd.read_json(obj['Body'])
-        elif file_extension == 'xlsx':
-            return pd.read_excel(obj['Body'])
-        elif file_extension == 'parquet':
-            return pd.read_parquet(obj['Body'])
-        else:
-            raise Exception(f"Unsupported file format: {file_extension}")
+        return read_dataframe(source, fmt, compression=compression, columns=columns, filters=filters,
+                              dtype=dtype, **options)
 
     @staticmethod
-    def upload_dataframe_s3(df: pd.DataFrame, bucket: str, key: str, file_type: str) -> None:
+    def upload_dataframe_s3(
+        df: "pd.DataFrame",
+        bucket: str,
+        key: str,
+        file_type: Optional[str] = None,
+        compression: Optional[str] = None,
+        buffer: Optional[io.BytesIO] = None,
+        **options
+    ) -> None:
         """
-        Uploads a pandas DataFrame to S3 as the specified file type.
+        Uploads a pandas DataFrame to S3 as the specified file type (default:
+        the key's extension), e.g. 'parquet' (zstd), 'csv.gz', 'jsonl.zst'
+        or 'xlsx'. The DataFrame is serialized into buffer (reused if given)
+        and streamed through the managed transfer, so large payloads go up
+        as multipart chunks. Options are passed to dataframe_io.write_dataframe.
         """
-        buffer = None
-        s3_client = boto3.client('s3')
-        try:
-            if file_type == 'csv':
-                buffer = df.to_csv(index=False)
-            elif file_type == 'json':
-                buffer = df.to_json()
-            elif file_type == 'xlsx':
-                buffer = df.to_excel(index=False, engine='xlsxwriter')
-            elif file_type == 'parquet':
-                buffer = df.to_parquet()
-            else:
-                raise Exception(f"Unsupported file type: {file_type}")
+        from botocore.exceptions import ClientError, NoCredentialsError
+        from common.dataframe_io import write_dataframe, resolve_format, DataFrameFormatError
 
-            response = s3_client.put_object(Bucket=bucket, Key=key, Body=buffer)
-            print(f"Successfully uploaded:\n{response}")
+        try:
+            fmt, compression = resolve_format(file_type, key=key, compression=compression)
+        except DataFrameFormatError as e:
+            raise Exception(f"Unsupported file type: {e}")
+        body = write_dataframe(df, fmt, target=buffer, compression=compression, **options)
+        try:
+            S3Utility.upload_buffer_s3(bucket, key, body)
+            print(f"Successfully uploaded DataFrame to s3://{bucket}/{key}")
         except (ClientError, NoCredentialsError) as e:
             raise Exception(f"Failed to upload DataFrame to S3: {e}")
-    
+
     @staticmethod
-    def upload_obj_s3(bucket: str, key: str, obj: str) -> None:
+    def upload_obj_s3(bucket: str, key: str, obj: Any) -> None:
         """
-        Uploads an object to S3.
+        Uploads an object (str, bytes or a seekable file-like object) to S3.
         """
-        s3_client = boto3.client('s3')
+        from botocore.exceptions import ClientError, NoCredentialsError
+
+        s3_client = S3Utility.client()
+        S3Utility._invalidate_cached(bucket, key)
+        metrics.observe('s3.put.bytes', _body_size(obj), unit='Bytes')
         try:
-            response = s3_client.put_object(Bucket=bucket, Key=key, Body=obj)
+            with metrics.timer('s3.put.seconds'):
+                response = s3_client.put_object(Bucket=bucket, Key=key, Body=obj)
             print(f"Successfully uploaded:\n{response}")
         except (ClientError, NoCredentialsError) as e:
             raise Exception(f"Failed to upload object to S3: {e}")
         
+    @staticmethod
+    def upload_buffer_s3(bucket: str, key: str, data: Union[bytes, str, BinaryIO]) -> None:
+        """
+        Uploads an in-memory buffer (or a readable binary file object, read
+        from its current position) through the managed transfer, so buffers
+        above multipart_threshold are sent as concurrent multipart chunks.
+
+        Note that multipart objects get an ETag that is not the body's MD5;
+        bronze spreadsheets, whose ETags are compared against MD5 hashes, go
+        through upload_obj_s3 instead.
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if isinstance(data, (bytes, bytearray)):
+            data = io.BytesIO(data)
+        S3Utility._invalidate_cached(bucket, key)
+        metrics.observe('s3.put.bytes', _body_size(data), unit='Bytes')
+        with metrics.timer('s3.put.seconds'):
+            S3Utility.client().upload_fileobj(data, bucket, key, Config=S3Utility.transfer_config())
+
+    @staticmethod
+    def download_buffer_s3(bucket: str, key: str) -> bytes:
+        """
+        Downloads an object into memory through the managed transfer, using
+        concurrent ranged GETs for objects above multipart_threshold, or
+        through the disk cache when it is on.
+        """
+        if S3Utility.cache is not None:
+            return S3Utility.cache.get(bucket, key)
+        buffer = io.BytesIO()
+        with metrics.timer('s3.get.seconds'):
+            S3Utility.client().download_fileobj(bucket, key, buffer, Config=S3Utility.transfer_config())
+        metrics.observe('s3.get.bytes', buffer.tell(), unit='Bytes')
+        return buffer.getvalue()
+
+    @staticmethod
+    def delete_objects(bucket: str, keys: Iterable[str], batch_size: int = 1000) -> S3BatchResult:
+        """
+        Deletes keys with DeleteObjects, batch_size (at most 1000, the S3
+        limit) keys per request. Per-key errors do not stop the batch; they
+        are collected in the returned S3BatchResult.
+        """
+        from botocore.exceptions import ClientError
+
+        keys = list(dict.fromkeys(keys))
+        batch_size = max(1, min(batch_size, 1000))
+        result = S3BatchResult()
+        s3_client = S3Utility.client()
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            try:
+                with metrics.timer('s3.delete.seconds'):
+                    response = s3_client.delete_objects(
+                        Bucket=bucket,
+                        Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                    )
+            except ClientError as e:
+                result.failed.update({key: f'ClientError: {e}' for key in batch})
+                continue
+            errors = {error['Key']: f"{error.get('Code')}: {error.get('Message')}" for error in response.get('Errors', [])}
+            result.failed.update(errors)
+            result.succeeded.update({key: None for key in batch if key not in errors})
+            for key in batch:
+                S3Utility._invalidate_cached(bucket, key)
+        metrics.incr('s3.delete.objects', len(result.succeeded))
+        metrics.incr('s3.delete.failed', len(result.failed))
+        return result
+
+    @staticmethod
+    def _invalidate_cached(bucket: str, key: str) -> None:
+        if S3Utility.cache is not None:
+            S3Utility.cache.invalidate(bucket, key)
+
+    @staticmethod
+    def upload_many(bucket: str, objects: Dict[str, Union[bytes, str]], from_files: bool = False, max_workers: Optional[int] = None) -> S3BatchResult:
+        """
+        Uploads {key: body} concurrently (or {key: local file path} when
+        from_files is True). Failures do not stop the batch; they are
+        collected in the returned S3BatchResult.
+        """
+        def upload(key, source):
+            if from_files:
+                S3Utility.client().upload_file(source, bucket, key, Config=S3Utility.transfer_config())
+            else:
+                S3Utility.upload_buffer_s3(bucket, key, source)
+
+        return S3Utility._run_batch(upload, list(objects.items()), max_workers)
+
+    @staticmethod
+    def download_many(bucket: str, keys: Iterable[str], local_dir: Optional[str] = None, max_workers: Optional[int] = None) -> S3BatchResult:
+        """
+        Downloads keys concurrently. Bodies are returned in memory, or written
+        under local_dir (keeping the key's file name) when it is given, in
+        which case the local path is returned.
+        """
+        def download(key, _):
+            if local_dir is None:
+                return S3Utility.download_buffer_s3(bucket, key)
+            local_file_path = os.path.join(local_dir, key.rsplit('/', 1)[-1])
+            S3Utility.download_s3_file_to_local(local_file_path, bucket, key)
+            return local_file_path
+
+        return S3Utility._run_batch(download, [(key, None) for key in dict.fromkeys(keys)], max_workers)
+
+    @staticmethod
+    def _run_batch(transfer, items: list, max_workers: Optional[int] = None) -> S3BatchResult:
+        result = S3BatchResult()
+        if not items:
+            return result
+
+        def run(item):
+            key, source = item
+            try:
+                return key, transfer(key, source), None
+            except Exception as e:
+                return key, None, f'{type(e).__name__}: {e}'
+
+        workers = max(1, min(max_workers or S3Utility.batch_max_workers, len(items)))
+        with metrics.timer('s3.batch.seconds'), ThreadPoolExecutor(max_workers=workers) as executor:
+            for key, value, error in executor.map(run, items):
+                if error is None:
+                    result.succeeded[key] = value
+                else:
+                    result.failed[key] = error
+        metrics.incr('s3.batch.failed', len(result.failed))
+        print(f"S3 batch transfer: {len(result.succeeded)} succeeded, {len(result.failed)} failed")
+        return result
+
     @staticmethod
     def replace_timestamp_in_filename(filename: str) -> str:
         """
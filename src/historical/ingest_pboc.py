@@ -1,45 +1,232 @@
+"""
+Backfills historical PBOC spreadsheets into S3.
+
+Fans out across years and tables with a bounded worker pool (subject to the
+Webscraper's per-host rate limits) and records every stored table in a
+journal, so an interrupted run resumes without downloading anything again.
+
+From the src directory:
+    python -m historical.ingest_pboc --start-year 2006 --end-year 2024
+"""
+import os
 import re
+import json
 import time
-from utils.webscraping import download_html, download_xlsx, extract_paths, construct_pboc_url
-from utils.config import load_config
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Iterable
+from layers.bronze.webscraper import Webscraper
+from layers.bronze.main import extract_download_paths, construct_pboc_url
+from layers.bronze.content_store import ContentStore, S3Backend
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+
+################################################################################
+# Journal
+################################################################################
+class BackfillJournal:
+    """
+    Checkpoint of tables already stored by the backfill.
+
+    Entries look like:
+        {"<year>/<table>": {'url': ..., 'key': ..., 'md5': ..., 'size': ...}}
+    The journal lives in a local file or in S3 (bucket and key).
+    """
+
+    def __init__(self, entries: Optional[Dict[str, dict]] = None, path: Optional[str] = None,
+                 bucket: Optional[str] = None, key: Optional[str] = None):
+        self.entries = entries or {}
+        self.path = path
+        self.bucket = bucket
+        self.key = key
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    @staticmethod
+    def entry_id(year: int, table: str) -> str:
+        return f'{year}/{table}'
+
+    @classmethod
+    def load_local(cls, path: str) -> "BackfillJournal":
+        entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                entries = json.load(file)
+        return cls(entries, path=path)
+
+    @classmethod
+    def load_s3(cls, bucket: str, key: str) -> "BackfillJournal":
+        raw = S3Utility.download_obj_s3(bucket, key)
+        return cls(json.loads(raw) if raw else {}, bucket=bucket, key=key)
+
+    def to_json(self) -> str:
+        with self._lock:
+            return json.dumps(self.entries, indent=1, sort_keys=True)
+
+    def save(self) -> None:
+        with self._save_lock:
+            if self.path:
+                # Write then rename so an interrupted save never truncates the journal.
+                tmp_path = f'{self.path}.tmp'
+                with open(tmp_path, 'w') as file:
+                    file.write(self.to_json())
+                os.replace(tmp_path, self.path)
+            elif self.bucket and self.key:
+                S3Utility.upload_obj_s3(self.bucket, self.key, self.to_json())
+
+    def done(self, year: int, table: str) -> bool:
+        with self._lock:
+            return self.entry_id(year, table) in self.entries
+
+    def record(self, year: int, table: str, url: str, key: str, md5: str, size: int) -> None:
+        with self._lock:
+            self.entries[self.entry_id(year, table)] = {'url': url, 'key': key, 'md5': md5, 'size': size}
+
+################################################################################
+# Runner
+################################################################################
+class BackfillRunner:
+    """
+    Downloads every table listed on each year's category pages and stores
+    it at {s3_key}{year}/{table}.xlsx, skipping tables already in the journal.
+    With a content_store, tables are stored content-addressed instead (one
+    pointer per table and year), so identical workbooks are stored once.
+    """
+
+    def __init__(self, webscraper: Webscraper, config: dict, bucket: str, s3_key: str,
+                 journal: BackfillJournal, max_workers: Optional[int] = None, checkpoint_every: int = 10,
+                 content_store: Optional[ContentStore] = None):
+        self.webscraper = webscraper
+        self.urls = config['webscraping']['urls']['pboc']
+        self.bucket = bucket
+        self.s3_key = s3_key
+        self.journal = journal
+        self.content_store = content_store
+        self.max_workers = max_workers or webscraper.max_workers
+        # Journal is persisted after this many stored tables, and at the end.
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        self._since_checkpoint = 0
+        self.stats = {'tables': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'deduplicated': 0}
+
+    def year_pages(self, year: int) -> List[str]:
+        """Category page URLs for a year, from webscraping.urls.pboc.<year> in config.yml."""
+        year_config = self.urls.get(str(year))
+        if not year_config:
+            return []
+        return [construct_pboc_url(year_config['base'], extension)
+                for extension in year_config['extensions'].values()]
+
+    def discover(self, years: Iterable[int]) -> List[tuple]:
+        """Fetches every year's category pages concurrently; returns [(year, table, url)]."""
+        pages = {}
+        for year in years:
+            urls = self.year_pages(year)
+            if not urls:
+                print(f"No pages configured for {year}; skipping.")
+            for url in urls:
+                pages[url] = year
+        responses = self.webscraper.fetch_all(pages)
+
+        tasks = {}
+        for url, response in responses.items():
+            if response is None:
+                print(f"Could not download {url}; its tables will be retried next run.")
+                continue
+            year = pages[url]
+            for table_name, path in extract_download_paths(response.text, 'xlsx').items():
+                table = re.sub(r'[^a-zA-Z\s]', '', table_name).lower().replace(' ', '_')
+                tasks[(year, table)] = self.urls['base'] + path
+        return [(year, table, url) for (year, table), url in tasks.items()]
+
+    def run(self, years: Iterable[int]) -> dict:
+        start = time.monotonic()
+        tasks = self.discover(years)
+        pending = [task for task in tasks if not self.journal.done(task[0], task[1])]
+        self.stats['skipped'] = len(tasks) - len(pending)
+        print(f"{len(tasks)} tables found; {self.stats['skipped']} already in journal, {len(pending)} to fetch.")
+
+        if pending:
+            workers = max(1, min(self.max_workers, len(pending)))
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for _ in executor.map(self._ingest, pending):
+                        pass
+            finally:
+                # Also checkpoint on interrupt so finished tables are not redone.
+                if self.content_store is not None:
+                    self.content_store.save_index()
+                self.journal.save()
+
+        self.stats['seconds'] = time.monotonic() - start
+        self.report()
+        return self.stats
+
+    def _ingest(self, task: tuple) -> None:
+        year, table, url = task
+        key = f'{self.s3_key}{year}/{table}.xlsx'
+        deduplicated = False
+        try:
+            body = self.webscraper.get_request(url).content
+            if self.content_store is not None:
+                pointer = self.content_store.put(table, body, label=str(year), metadata={'url': url})
+                key = pointer['object_key']
+                deduplicated = not pointer['stored']
+            else:
+                S3Utility.upload_obj_s3(self.bucket, key, body)
+        except Exception as e:
+            print(f"Failed to ingest {year} {table} from {url}: {e}")
+            with self._lock:
+                self.stats['failed'] += 1
+            return
+        self.journal.record(year, table, url, key, hashlib.md5(body).hexdigest(), len(body))
+        with self._lock:
+            self.stats['tables'] += 1
+            self.stats['bytes'] += len(body)
+            self.stats['deduplicated'] += deduplicated
+            self._since_checkpoint += 1
+            checkpoint = self._since_checkpoint >= self.checkpoint_every
+            if checkpoint:
+                self._since_checkpoint = 0
+        if checkpoint:
+            self.journal.save()
+
+    def report(self) -> None:
+        minutes = max(self.stats['seconds'], 1e-9) / 60
+        megabytes = self.stats['bytes'] / (1024 * 1024)
+        print(f"Backfill finished in {self.stats['seconds']:.1f}s: "
+              f"{self.stats['tables']} stored ({self.stats['deduplicated']} deduplicated), "
+              f"{self.stats['skipped']} skipped, {self.stats['failed']} failed; "
+              f"{self.stats['tables'] / minutes:.1f} tables/min, {megabytes / (minutes * 60):.2f} MB/s")
+
 
 if __name__ == "__main__":
-    # TODO: ***NEEDS UPDATE W/ NEW CLASSES***
-    # TODO: allow user to choose years; only doing 2024 for now
+    parser = argparse.ArgumentParser(description="Backfill historical PBOC spreadsheets into S3.")
+    parser.add_argument('--start-year', type=int, default=2006)
+    parser.add_argument('--end-year', type=int, default=2024)
+    parser.add_argument('--config', default='common/config.yml')
+    parser.add_argument('--journal', help="Local journal path; defaults to the S3 journal key in config.yml")
+    parser.add_argument('--workers', type=int, help="Concurrent table downloads (default: webscraping.concurrency.max_workers)")
+    args = parser.parse_args()
 
     # Config
-    config = load_config("config.yml") # Run from base directory
-    s3_bucket = config['storage']['pboc']['s3_bucket']
-    s3_key = config['storage']['pboc']['s3_bronze_key']
-    pboc_base_url = config['webscraping']['urls']['pboc']['base']
-    base_url_2024 = config['webscraping']['urls']['pboc']['2024']['base']
-    extensions_2024 = list(config['webscraping']['urls']['pboc']['2024']['extensions'].values())
-
-    # Construct URLs
-    urls = []
-    for extension in extensions_2024:
-        url = construct_pboc_url(base_url_2024, extension)
-        urls.append(url)
-
-    # Get .xlsx download paths for each page
-    for url in urls:
-        html = download_html(url)
-        print(f"Downloaded html for {url}")
-        if 'xlsx_paths' in locals():
-            xlsx_paths.update(extract_paths(html))
-        else:
-            xlsx_paths = extract_paths(html)
-        print("xlsx paths extracted. Sleeping for 3 seconds...")
-        time.sleep(3)
-
-    # Download .xlsx files and write to S3
-    for table_name, path in xlsx_paths.items():
-        url = pboc_base_url + path
-        cleaned_table_name = re.sub(r'[^a-zA-Z\s]', '', table_name).lower().replace(' ', '_')
-        print(f"Downloading {cleaned_table_name} from {url}...")
-        success = download_xlsx(url, cleaned_table_name, s3_bucket, s3_key)
-        print("Sleeping for 3 seconds...")
-        time.sleep(3)
-
-    print("Finished.")
-    
+    config = load_config(args.config) # Run from src directory
+    S3Utility.from_config(config)
+    s3_bucket = config['aws']['s3_bucket']
+    pboc = config['aws']['pboc']
+    s3_key = pboc.get('s3_historical_key', f"{pboc['s3_bronze_key']}historical/")
+    if args.journal:
+        journal = BackfillJournal.load_local(args.journal)
+    else:
+        journal = BackfillJournal.load_s3(s3_bucket, pboc.get('backfill_journal_key', f'{s3_key}_journal.json'))
+
+    content_store = None
+    if pboc.get('s3_content_store_key'):
+        content_store = ContentStore(S3Backend(s3_bucket), prefix=pboc['s3_content_store_key'])
+
+    with Webscraper.from_config(config) as webscraper:
+        runner = BackfillRunner(webscraper, config, s3_bucket, s3_key, journal,
+                                max_workers=args.workers, content_store=content_store)
+        runner.run(range(args.start_year, args.end_year + 1))
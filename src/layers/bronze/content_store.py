@@ -0,0 +1,161 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+from typing import Any, Optional, Dict
+from common.s3_utils import S3Utility
+
+################################################################################
+# Backends
+################################################################################
+class LocalBackend:
+    """Stores keys as files under a root directory (offline runs and tests)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split('/'))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def put(self, key: str, body: Any) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        with open(path, 'wb') as file:
+            file.write(body if isinstance(body, bytes) else body.read())
+
+class S3Backend:
+    """Stores keys as objects in an S3 bucket."""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+
+    def exists(self, key: str) -> bool:
+        return S3Utility.object_exists(self.bucket, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return S3Utility.download_obj_s3(self.bucket, key)
+
+    def put(self, key: str, body: Any) -> None:
+        S3Utility.upload_obj_s3(self.bucket, key, body)
+
+################################################################################
+# Content store
+################################################################################
+def _label_date(label: str) -> str:
+    """
+    A label as YYYYMMDD, so years and months order against dates: '2024' ->
+    '20240101', '202407' -> '20240701'. Other labels are compared as given.
+    """
+    label = str(label)
+    if label.isdigit() and len(label) in (4, 6):
+        return label + '01' * ((8 - len(label)) // 2)
+    return label
+
+class ContentStore:
+    """
+    Content-addressed layout for bronze workbooks under a prefix:
+
+        {prefix}objects/sha256/ab/abcd....xlsx   one blob per distinct payload
+        {prefix}pointers/{table}/{label}.json    table + date (or year) -> blob
+        {prefix}index.json                       table -> latest pointer
+
+    Identical payloads are stored once, and "has this table changed?" is a
+    lookup in the index rather than a listing.
+    """
+
+    def __init__(self, backend, prefix: str = '', extension: str = 'xlsx'):
+        self.backend = backend
+        self.prefix = prefix
+        self.extension = extension
+        self._index = None
+        self._known = set() # Blobs seen this process, to skip existence checks
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    def object_key(self, sha256: str) -> str:
+        return f'{self.prefix}objects/sha256/{sha256[:2]}/{sha256}.{self.extension}'
+
+    def pointer_key(self, table: str, label: str) -> str:
+        return f'{self.prefix}pointers/{table}/{label}.json'
+
+    @property
+    def index_key(self) -> str:
+        return f'{self.prefix}index.json'
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    raw = self.backend.get(self.index_key)
+                    self._index = json.loads(raw) if raw else {}
+        return self._index
+
+    def latest(self, table: str) -> Optional[dict]:
+        return self.index.get(table)
+
+    def changed(self, table: str, sha256: str) -> bool:
+        latest = self.latest(table)
+        return latest is None or latest['sha256'] != sha256
+
+    def put(self, table: str, body: Any, sha256: Optional[str] = None, label: Optional[str] = None,
+            size: Optional[int] = None, metadata: Optional[dict] = None) -> dict:
+        """
+        Stores a payload for a table (bytes, or a file object when sha256 and
+        size are given) and writes its pointer. The blob is uploaded only if
+        no identical payload is stored yet. label defaults to today's
+        YYYYMMDD. Returns the pointer, with 'stored' telling whether a new
+        blob was written.
+        """
+        if sha256 is None:
+            sha256 = hashlib.sha256(body).hexdigest()
+            size = len(body)
+        label = label or datetime.now(timezone.utc).strftime('%Y%m%d')
+        object_key = self.object_key(sha256)
+
+        stored = False
+        if sha256 not in self._known and not self.backend.exists(object_key):
+            self.backend.put(object_key, body)
+            stored = True
+        self._known.add(sha256)
+
+        pointer = dict(metadata or {}, table=table, label=label, sha256=sha256, size=size, object_key=object_key)
+        self.backend.put(self.pointer_key(table, label), json.dumps(pointer, sort_keys=True))
+        index = self.index
+        with self._lock:
+            latest = index.get(table)
+            if latest is None or _label_date(label) >= _label_date(latest['label']):
+                index[table] = pointer
+                self.dirty = True
+        return dict(pointer, stored=stored)
+
+    def get(self, table: str, label: Optional[str] = None) -> Optional[bytes]:
+        """Payload of a table's latest version, or of the version with the given label."""
+        if label is None:
+            pointer = self.latest(table)
+        else:
+            raw = self.backend.get(self.pointer_key(table, label))
+            pointer = json.loads(raw) if raw else None
+        if pointer is None:
+            return None
+        return self.backend.get(pointer['object_key'])
+
+    def save_index(self) -> None:
+        index = self.index
+        with self._lock:
+            if self.dirty:
+                self.backend.put(self.index_key, json.dumps(index, sort_keys=True))
+                self.dirty = False
@@ -0,0 +1,227 @@
+import io
+import json
+import zipfile
+import hashlib
+import posixpath
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone
+from typing import Any, Optional, List, Iterator, Tuple
+
+################################################################################
+# Fingerprints
+################################################################################
+# An xlsx is a zip of XML parts. Re-exporting an unchanged workbook rewrites
+# zip timestamps, docProps (author, modified time), styles and the order of
+# the shared strings table, so the raw bytes change while every cell stays
+# the same. The fingerprint hashes only the cell values of each sheet, in
+# sheet order: shared strings are resolved, numbers normalized (1, 1.0 and
+# 1.00E0 hash alike), formulas contribute their cached values, and styles
+# and empty cells are ignored. Sheets are read with iterparse, one cell at a
+# time, so memory stays flat however large the sheet.
+#
+# A fingerprint record also keeps a short hash per row, which is enough to
+# tell which sheets and rows changed between two versions.
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+ROW_HASH_LENGTH = 12
+
+class FingerprintError(Exception):
+    """The body is not a readable xlsx workbook."""
+
+def _string_item(element) -> str:
+    """Text of a shared or inline string: plain <t> or rich-text runs; phonetic hints (<rPh>) are skipped."""
+    parts = []
+    for child in element:
+        if child.tag == f'{NS}t':
+            parts.append(child.text or '')
+        elif child.tag == f'{NS}r':
+            parts.append(child.findtext(f'{NS}t') or '')
+    return ''.join(parts)
+
+def _shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as part:
+        for _, element in ElementTree.iterparse(part):
+            if element.tag == f'{NS}si':
+                strings.append(_string_item(element))
+                element.clear()
+    return strings
+
+def _sheet_parts(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """[(sheet name, part path)] in workbook order."""
+    with archive.open('xl/workbook.xml') as part:
+        workbook = ElementTree.parse(part).getroot()
+    with archive.open('xl/_rels/workbook.xml.rels') as part:
+        relationships = {rel.get('Id'): rel.get('Target') for rel in ElementTree.parse(part).getroot()
+                         if rel.tag == f'{PACKAGE_REL_NS}Relationship'}
+    sheets = []
+    for sheet in workbook.iter(f'{NS}sheet'):
+        target = relationships.get(sheet.get(f'{REL_NS}id'))
+        if target is None:
+            continue
+        path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+        sheets.append((sheet.get('name'), path))
+    return sheets
+
+def normalize_number(value: str) -> str:
+    number = float(value)
+    if number.is_integer() and abs(number) < 1e15:
+        return str(int(number))
+    return repr(number)
+
+def _cell_value(cell, shared_strings: List[str]) -> Optional[str]:
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell.find(f'{NS}is')
+        value = _string_item(inline) if inline is not None else ''
+    else:
+        raw = cell.findtext(f'{NS}v')
+        if raw is None:
+            return None
+        if cell_type == 's':
+            value = shared_strings[int(raw)]
+        elif cell_type == 'n':
+            value = normalize_number(raw)
+        elif cell_type == 'b':
+            value = 'TRUE' if raw.strip() == '1' else 'FALSE'
+        else: # str (formula string), e (error), d (ISO date)
+            value = raw
+    value = value.strip()
+    return value or None
+
+def _column(reference: Optional[str], position: int) -> str:
+    if not reference:
+        return str(position)
+    return reference.rstrip('0123456789')
+
+def _rows(archive: zipfile.ZipFile, path: str, shared_strings: List[str]) -> Iterator[Tuple[int, str]]:
+    """(row number, row hash) for every row with at least one value."""
+    with archive.open(path) as part:
+        row_number = 0
+        for _, element in ElementTree.iterparse(part):
+            if element.tag != f'{NS}row':
+                continue
+            row_number = int(element.get('r') or row_number + 1)
+            values = []
+            for position, cell in enumerate(element.iterfind(f'{NS}c')):
+                value = _cell_value(cell, shared_strings)
+                if value is not None:
+                    values.append(f'{_column(cell.get("r"), position)}={value}')
+            element.clear()
+            if values:
+                digest = hashlib.sha256('\x1f'.join(values).encode('utf-8')).hexdigest()
+                yield row_number, digest[:ROW_HASH_LENGTH]
+
+def workbook_cells(source: Any) -> Iterator[Tuple[str, int, str, str]]:
+    """
+    (sheet, row number, column, value) for every non-empty cell of an xlsx
+    body, with values normalized as for fingerprints. Raises
+    FingerprintError if the body is not an xlsx workbook.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        with zipfile.ZipFile(source) as archive:
+            shared_strings = _shared_strings(archive)
+            for name, path in _sheet_parts(archive):
+                with archive.open(path) as part:
+                    row_number = 0
+                    for _, element in ElementTree.iterparse(part):
+                        if element.tag != f'{NS}row':
+                            continue
+                        row_number = int(element.get('r') or row_number + 1)
+                        for position, cell in enumerate(element.iterfind(f'{NS}c')):
+                            value = _cell_value(cell, shared_strings)
+                            if value is not None:
+                                yield name, row_number, _column(cell.get('r'), position), value
+                        element.clear()
+    except (zipfile.BadZipFile, KeyError, ValueError, IndexError, ElementTree.ParseError) as e:
+        raise FingerprintError(f'Not a readable xlsx workbook: {type(e).__name__}: {e}')
+
+def fingerprint_workbook(source: Any) -> dict:
+    """
+    Fingerprint of an xlsx body (bytes or a seekable file object):
+
+        {'fingerprint': sha256 hex,
+         'sheets': {name: {'hash': sha256 hex, 'rows': {row number: row hash}}}}
+
+    Raises FingerprintError if the body is not an xlsx workbook.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        with zipfile.ZipFile(source) as archive:
+            shared_strings = _shared_strings(archive)
+            sheets = {}
+            overall = hashlib.sha256()
+            for name, path in _sheet_parts(archive):
+                sheet_hash = hashlib.sha256()
+                rows = {}
+                for row_number, row_hash in _rows(archive, path, shared_strings):
+                    rows[str(row_number)] = row_hash
+                    sheet_hash.update(f'{row_number}:{row_hash}\n'.encode('utf-8'))
+                sheets[name] = {'hash': sheet_hash.hexdigest(), 'rows': rows}
+                overall.update(f'{name}\x00{sheets[name]["hash"]}\n'.encode('utf-8'))
+    except (zipfile.BadZipFile, KeyError, ValueError, IndexError, ElementTree.ParseError) as e:
+        raise FingerprintError(f'Not a readable xlsx workbook: {type(e).__name__}: {e}')
+    return {'fingerprint': overall.hexdigest(), 'sheets': sheets}
+
+def diff_fingerprints(old: Optional[dict], new: dict) -> dict:
+    """
+    Which sheets and rows changed between two fingerprint records:
+
+        {'sheets_added': [...], 'sheets_removed': [...],
+         'sheets': {name: {'rows_changed': [...], 'rows_added': [...], 'rows_removed': [...]}}}
+
+    Only sheets with changes are listed; row numbers are ints. With no old
+    record every sheet counts as added.
+    """
+    old_sheets = (old or {}).get('sheets', {})
+    new_sheets = new.get('sheets', {})
+    diff = {
+        'sheets_added': [name for name in new_sheets if name not in old_sheets],
+        'sheets_removed': [name for name in old_sheets if name not in new_sheets],
+        'sheets': {},
+    }
+    for name, sheet in new_sheets.items():
+        previous = old_sheets.get(name)
+        if previous is None or previous['hash'] == sheet['hash']:
+            continue
+        old_rows, new_rows = previous['rows'], sheet['rows']
+        diff['sheets'][name] = {
+            'rows_changed': sorted(int(row) for row in new_rows if row in old_rows and old_rows[row] != new_rows[row]),
+            'rows_added': sorted(int(row) for row in new_rows if row not in old_rows),
+            'rows_removed': sorted(int(row) for row in old_rows if row not in new_rows),
+        }
+    return diff
+
+################################################################################
+# Store
+################################################################################
+class FingerprintStore:
+    """
+    Latest fingerprint record per table, at {prefix}{table}.json on a
+    LocalBackend/S3Backend (see content_store). Records also carry the raw
+    hash and key of the bronze object they describe and the diff from the
+    previous version.
+    """
+
+    def __init__(self, backend, prefix: str = ''):
+        self.backend = backend
+        self.prefix = prefix
+
+    def key(self, table: str) -> str:
+        return f'{self.prefix}{table}.json'
+
+    def get(self, table: str) -> Optional[dict]:
+        raw = self.backend.get(self.key(table))
+        return json.loads(raw) if raw else None
+
+    def put(self, table: str, record: dict, **details) -> dict:
+        record = dict(record, table=table, recorded_at=datetime.now(timezone.utc).isoformat(), **details)
+        self.backend.put(self.key(table), json.dumps(record, sort_keys=True))
+        return record
@@ -0,0 +1,39 @@
+from typing import Optional
+from layers.bronze.main import run_bronze
+from layers.bronze.webscraper import Webscraper
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+from common.metrics import metrics
+
+# Kept across warm invocations: the parsed config, the pooled HTTP session
+# and (inside S3Utility) the S3 client are built once per container.
+_config: Optional[dict] = None
+_webscraper: Optional[Webscraper] = None
+
+def _warm_state():
+    global _config, _webscraper
+    if _config is None:
+        _config = load_config("common/config.yml")
+        S3Utility.from_config(_config)
+    if _webscraper is None:
+        _webscraper = Webscraper.from_config(_config)
+    return _config, _webscraper
+
+def lambda_handler(event, context):
+    config, webscraper = _warm_state()
+    # Warm invocations reuse the process; start each run from zero.
+    metrics.reset()
+    bronze = run_bronze(config, webscraper=webscraper, force=(event or {}).get('force', False))
+    result = bronze['result']
+    metrics.emit_from_config(config, Pipeline='bronze')
+    return {
+        'updated': bronze['updated'],
+        'unchanged': len(result.unchanged),
+        'cosmetic': result.cosmetic,
+        'not_modified': len(result.not_modified),
+        'failed': result.failed,
+        'bytes_downloaded': result.bytes_downloaded,
+    }
+
+# Lambda entry point: layers/bronze/handler.handler
+handler = lambda_handler
@@ -0,0 +1,134 @@
+from html.parser import HTMLParser
+from typing import Optional, Dict, Iterable
+
+# Fastest installed parser wins; the stdlib parser needs no extra packages.
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+BACKENDS = tuple(name for name, available in (
+    ('selectolax', SelectolaxParser is not None),
+    ('lxml', lxml is not None),
+    ('html.parser', True),
+) if available)
+DEFAULT_BACKEND = BACKENDS[0]
+
+DATA_TABLE_CLASS = 'data_table'
+
+################################################################################
+# Link extraction
+################################################################################
+def extract_links(html: str, file_extensions: Iterable[str], backend: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Single pass over the rows of every `table.data_table` on a page.
+
+    Returns {extension: {name: href}}, where name is the text of the row's
+    first cell and href is any link in the row ending in .<extension>.
+    When a name has several links with the same extension, the last wins.
+    """
+    extensions = list(dict.fromkeys(file_extensions))
+    links = {extension: {} for extension in extensions}
+    suffixes = [(f'.{extension}', links[extension]) for extension in extensions]
+
+    for name, hrefs in _ROW_READERS[backend or DEFAULT_BACKEND](html):
+        for href in hrefs:
+            for suffix, found in suffixes:
+                if href.endswith(suffix):
+                    found[name] = href
+    return links
+
+def _rows_selectolax(html: str):
+    for table in SelectolaxParser(html).css(f'table.{DATA_TABLE_CLASS}'):
+        for row in table.css('tr'):
+            cells = row.css('td')
+            if cells:
+                hrefs = [link.attributes.get('href') or '' for link in row.css('a[href]')]
+                yield cells[0].text(deep=True).strip(), hrefs
+
+def _rows_lxml(html: str):
+    document = lxml.html.fromstring(html)
+    tables = document.xpath(f"//table[contains(concat(' ', normalize-space(@class), ' '), ' {DATA_TABLE_CLASS} ')]")
+    for table in tables:
+        for row in table.iter('tr'):
+            cells = list(row.iter('td'))
+            if cells:
+                hrefs = [link.get('href') for link in row.iter('a') if link.get('href') is not None]
+                yield cells[0].text_content().strip(), hrefs
+
+def _rows_html_parser(html: str):
+    parser = _DataTableRowParser()
+    parser.feed(html)
+    parser.close()
+    return parser.rows
+
+_ROW_READERS = {
+    'selectolax': _rows_selectolax,
+    'lxml': _rows_lxml,
+    'html.parser': _rows_html_parser,
+}
+
+class _DataTableRowParser(HTMLParser):
+    """
+    Streaming (name, hrefs) reader for data_table rows on the stdlib parser.
+    Tolerates the unclosed <td>/<tr> tags common on the PBOC pages.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._depth = 0 # Table nesting depth inside a data_table
+        self._row_open = False
+        self._cells = 0
+        self._in_first_cell = False
+        self._name_parts = []
+        self._hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self._depth:
+                self._depth += 1
+            elif DATA_TABLE_CLASS in (dict(attrs).get('class') or '').split():
+                self._depth = 1
+            return
+        if not self._depth:
+            return
+        if tag == 'tr':
+            self._flush_row()
+            self._row_open = True
+        elif tag == 'td' and self._row_open:
+            self._cells += 1
+            self._in_first_cell = self._cells == 1
+        elif tag == 'a' and self._row_open:
+            href = dict(attrs).get('href')
+            if href is not None:
+                self._hrefs.append(href)
+
+    def handle_endtag(self, tag):
+        if not self._depth:
+            return
+        if tag == 'td':
+            self._in_first_cell = False
+        elif tag == 'tr':
+            self._flush_row()
+        elif tag == 'table':
+            self._depth -= 1
+            if not self._depth:
+                self._flush_row()
+
+    def handle_data(self, data):
+        if self._in_first_cell:
+            self._name_parts.append(data)
+
+    def _flush_row(self):
+        if self._row_open and self._cells:
+            self.rows.append((''.join(self._name_parts).strip(), self._hrefs))
+        self._row_open = False
+        self._cells = 0
+        self._in_first_cell = False
+        self._name_parts = []
+        self._hrefs = []
@@ -1,181 +1,198 @@
-import re
-import time
-import boto3
-import hashlib
-from bs4 import BeautifulSoup
+from typing import Optional
 from layers.bronze.webscraper import Webscraper
+from layers.bronze.validators import ValidatorManifest
+from layers.bronze.pipeline import BronzePipeline
+from layers.bronze.links import extract_links
+from layers.bronze.content_store import ContentStore, S3Backend
+from layers.bronze.fingerprint import FingerprintStore
+from layers.bronze.sources import Source, load_source, format_title, construct_pboc_url
+from layers.bronze.scheduler import PollingPolicy, PollingState, listing_hash, bronze_release_dates, today_utc
 from common.s3_utils import S3Utility
-from common.emailer import Emailer
 from common.config_utils import load_config
-import sys
-
-def format_title(s: str) -> str:
-    # List of words not to capitalize in titles
-    small_words = {"a", "an", "the", "and", "but", "for", "nor", "or", "so", "yet", "at", 
-                   "by", "in", "of", "on", "to", "up", "for", "with", "over", "into", "onto", "from"}
-    caps_words = {"rmb, cgpi"}
-    words = s.split('-')
-    title_words = []
-    for i, word in enumerate(words):
-        if word in caps_words:
-            title_words.append(word.upper())
-        elif i == 0 or i == len(words) - 1 or word not in small_words:
-            title_words.append(word.capitalize())
-        else:
-            title_words.append(word)
-
-    return ' '.join(title_words)
+from common.metrics import metrics
 
 ################################################################################
-# Hashing
+# PBOC scraping
 ################################################################################
-def compute_md5(obj: str) -> str:
-    """Calculate the MD5 hash of a string object."""
-    hash_md5 = hashlib.md5()
-    hash_md5.update(obj)
-    return hash_md5.hexdigest()
+@metrics.timed('bronze.extract_links.seconds')
+def extract_download_paths(html: str, file_extension: str) -> dict:
+    """{name: href} for one extension; use extract_links to get several in one pass."""
+    return extract_links(html, [file_extension])[file_extension]
 
 ################################################################################
-# PBOC scraping
+# Bronze run
 ################################################################################
-def extract_download_paths(html: str, file_extension: str) -> list:
-    soup = BeautifulSoup(html, 'html.parser')
-    name_link_dict = {}
-    tables = soup.find_all('table', class_='data_table')
-    for table in tables:
-        rows = table.find_all('tr')
-        for row in rows:
-            cells = row.find_all('td')
-            if cells and len(cells) > 0:
-                # Name is in first cell of row.
-                name = cells[0].text.strip()
-                links = row.find_all('a', href=True)
-                for link in links:
-                    if link['href'].endswith(f'.{file_extension}'):
-                        name_link_dict[name] = link['href']
-    return name_link_dict
-
-def construct_pboc_url(base_url: str, insertion: str) -> str:
-    # Find the index of the last occurrence of "/"
-    last_slash_index = base_url.rfind('/')
-    
-    # Split the string into before and after "/"
-    before_last_slash = base_url[:last_slash_index + 1]  # Include the "/"
-    after_last_slash = base_url[last_slash_index + 1:]
-        
-    return before_last_slash + insertion + "/" + after_last_slash
+def run_bronze(config: dict, webscraper: Optional[Webscraper] = None, source: Optional[Source] = None,
+               force: bool = False) -> dict:
+    """
+    Polls a source's category pages (default: PBOC) and streams changed
+    spreadsheets to S3. Returns the updated tables ({table: S3 key}), the
+    BronzeRunResult, and the category links the email is built from.
 
+    Unless force is set (or webscraping.scheduling.enabled is false), only
+    categories the polling policy considers due are fetched, and only the
+    spreadsheets of categories whose listing changed (or is due a recheck)
+    are requested.
 
-if __name__ == "__main__":
+    A webscraper passed in (e.g. kept across warm Lambda invocations) is
+    left open; otherwise one is built from config and closed at the end.
+    """
+    source = source or load_source(config)
     # Config
-    config = load_config("common/config.yml") # Run from base directory
     ## S3
     s3_bucket = config['aws']['s3_bucket']
-    s3_key = config['aws']['pboc']['s3_bronze_key']
-    ## Webscraping
-    pboc_base_url = config['webscraping']['urls']['pboc']['base']
-    base_url_2024 = config['webscraping']['urls']['pboc']['2024']['base']
-    extensions_2024 = config['webscraping']['urls']['pboc']['2024']['extensions'] # dict
-    #extensions_2024 = list(config['webscraping']['urls']['pboc']['2024']['extensions'].values())
-    #parent_categories_2024 = list(config['webscraping']['urls']['pboc']['2024']['extensions'].keys())
-    #parent_categories_2024 = [format_title(x) for x in parent_categories_2024]
-    ## Email
-    sender = config['email']['sender']
-    gmail_app_password = config['email']['gmail_app_password']
-    recipients = config['email']['recipients']
+    s3_key = source.storage['s3_bronze_key']
+    validator_manifest_key = source.storage.get(
+        'validator_manifest_key', f'{s3_key}_manifests/http_validators.json')
+    polling_state_key = source.storage.get('polling_state_key', f'{s3_key}_manifests/polling_state.json')
+    s3_manifest_key = source.storage.get('s3_manifest_key') # Optional persisted listing
+    content_store_key = source.storage.get('s3_content_store_key') # Optional content-addressed layout
+    fingerprint_key = source.storage.get('s3_fingerprint_key', f'{s3_key}_fingerprints/')
+    ## Scheduling
+    scheduling = (config.get('webscraping') or {}).get('scheduling') or {}
+    force = force or not scheduling.get('enabled', True)
+    policy = PollingPolicy.from_config(config)
+    polling_state = PollingState.load_s3(s3_bucket, polling_state_key)
+    today = today_utc()
 
-    # Construct URLs
-    parent_category_urls = dict()
-    for parent_category, extension in extensions_2024.items():
-        parent_category_formatted = format_title(parent_category)
-        url = construct_pboc_url(base_url_2024, extension)
-        parent_category_urls[parent_category_formatted] = url
+    # Category pages due today
+    parent_category_urls = source.category_urls()
+    due_urls = dict()
+    for parent_category, url in parent_category_urls.items():
+        due, reason = (True, 'forced') if force else policy.due(polling_state.get(f'{source.name}/{parent_category}'), today)
+        if due:
+            due_urls[parent_category] = url
+        else:
+            print(f"Skipping {parent_category}: {reason}")
+    metrics.incr('bronze.categories', len(parent_category_urls))
+    metrics.incr('bronze.categories_skipped', len(parent_category_urls) - len(due_urls))
 
     # Get .xlsx and .htm paths for each page
     # Also store {parent_category: {subcategory: url}...} for email
     email_input = dict()
-    webscraper = Webscraper()
-    for parent_category, url in parent_category_urls.items():
-        response = webscraper.get_request(url)
-        html = response.text
-        print(f"Downloaded html for {url}")
-        # xlsx for s3 storage
-        if 'xlsx_paths' in locals():
-            xlsx_paths.update(extract_download_paths(html, 'xlsx'))
-        else:
-            xlsx_paths = extract_download_paths(html, 'xlsx')
-        # htm for email links
-        email_input[parent_category] = extract_download_paths(html, 'htm')
-        print("xlsx and htm paths extracted. Sleeping for 3 seconds...")
-        time.sleep(3)
-    """
-    for k,v in email_input.items():
-        print(f"***{k}***")
-        for x,y in v.items():
-            print(f"{x}: {y}")
-    """
-    
-    # Download .xlsx files
-    spreadsheets = dict()
-    #categories_urls = dict()
-    for table_name, path in xlsx_paths.items():
-        url = pboc_base_url + path
-        cleaned_table_name = re.sub(r'[^a-zA-Z\s]', '', table_name).lower().replace(' ', '_')
-        #categories_urls[cleaned_table_name] = url
-        print(f"Downloading {cleaned_table_name} from {url}...")
-        response = webscraper.get_request(url)
-        spreadsheet = response.content
-        spreadsheets[cleaned_table_name] = spreadsheet
-        print("Sleeping for 3 seconds...")
-        time.sleep(3)
+    table_urls = dict()
+    category_tables = dict()
+    owns_webscraper = webscraper is None
+    if owns_webscraper:
+        webscraper = Webscraper.from_config(config)
+    try:
+        with metrics.timer('bronze.category_pages.seconds'):
+            category_pages = webscraper.fetch_all(due_urls.values())
+        for parent_category, url in parent_category_urls.items():
+            state_key = f'{source.name}/{parent_category}'
+            entry = polling_state.get(state_key)
+            if category_pages.get(url) is None:
+                if parent_category in due_urls:
+                    print(f"Skipping {parent_category}; could not download {url}")
+                if entry is not None:
+                    email_input[parent_category] = entry.get('links', {})
+                continue
+            print(f"Downloaded html for {url}")
+            listing = source.parse_listing(parent_category, category_pages[url].text)
+            email_input[parent_category] = listing.links
+            listing_fingerprint = listing_hash(listing.tables, listing.links)
+            check, reason = (True, 'forced') if force else policy.check_tables(entry, listing_fingerprint, today)
+            polling_state.record_poll(state_key, url, list(listing.tables), listing.links, today)
+            if not check:
+                print(f"Not checking {parent_category} spreadsheets: {reason}")
+                continue
+            table_urls.update(listing.tables)
+            category_tables[state_key] = (listing_fingerprint, list(listing.tables))
+            print("xlsx and htm paths extracted.")
+
+        # Stream .xlsx files: each body is hashed as it downloads and uploaded to
+        # S3 only if it changed, while the remaining downloads continue.
+        # Conditional requests: only spreadsheets whose upstream ETag/Last-Modified
+        # changed since the last run are downloaded.
+        validator_manifest = ValidatorManifest.load_s3(s3_bucket, validator_manifest_key)
+        # Content-addressed store: change detection is one GET of its index.
+        # Otherwise one listing (or one GET of the persisted manifest) covers every table.
+        content_store = None
+        s3_manifest = None
+        if content_store_key:
+            content_store = ContentStore(S3Backend(s3_bucket), prefix=content_store_key)
+        elif table_urls:
+            s3_manifest = S3Utility.load_manifest(s3_bucket, s3_key, s3_manifest_key)
+        print(f"Checking {len(table_urls)} spreadsheets for upstream changes...")
+        pipeline = BronzePipeline.from_config(
+            config, webscraper, s3_bucket, s3_manifest,
+            validator_manifest=validator_manifest,
+            content_store=content_store,
+            # Cosmetic re-exports (same cells, new bytes) are not updates.
+            fingerprints=FingerprintStore(S3Backend(s3_bucket), prefix=fingerprint_key)
+        )
+        with metrics.timer('bronze.pipeline.seconds'):
+            result = pipeline.run(table_urls)
+        print(result)
+        metrics.incr('bronze.tables', len(table_urls))
+        metrics.incr('bronze.updated', len(result.updated))
+        metrics.incr('bronze.unchanged', len(result.unchanged))
+        metrics.incr('bronze.cosmetic', len(result.cosmetic))
+        metrics.incr('bronze.not_modified', len(result.not_modified))
+        metrics.incr('bronze.missing', len(result.missing))
+        metrics.incr('bronze.failed', len(result.failed))
+        updated_spreadsheets = result.updated
+        validator_manifest.save_s3(s3_bucket, validator_manifest_key)
+        if content_store is not None:
+            content_store.save_index()
+        elif s3_manifest_key and updated_spreadsheets:
+            s3_manifest.save(s3_manifest_key)
+
+        # Teach the scheduler when each category releases. A category counts as
+        # checked (so an unchanged listing can skip it) only if none of its
+        # spreadsheets failed.
+        for state_key, (listing_fingerprint, tables) in category_tables.items():
+            if any(table in updated_spreadsheets for table in tables):
+                polling_state.record_release(state_key, today, policy.max_releases)
+            if not any(table in result.failed for table in tables):
+                polling_state.record_check(state_key, listing_fingerprint, today)
+        if not polling_state.history_loaded:
+            prefixes = [s3_key] + ([content_store_key] if content_store_key and not content_store_key.startswith(s3_key) else [])
+            polling_state.learn(bronze_release_dates(s3_bucket, prefixes), policy.max_releases)
+        polling_state.save_s3(s3_bucket, polling_state_key)
+    finally:
+        # Also on failure, so the pooled session is not leaked.
+        if owns_webscraper:
+            webscraper.close()
+
+    return {
+        'updated': updated_spreadsheets,
+        'result': result,
+        'email_input': email_input,
+        'parent_category_urls': parent_category_urls,
+    }
+
+
+if __name__ == "__main__":
+    # Config
+    config = load_config("common/config.yml") # Run from base directory
+    S3Utility.from_config(config)
+    ## Email
+    recipients = config['email']['recipients']
+
+    bronze = run_bronze(config)
+    updated_spreadsheets = bronze['updated']
+    email_input = bronze['email_input']
+    parent_category_urls = bronze['parent_category_urls']
 
-    # Compare md5 hashes and upload to S3 if spreadsheet has changed
-    s3 = S3Utility()
-    updated_spreadsheets = dict()
-    for cleaned_table_name, spreadsheet in spreadsheets.items():
-        # Get ETag of most recent upload of the spreadsheet
-        s3_prefix = f'{s3_key}{cleaned_table_name}'
-        latest_file_key = s3.get_latest_file_key(s3_bucket, s3_prefix)
-        if latest_file_key:
-            # Compute hashes for new and existing spreadsheets
-            existing_spreadsheet_md5 = s3.download_etag(s3_bucket, latest_file_key)
-            new_spreadsheet_md5 = compute_md5(spreadsheet)
-            # Upload to S3 if spreadsheet has changed
-            if existing_spreadsheet_md5 != new_spreadsheet_md5:
-                print(f"{cleaned_table_name} has changed!")
-                updated_spreadsheets[cleaned_table_name] = spreadsheet
-                new_file_key = s3.replace_timestamp_in_filename(latest_file_key)
-                s3.upload_obj_s3(s3_bucket, new_file_key, spreadsheet)
-            else:
-                print(f"No changes for {s3_prefix}")
-        else:
-            print(f"File does not exist: {latest_file_key}")
-    
     # NOTE: do not email at bronze layer in handler; 
     # should ultimately be done at gold after aggregations
     if updated_spreadsheets:
         # Email any updated spreadsheets
-        emailer = Emailer(sender, gmail_app_password)
-        # Write changed spreadsheets to /tmp
-        file_paths = []
-        for cleaned_table_name, spreadsheet in updated_spreadsheets.items():
-            file_path = f'tmp/{cleaned_table_name}.xlsx'
-            file_paths.append(file_path)
-            with open(file_path, 'wb') as file:
-                file.write(spreadsheet)
+        from common.emailer import Emailer, attachments_from_s3 # Only needed on update days
+        emailer = Emailer.from_config(config)
+        # Changed spreadsheets are read back from S3 into memory, not from disk
+        attachments = []
+        if (config['email'].get('attachments') or {}).get('spreadsheets'):
+            attachments = attachments_from_s3(config['aws']['s3_bucket'], updated_spreadsheets)
         # Email contents
-        updated_table_names_formatted = [x + "\n" for x in updated_spreadsheets.keys()]
         title = "TLG - PBOC data has been updated today"
         body = emailer.create_email_body(email_input, parent_category_urls, updated_spreadsheets)
         # Send email
-        emailer.send_gmail(
-            recipients=recipients,
-            title=title,
-            body=body,
-            #attachments=file_paths
-        )
-        print("Successfully sent email!")
+        if emailer.send_gmail(recipients=recipients, title=title, body=body, attachments=attachments):
+            print("Successfully sent email!")
     else:
         print("No updates; did not send email.")
 
-
+    # Per-run metrics summary (JSON, or CloudWatch EMF) on stdout
+    metrics.emit_from_config(config, Pipeline='bronze')
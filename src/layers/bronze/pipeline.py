@@ -0,0 +1,316 @@
+import os
+import time
+import queue
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List
+from common.s3_utils import S3Utility, S3Manifest
+from layers.bronze.webscraper import Webscraper, WebscraperError
+from layers.bronze.validators import ValidatorManifest
+from layers.bronze.content_store import ContentStore
+from layers.bronze.fingerprint import FingerprintStore, FingerprintError, fingerprint_workbook, diff_fingerprints
+from common.metrics import metrics
+
+_DONE = object()
+
+################################################################################
+# Results
+################################################################################
+class BronzeRunResult:
+    """
+    Outcome of a BronzePipeline run, by cleaned table name.
+
+    `updated` maps table -> new S3 key; `unchanged` lists tables whose body
+    hash matched S3 (or the content store index); `not_modified` lists
+    tables the server reported as unchanged (no body downloaded); `missing`
+    lists tables with no object in S3 yet; `failed` maps table -> error
+    message. `cosmetic` lists tables whose bytes changed but whose cell
+    values did not (not uploaded), and `diffs` maps each updated table to
+    the sheets and rows that changed (see diff_fingerprints).
+    """
+
+    def __init__(self):
+        self.updated = {}
+        self.unchanged = []
+        self.cosmetic = []
+        self.diffs = {}
+        self.not_modified = []
+        self.missing = []
+        self.failed = {}
+        self.bytes_downloaded = 0
+
+    def __repr__(self) -> str:
+        return (f"BronzeRunResult(updated={len(self.updated)}, unchanged={len(self.unchanged)}, "
+                f"cosmetic={len(self.cosmetic)}, not_modified={len(self.not_modified)}, missing={len(self.missing)}, failed={len(self.failed)})")
+
+class _Download:
+    """A fetched body spooled to memory (or disk past spool_max_size), with its hashes."""
+
+    def __init__(self, table: str, url: str, headers, body, md5: str, sha256: str, size: int):
+        self.table = table
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.md5 = md5
+        self.sha256 = sha256
+        self.size = size
+
+################################################################################
+# Pipeline
+################################################################################
+class BronzePipeline:
+    """
+    Streaming fetch -> hash -> conditional upload for bronze spreadsheets.
+
+    Fetch workers stream each body in chunks, hashing it as it arrives into a
+    spooled temporary file, and hand it to the upload workers through a
+    bounded queue. Upload workers compare the hash with the latest S3 ETag,
+    upload changed bodies and release them. At most
+    (fetch workers + queue_size + upload_workers) bodies are alive at once,
+    and each keeps at most spool_max_size bytes in memory.
+
+    With a content_store, changes are detected against its index and changed
+    bodies are stored content-addressed instead of as timestamped copies;
+    new tables are stored rather than reported missing.
+
+    With a fingerprint store, bodies whose raw hash changed are fingerprinted
+    by cell values before uploading; a re-export with identical cells is
+    counted as cosmetic and not uploaded. Bodies that are not xlsx fall back
+    to the raw-hash decision.
+    """
+
+    def __init__(
+        self,
+        webscraper: Webscraper,
+        bucket: str,
+        s3_manifest: S3Manifest,
+        validator_manifest: Optional[ValidatorManifest] = None,
+        content_store: Optional[ContentStore] = None,
+        fingerprints: Optional[FingerprintStore] = None,
+        queue_size: int = 4,
+        upload_workers: int = 2,
+        chunk_size: int = 64 * 1024,
+        spool_max_size: int = 8 * 1024 * 1024,
+        save_dir: Optional[str] = None
+    ):
+        self.webscraper = webscraper
+        self.bucket = bucket
+        self.s3_manifest = s3_manifest
+        self.validator_manifest = validator_manifest
+        self.content_store = content_store
+        self.fingerprints = fingerprints
+        self.queue_size = queue_size
+        self.upload_workers = upload_workers
+        self.chunk_size = chunk_size
+        self.spool_max_size = spool_max_size
+        # Changed bodies are also copied here (e.g. for email attachments).
+        self.save_dir = save_dir
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict, webscraper: Webscraper, bucket: str, s3_manifest: S3Manifest, **kwargs) -> "BronzePipeline":
+        """
+        Build a BronzePipeline, taking queue and chunk sizes from the
+        `webscraping.streaming` section of config.yml when present.
+        """
+        for name, value in ((config.get('webscraping') or {}).get('streaming') or {}).items():
+            kwargs.setdefault(name, value)
+        return cls(webscraper, bucket, s3_manifest, **kwargs)
+
+    def run(self, table_urls: Dict[str, str]) -> BronzeRunResult:
+        """
+        Processes {cleaned table name: url}. Without a content store, tables
+        with no object in S3 yet are not downloaded. Validators are recorded only for bodies that are
+        persisted or identical to S3.
+        """
+        result = BronzeRunResult()
+        tables = []
+        for table in table_urls:
+            if self.content_store is None and self.s3_manifest.latest(table) is None:
+                print(f"File does not exist: {self.s3_manifest.prefix}{table}")
+                result.missing.append(table)
+            else:
+                tables.append(table)
+        if not tables:
+            return result
+
+        downloads = queue.Queue(maxsize=self.queue_size)
+        uploaders = [
+            threading.Thread(target=self._upload_worker, args=(downloads, result), daemon=True)
+            for _ in range(max(1, self.upload_workers))
+        ]
+        for uploader in uploaders:
+            uploader.start()
+        try:
+            workers = max(1, min(self.webscraper.max_workers, len(tables)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self._fetch, table, table_urls[table], downloads, result): table
+                           for table in tables}
+                for future, table in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Failed to fetch {table}: {e}")
+                        self._record(result.failed, table, f'{type(e).__name__}: {e}')
+        finally:
+            for _ in uploaders:
+                downloads.put(_DONE)
+            for uploader in uploaders:
+                uploader.join()
+        return result
+
+    ############################################################################
+    # Stages
+    ############################################################################
+    def _fetch(self, table: str, url: str, downloads: queue.Queue, result: BronzeRunResult) -> None:
+        try:
+            if self.validator_manifest is None:
+                response = self.webscraper.get_request(url, stream=True)
+            else:
+                response = self.webscraper.conditional_get(url, self.validator_manifest, stream=True)
+        except WebscraperError as e:
+            print(f"Failed to download {table} from {url}: {e}")
+            self._record(result.failed, table, str(e))
+            return
+        if response is None:
+            self._record(result.not_modified, table)
+            return
+
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_max_size)
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        size = 0
+        hash_seconds = 0.0
+        try:
+            with response, metrics.timer('bronze.download.seconds'):
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    start = time.perf_counter()
+                    md5.update(chunk)
+                    sha256.update(chunk)
+                    hash_seconds += time.perf_counter() - start
+                    body.write(chunk)
+                    size += len(chunk)
+        except Exception as e:
+            body.close()
+            print(f"Failed to download {table} from {url}: {e}")
+            self._record(result.failed, table, f'{type(e).__name__}: {e}')
+            return
+        body.seek(0)
+        metrics.observe('bronze.download.bytes', size, unit='Bytes')
+        metrics.observe('bronze.hash.seconds', hash_seconds, unit='Seconds')
+        print(f"Downloaded {table} from {url}")
+        # Blocks while the upload stage is behind, bounding memory.
+        with metrics.timer('bronze.queue_wait.seconds'):
+            downloads.put(_Download(table, url, response.headers, body, md5.hexdigest(), sha256.hexdigest(), size))
+
+    def _upload_worker(self, downloads: queue.Queue, result: BronzeRunResult) -> None:
+        while True:
+            download = downloads.get()
+            if download is _DONE:
+                return
+            try:
+                with metrics.timer('bronze.persist.seconds'):
+                    self._persist(download, result)
+            except Exception as e:
+                print(f"Failed to upload {download.table}: {e}")
+                self._record(result.failed, download.table, str(e))
+            finally:
+                download.body.close()
+
+    def _persist(self, download: _Download, result: BronzeRunResult) -> None:
+        with self._lock:
+            result.bytes_downloaded += download.size
+        if self.content_store is not None:
+            self._persist_content(download, result)
+        else:
+            self._persist_timestamped(download, result)
+        # Body is persisted (or identical to S3); remember its validators.
+        if self.validator_manifest is not None:
+            with self._lock:
+                self.validator_manifest.update(download.url, download.headers)
+
+    def _persist_content(self, download: _Download, result: BronzeRunResult) -> None:
+        if not self.content_store.changed(download.table, download.sha256):
+            print(f"No changes for {download.table}")
+            self._record(result.unchanged, download.table)
+            return
+        semantic = self._semantic_change(download, result)
+        if semantic is None:
+            return
+        print(f"{download.table} has changed!")
+        metadata = {'url': download.url}
+        if semantic:
+            metadata['fingerprint'] = semantic['fingerprint']
+        pointer = self.content_store.put(download.table, download.body, sha256=download.sha256,
+                                         size=download.size, metadata=metadata)
+        self._save_copy(download)
+        self._record_fingerprint(download, semantic, pointer['object_key'], result)
+        self._record(result.updated, download.table, pointer['object_key'])
+
+    def _persist_timestamped(self, download: _Download, result: BronzeRunResult) -> None:
+        latest_file = self.s3_manifest.latest(download.table)
+        if latest_file['etag'] != download.md5:
+            semantic = self._semantic_change(download, result)
+            if semantic is None:
+                return
+            print(f"{download.table} has changed!")
+            new_file_key = S3Utility.replace_timestamp_in_filename(latest_file['key'])
+            download.body.seek(0)
+            S3Utility.upload_obj_s3(self.bucket, new_file_key, download.body)
+            self._save_copy(download)
+            self._record_fingerprint(download, semantic, new_file_key, result)
+            with self._lock:
+                self.s3_manifest.record_upload(new_file_key, download.md5, download.size)
+                result.updated[download.table] = new_file_key
+        else:
+            print(f"No changes for {self.s3_manifest.prefix}{download.table}")
+            self._record(result.unchanged, download.table)
+
+    def _semantic_change(self, download: _Download, result: BronzeRunResult) -> Optional[dict]:
+        """
+        For a body whose bytes changed: its fingerprint record (with the
+        previous record under 'previous') when the cells changed too, None
+        when only the bytes did, or {} when there is nothing to compare.
+        """
+        if self.fingerprints is None:
+            return {}
+        try:
+            with metrics.timer('bronze.fingerprint.seconds'):
+                download.body.seek(0)
+                record = fingerprint_workbook(download.body)
+        except FingerprintError as e:
+            print(f"Cannot fingerprint {download.table} ({e}); using the raw hash.")
+            return {}
+        finally:
+            download.body.seek(0)
+        previous = self.fingerprints.get(download.table)
+        if previous is not None and previous.get('fingerprint') == record['fingerprint']:
+            print(f"{download.table} was rewritten without changing its cells")
+            self._record(result.cosmetic, download.table)
+            return None
+        return dict(record, previous=previous)
+
+    def _record_fingerprint(self, download: _Download, semantic: dict, object_key: str, result: BronzeRunResult) -> None:
+        if not semantic:
+            return
+        previous = semantic.pop('previous')
+        diff = diff_fingerprints(previous, semantic)
+        self.fingerprints.put(download.table, semantic, object_key=object_key, sha256=download.sha256,
+                              md5=download.md5, diff=diff)
+        self._record(result.diffs, download.table, diff)
+
+    def _save_copy(self, download: _Download) -> None:
+        if self.save_dir:
+            download.body.seek(0)
+            with open(os.path.join(self.save_dir, f'{download.table}.xlsx'), 'wb') as file:
+                shutil.copyfileobj(download.body, file)
+
+    def _record(self, target, table: str, value=None) -> None:
+        with self._lock:
+            if isinstance(target, dict):
+                target[table] = value
+            else:
+                target.append(table)
@@ -0,0 +1,68 @@
+import time
+import threading
+from urllib.parse import urlparse
+
+class HostRateLimiter:
+    """
+    Per-host politeness budget for concurrent requests.
+
+    Each host gets a bucket that allows at most `max_in_flight` concurrent
+    requests, and successive request starts are spaced at least
+    `min_interval` seconds apart.
+    """
+
+    def __init__(self, max_in_flight: int = 4, min_interval: float = 0.5):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.min_interval = max(0.0, float(min_interval))
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    @staticmethod
+    def host_for(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_in_flight)
+                self._next_slot[host] = 0.0
+            return self._semaphores[host]
+
+    def acquire(self, url: str) -> str:
+        """Block until a request to the url's host is allowed. Returns the host."""
+        host = self.host_for(url)
+        self._semaphore(host).acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot[host])
+            self._next_slot[host] = start + self.min_interval
+        wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+        return host
+
+    def release(self, host: str) -> None:
+        self._semaphores[host].release()
+
+    def slot(self, url: str) -> "_Slot":
+        """Context manager wrapping acquire/release for a single request."""
+        return _Slot(self, url)
+
+
+class _Slot:
+
+    def __init__(self, limiter: HostRateLimiter, url: str):
+        self.limiter = limiter
+        self.url = url
+        self.host = None
+
+    def __enter__(self):
+        self.host = self.limiter.acquire(self.url)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.limiter.release(self.host)
+        return False
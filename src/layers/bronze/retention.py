@@ -0,0 +1,261 @@
+import re
+import sys
+import json
+import argparse
+from datetime import date, datetime
+from typing import Optional, Dict, List, Tuple
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+from common.metrics import metrics
+from layers.bronze.fingerprint import workbook_cells, FingerprintError
+from layers.bronze.scheduler import today_utc
+from layers.bronze.sources import load_source
+
+################################################################################
+# Policy
+################################################################################
+# Timestamped bronze copies directly under the prefix: {table}_{YYYYMMDD}.xlsx
+_VERSION_KEY = re.compile(r'^(?P<table>.+?)[_-]?(?P<stamp>\d{8})\.(?P<extension>\w+)$')
+ARCHIVE_COLUMNS = ['version', 'source_key', 'etag', 'sheet', 'row', 'column', 'value']
+
+class RetentionPolicy:
+    """
+    Which dated versions of a table stay under the bronze prefix:
+
+        keep_latest        the newest N versions (at least 1: the latest is
+                           what bronze compares downloads against)
+        keep_month_end     the last version of every calendar month
+        keep_within_days   everything stored in the last N days
+
+    A version any rule keeps is kept. tables maps a table name to overrides
+    of these settings.
+    """
+
+    def __init__(
+        self,
+        keep_latest: int = 3,
+        keep_month_end: bool = True,
+        keep_within_days: int = 30,
+        tables: Optional[Dict[str, dict]] = None
+    ):
+        self.keep_latest = max(1, keep_latest)
+        self.keep_month_end = keep_month_end
+        self.keep_within_days = keep_within_days
+        self.tables = tables or {}
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RetentionPolicy":
+        return cls(**(config.get('retention') or {}))
+
+    def for_table(self, table: str) -> "RetentionPolicy":
+        overrides = self.tables.get(table)
+        if not overrides:
+            return self
+        settings = {
+            'keep_latest': self.keep_latest,
+            'keep_month_end': self.keep_month_end,
+            'keep_within_days': self.keep_within_days,
+        }
+        settings.update(overrides)
+        return RetentionPolicy(**settings)
+
+    def select(self, versions: List[dict], today: date) -> Tuple[List[dict], List[dict]]:
+        """(kept, superseded) versions, each sorted oldest first."""
+        ordered = sorted(versions, key=lambda version: (version['date'], version['key']))
+        keep = {version['key'] for version in ordered[-self.keep_latest:]}
+        if self.keep_month_end:
+            month_ends = {}
+            for version in ordered:
+                month_ends[(version['date'].year, version['date'].month)] = version['key']
+            keep.update(month_ends.values())
+        if self.keep_within_days is not None:
+            keep.update(version['key'] for version in ordered
+                        if (today - version['date']).days <= self.keep_within_days)
+        kept = [version for version in ordered if version['key'] in keep]
+        superseded = [version for version in ordered if version['key'] not in keep]
+        return kept, superseded
+
+################################################################################
+# Compaction
+################################################################################
+class BronzeCompactor:
+    """
+    Applies a RetentionPolicy to the timestamped copies under a bronze
+    prefix. Superseded versions are first consolidated into one parquet
+    history file per table,
+
+        {archive_prefix}{table}.parquet
+            version, source_key, etag, sheet, row, column, value
+
+    holding every non-empty cell of every archived version (values as
+    normalized strings, as in fingerprints). A version with no non-empty
+    cell is recorded by one marker row whose sheet, row, column and value
+    are null. Only versions that made it into a written archive are then
+    deleted, 1000 keys per DeleteObjects request. A version that cannot be
+    read as a workbook is left in place.
+
+    Re-running is safe: versions already in a table's archive are not
+    downloaded again.
+    """
+
+    def __init__(self, bucket: str, prefix: str, archive_prefix: str, policy: RetentionPolicy):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.archive_prefix = archive_prefix
+        self.policy = policy
+
+    def archive_key(self, table: str) -> str:
+        return f'{self.archive_prefix}{table}.parquet'
+
+    def versions(self) -> Dict[str, List[dict]]:
+        """{table: [{'key', 'date', 'etag', 'size'}]}, from one listing of the prefix."""
+        tables = {}
+        for obj in S3Utility.list_objects(self.bucket, self.prefix):
+            relative = obj['Key'][len(self.prefix):]
+            match = _VERSION_KEY.match(relative) if '/' not in relative else None
+            if match is None:
+                continue
+            try:
+                day = datetime.strptime(match.group('stamp'), '%Y%m%d').date()
+            except ValueError:
+                continue
+            tables.setdefault(match.group('table'), []).append({
+                'key': obj['Key'],
+                'date': day,
+                'etag': obj['ETag'].strip('"'),
+                'size': obj['Size'],
+            })
+        return tables
+
+    def plan(self, today: Optional[date] = None) -> Dict[str, Tuple[List[dict], List[dict]]]:
+        """{table: (kept, superseded)} for every table with superseded versions."""
+        today = today or today_utc()
+        plan = {}
+        for table, versions in sorted(self.versions().items()):
+            kept, superseded = self.policy.for_table(table).select(versions, today)
+            if superseded:
+                plan[table] = (kept, superseded)
+        return plan
+
+    def _read_archive(self, table: str):
+        import pandas as pd
+
+        try:
+            return S3Utility.download_s3_to_dataframe(self.bucket, self.archive_key(table))
+        except Exception:
+            if S3Utility.object_exists(self.bucket, self.archive_key(table)):
+                raise
+            return pd.DataFrame(columns=ARCHIVE_COLUMNS)
+
+    def archive(self, table: str, superseded: List[dict]) -> Tuple[List[str], List[str], int]:
+        """
+        Adds superseded versions to the table's archive. Returns (keys now
+        archived, keys that could not be read, cell rows added).
+        """
+        import pandas as pd
+
+        existing = self._read_archive(table)
+        already = set(existing['source_key'].astype(str)) if len(existing) else set()
+        pending = [version for version in superseded if version['key'] not in already]
+        result = S3Utility.download_many(self.bucket, [version['key'] for version in pending])
+
+        rows, unreadable = [], list(result.failed)
+        for version in pending:
+            body = result.succeeded.get(version['key'])
+            if body is None:
+                continue
+            try:
+                cells = list(workbook_cells(body))
+            except FingerprintError as e:
+                print(f"Cannot archive {version['key']} ({e}); leaving it in place.")
+                unreadable.append(version['key'])
+                continue
+            label = version['date'].strftime('%Y%m%d')
+            rows.extend((label, version['key'], version['etag'], sheet, row, column, value)
+                        for sheet, row, column, value in cells)
+            if not cells:
+                rows.append((label, version['key'], version['etag'], None, None, None, None))
+
+        archived = [version['key'] for version in superseded if version['key'] not in unreadable]
+        added = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS)
+        if len(added):
+            combined = pd.concat([existing.astype(object), added.astype(object)], ignore_index=True)
+            combined = combined.astype({'row': 'Int32'}).astype(
+                {column: 'category' for column in ('version', 'source_key', 'etag', 'sheet', 'column')})
+            combined = combined.sort_values(['version', 'sheet', 'row', 'column'], ignore_index=True)
+            S3Utility.upload_dataframe_s3(combined, self.bucket, self.archive_key(table), 'parquet')
+        return archived, unreadable, len(added)
+
+    def run(self, dry_run: bool = False, today: Optional[date] = None) -> dict:
+        """
+        Archives and deletes every superseded version (or only reports what
+        would happen when dry_run is set). Returns a report:
+
+            {'dry_run': bool, 'deleted': n, 'bytes_reclaimed': n, 'failed': {key: error},
+             'tables': {table: {'kept': [...], 'deleted': [...], 'unarchivable': [...],
+                                'archived_rows': n, 'bytes_reclaimed': n}}}
+        """
+        report = {'dry_run': dry_run, 'deleted': 0, 'bytes_reclaimed': 0, 'failed': {}, 'tables': {}}
+        to_delete = {}
+        with metrics.timer('retention.seconds'):
+            for table, (kept, superseded) in self.plan(today).items():
+                entry = {'kept': [version['key'] for version in kept], 'deleted': [], 'unarchivable': [],
+                         'archived_rows': 0, 'bytes_reclaimed': 0}
+                report['tables'][table] = entry
+                if dry_run:
+                    archived = [version['key'] for version in superseded]
+                else:
+                    try:
+                        archived, entry['unarchivable'], entry['archived_rows'] = self.archive(table, superseded)
+                    except Exception as e:
+                        # Nothing is deleted for a table whose archive was not written.
+                        print(f"Archiving {table} failed: {e}")
+                        report['failed'].update({version['key']: f'archive: {e}' for version in superseded})
+                        continue
+                sizes = {version['key']: version['size'] for version in superseded}
+                for key in archived:
+                    to_delete[key] = (table, sizes[key])
+
+            if dry_run:
+                deleted = list(to_delete)
+            else:
+                result = S3Utility.delete_objects(self.bucket, to_delete)
+                report['failed'].update(result.failed)
+                deleted = list(result.succeeded)
+            for key in deleted:
+                table, size = to_delete[key]
+                report['tables'][table]['deleted'].append(key)
+                report['tables'][table]['bytes_reclaimed'] += size
+                report['bytes_reclaimed'] += size
+            report['deleted'] = len(deleted)
+
+        metrics.incr('retention.deleted', report['deleted'])
+        metrics.observe('retention.bytes_reclaimed', report['bytes_reclaimed'], unit='Bytes')
+        verb = 'Would delete' if dry_run else 'Deleted'
+        print(f"{verb} {report['deleted']} superseded version(s) of {len(report['tables'])} table(s), "
+              f"{report['bytes_reclaimed']} bytes")
+        return report
+
+def run_retention(config: dict, dry_run: bool = False, source=None, today: Optional[date] = None) -> dict:
+    """Applies the configured retention policy to a source's bronze prefix."""
+    source = source or load_source(config)
+    s3_key = source.storage['s3_bronze_key']
+    archive_key = source.storage.get('s3_archive_key', f'{s3_key}_archive/')
+    compactor = BronzeCompactor(config['aws']['s3_bucket'], s3_key, archive_key, RetentionPolicy.from_config(config))
+    return compactor.run(dry_run=dry_run, today=today)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and delete superseded bronze versions.")
+    parser.add_argument('--config', default='common/config.yml') # Run from base directory
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted without changing S3")
+    parser.add_argument('--report', help="Also write the JSON report to this path")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    S3Utility.from_config(config)
+    report = run_retention(config, dry_run=args.dry_run)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+    metrics.emit_from_config(config, Pipeline='retention')
+    sys.exit(1 if report['failed'] else 0)
@@ -0,0 +1,180 @@
+import re
+import json
+import hashlib
+from datetime import date, datetime, timezone
+from typing import Optional, Dict, List, Tuple
+from common.s3_utils import S3Utility
+
+################################################################################
+# Listing fingerprints
+################################################################################
+def listing_hash(tables: Dict[str, str], links: Dict[str, str]) -> str:
+    """
+    Hash of what a category page lists (table -> spreadsheet and page URLs),
+    not of its raw HTML, so navigation or tracking changes do not count.
+    """
+    payload = json.dumps({'tables': tables, 'links': links}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+################################################################################
+# Release history
+################################################################################
+_TIMESTAMPED_KEY = re.compile(r'(?:^|/)([a-z_]+?)_(\d{8})\.xlsx$')
+_POINTER_KEY = re.compile(r'pointers/([a-z_]+)/(\d{8})\.json$')
+
+def bronze_release_dates(bucket: str, prefixes: List[str]) -> Dict[str, List[str]]:
+    """
+    {table: sorted ISO dates} on which bronze stored a new version, read from
+    one listing per prefix: timestamped copies ({table}_{YYYYMMDD}.xlsx) and
+    content store pointers (pointers/{table}/{YYYYMMDD}.json).
+    """
+    releases = {}
+    for prefix in prefixes:
+        for obj in S3Utility.list_objects(bucket, prefix):
+            match = _POINTER_KEY.search(obj['Key']) or _TIMESTAMPED_KEY.search(obj['Key'])
+            if match is None:
+                continue
+            table, stamp = match.groups()
+            try:
+                day = datetime.strptime(stamp, '%Y%m%d').date()
+            except ValueError:
+                continue
+            releases.setdefault(table, set()).add(day.isoformat())
+    return {table: sorted(days) for table, days in releases.items()}
+
+################################################################################
+# Policy
+################################################################################
+class PollingPolicy:
+    """
+    When a category is worth polling, learned from the days its tables were
+    released. A category is hot within hot_window_days of a day of the month
+    it has released on before, unless it already released in this window.
+    Categories with fewer than min_releases releases are polled every run
+    while history accumulates; cold categories are still polled every
+    cold_interval_days, so off-schedule releases are caught.
+
+    A polled category whose listing is unchanged has its spreadsheets
+    checked only every recheck_days (a revision can replace a file in place
+    without changing the listing).
+    """
+
+    def __init__(
+        self,
+        hot_window_days: int = 3,
+        cold_interval_days: int = 7,
+        recheck_days: int = 7,
+        min_releases: int = 3,
+        max_releases: int = 36
+    ):
+        self.hot_window_days = hot_window_days
+        self.cold_interval_days = cold_interval_days
+        self.recheck_days = recheck_days
+        self.min_releases = min_releases
+        self.max_releases = max_releases
+
+    @classmethod
+    def from_config(cls, config: dict) -> "PollingPolicy":
+        settings = dict((config.get('webscraping') or {}).get('scheduling') or {})
+        settings.pop('enabled', None)
+        return cls(**settings)
+
+    @staticmethod
+    def _month_distance(day: int, other: int) -> int:
+        # Day-of-month distance, wrapping around month ends (30th vs 2nd -> 3).
+        distance = abs(day - other)
+        return min(distance, 31 - distance)
+
+    def is_hot(self, entry: dict, today: date) -> bool:
+        releases = [date.fromisoformat(day) for day in entry.get('releases', [])]
+        if not releases:
+            return False
+        if (today - max(releases)).days <= 2 * self.hot_window_days:
+            return False # Already released this cycle
+        return any(self._month_distance(today.day, release.day) <= self.hot_window_days for release in releases)
+
+    def due(self, entry: Optional[dict], today: date) -> Tuple[bool, str]:
+        """(poll today?, reason)"""
+        if entry is None or len(entry.get('releases', [])) < self.min_releases:
+            return True, 'learning'
+        if self.is_hot(entry, today):
+            return True, 'hot'
+        last_polled = entry.get('last_polled')
+        if last_polled is None or (today - date.fromisoformat(last_polled)).days >= self.cold_interval_days:
+            return True, 'cold interval elapsed'
+        return False, 'cold'
+
+    def check_tables(self, entry: Optional[dict], listing: str, today: date) -> Tuple[bool, str]:
+        """(check this category's spreadsheets?, reason), after fetching its page."""
+        if entry is None or entry.get('listing_hash') != listing:
+            return True, 'listing changed'
+        last_checked = entry.get('last_checked')
+        if last_checked is None or (today - date.fromisoformat(last_checked)).days >= self.recheck_days:
+            return True, 'recheck interval elapsed'
+        return False, 'listing unchanged'
+
+################################################################################
+# State
+################################################################################
+class PollingState:
+    """
+    Per-category polling state, persisted next to the validator manifest:
+
+        {'categories': {'pboc/Money Supply': {
+            'url': ..., 'listing_hash': ..., 'tables': [...], 'links': {...},
+            'releases': ['2024-07-12', ...], 'last_polled': ..., 'last_checked': ...}},
+         'history_loaded': bool}
+    """
+
+    def __init__(self, categories: Optional[Dict[str, dict]] = None, history_loaded: bool = False):
+        self.categories = categories or {}
+        self.history_loaded = history_loaded
+        self.dirty = False
+
+    @classmethod
+    def load_s3(cls, bucket: str, key: str) -> "PollingState":
+        raw = S3Utility.download_obj_s3(bucket, key)
+        if not raw:
+            return cls()
+        data = json.loads(raw)
+        return cls(data.get('categories'), data.get('history_loaded', False))
+
+    def save_s3(self, bucket: str, key: str) -> None:
+        if self.dirty:
+            body = json.dumps({'categories': self.categories, 'history_loaded': self.history_loaded},
+                              indent=1, sort_keys=True)
+            S3Utility.upload_obj_s3(bucket, key, body)
+            self.dirty = False
+
+    def get(self, category: str) -> Optional[dict]:
+        return self.categories.get(category)
+
+    def record_poll(self, category: str, url: str, tables: List[str], links: Dict[str, str], today: date) -> None:
+        entry = self.categories.setdefault(category, {'releases': []})
+        entry.update(url=url, tables=sorted(tables), links=links, last_polled=today.isoformat())
+        self.dirty = True
+
+    def record_check(self, category: str, listing: str, today: date) -> None:
+        """The category's spreadsheets were all checked against this listing."""
+        entry = self.categories.setdefault(category, {'releases': []})
+        entry.update(listing_hash=listing, last_checked=today.isoformat())
+        self.dirty = True
+
+    def record_release(self, category: str, today: date, max_releases: int = 36) -> None:
+        entry = self.categories.setdefault(category, {'releases': []})
+        releases = sorted(set(entry.get('releases', [])) | {today.isoformat()})
+        entry['releases'] = releases[-max_releases:]
+        self.dirty = True
+
+    def learn(self, table_releases: Dict[str, List[str]], max_releases: int = 36) -> None:
+        """Seeds each category's releases from its tables' bronze history."""
+        for entry in self.categories.values():
+            days = set(entry.get('releases', []))
+            for table in entry.get('tables', []):
+                days.update(table_releases.get(table, []))
+            entry['releases'] = sorted(days)[-max_releases:]
+        self.history_loaded = True
+        self.dirty = True
+
+def today_utc() -> date:
+    return datetime.now(timezone.utc).date()
@@ -0,0 +1,104 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Optional, Dict
+from layers.bronze.links import extract_links
+from common.metrics import metrics
+
+################################################################################
+# PBOC helpers
+################################################################################
+def format_title(s: str) -> str:
+    # List of words not to capitalize in titles
+    small_words = {"a", "an", "the", "and", "but", "for", "nor", "or", "so", "yet", "at", 
+                   "by", "in", "of", "on", "to", "up", "for", "with", "over", "into", "onto", "from"}
+    caps_words = {"rmb, cgpi"}
+    words = s.split('-')
+    title_words = []
+    for i, word in enumerate(words):
+        if word in caps_words:
+            title_words.append(word.upper())
+        elif i == 0 or i == len(words) - 1 or word not in small_words:
+            title_words.append(word.capitalize())
+        else:
+            title_words.append(word)
+
+    return ' '.join(title_words)
+
+def construct_pboc_url(base_url: str, insertion: str) -> str:
+    # Find the index of the last occurrence of "/"
+    last_slash_index = base_url.rfind('/')
+    
+    # Split the string into before and after "/"
+    before_last_slash = base_url[:last_slash_index + 1]  # Include the "/"
+    after_last_slash = base_url[last_slash_index + 1:]
+        
+    return before_last_slash + insertion + "/" + after_last_slash
+
+def clean_table_name(table_name: str) -> str:
+    return re.sub(r'[^a-zA-Z\s]', '', table_name).lower().replace(' ', '_')
+
+################################################################################
+# Sources
+################################################################################
+class Listing:
+    """
+    One parsed category page: `tables` maps cleaned table name -> spreadsheet
+    URL, `links` maps table title -> page link (used in the email).
+    """
+
+    def __init__(self, tables: Dict[str, str], links: Dict[str, str]):
+        self.tables = tables
+        self.links = links
+
+class Source(ABC):
+    """
+    A site bronze polls. A source lists its category pages and turns a
+    page into spreadsheet URLs; fetching, change detection and storage are
+    shared. Its S3 keys come from config['aws'][name].
+    """
+    name = None
+
+    def __init__(self, config: dict):
+        self.config = config
+
+    @property
+    def storage(self) -> dict:
+        return self.config['aws'][self.name]
+
+    @abstractmethod
+    def category_urls(self) -> Dict[str, str]:
+        """{category title: listing page url}"""
+
+    @abstractmethod
+    def parse_listing(self, category: str, html: str) -> Listing:
+        """The spreadsheet URLs and page links on one category page."""
+
+class PbocSource(Source):
+    """PBOC statistics: one listing page per parent category of the current year."""
+    name = 'pboc'
+
+    def category_urls(self) -> Dict[str, str]:
+        urls = self.config['webscraping']['urls']['pboc']['2024']
+        return {format_title(category): construct_pboc_url(urls['base'], extension)
+                for category, extension in urls['extensions'].items()}
+
+    def parse_listing(self, category: str, html: str) -> Listing:
+        base_url = self.config['webscraping']['urls']['pboc']['base']
+        # One parse: xlsx for s3 storage, htm for email links
+        with metrics.timer('bronze.extract_links.seconds'):
+            links = extract_links(html, ['xlsx', 'htm'])
+        tables = {clean_table_name(title): base_url + path for title, path in links['xlsx'].items()}
+        return Listing(tables, links['htm'])
+
+SOURCES = {source.name: source for source in (PbocSource,)}
+
+def load_source(config: dict, name: Optional[str] = None) -> Source:
+    """The named source (default: webscraping.source, else PBOC)."""
+    webscraping = config.get('webscraping') or {}
+    if 'sources' in webscraping:
+        # A list suggested every source runs; bronze runs exactly one.
+        raise ValueError("webscraping.sources is no longer supported; set webscraping.source to one source name")
+    name = name or webscraping.get('source') or 'pboc'
+    if name not in SOURCES:
+        raise ValueError(f"Unknown source {name}; expected one of {sorted(SOURCES)}")
+    return SOURCES[name](config)
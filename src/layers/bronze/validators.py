@@ -0,0 +1,110 @@
+import os
+import json
+from typing import Optional, Dict, Mapping
+from common.s3_utils import S3Utility
+
+class ValidatorManifest:
+    """
+    Upstream HTTP validators (ETag, Last-Modified, Content-Length) last seen
+    for each table URL, used to make conditional requests so unchanged
+    spreadsheets are not downloaded again.
+
+    Entries look like:
+        {url: {'etag': ..., 'last_modified': ..., 'content_length': ..., 'conditional': bool}}
+    where 'conditional' records whether the server honoured a conditional GET.
+    """
+
+    def __init__(self, entries: Optional[Dict[str, dict]] = None):
+        self.entries = entries or {}
+        self.dirty = False
+
+    ############################################################################
+    # Persistence
+    ############################################################################
+    @classmethod
+    def from_json(cls, raw) -> "ValidatorManifest":
+        if not raw:
+            return cls()
+        try:
+            return cls(json.loads(raw))
+        except ValueError as e:
+            print(f"Ignoring unreadable validator manifest: {e}")
+            return cls()
+
+    def to_json(self) -> str:
+        return json.dumps(self.entries, indent=1, sort_keys=True)
+
+    @classmethod
+    def load_local(cls, path: str) -> "ValidatorManifest":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as file:
+            return cls.from_json(file.read())
+
+    def save_local(self, path: str) -> None:
+        with open(path, 'w') as file:
+            file.write(self.to_json())
+        self.dirty = False
+
+    @classmethod
+    def load_s3(cls, bucket: str, key: str) -> "ValidatorManifest":
+        return cls.from_json(S3Utility.download_obj_s3(bucket, key))
+
+    def save_s3(self, bucket: str, key: str) -> None:
+        if self.dirty:
+            S3Utility.upload_obj_s3(bucket, key, self.to_json())
+            self.dirty = False
+
+    ############################################################################
+    # Validators
+    ############################################################################
+    @staticmethod
+    def validators_from_headers(headers: Mapping[str, str]) -> dict:
+        return {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content_length': headers.get('Content-Length'),
+        }
+
+    def get(self, url: str) -> Optional[dict]:
+        return self.entries.get(url)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for the url, if any validators are known."""
+        entry = self.entries.get(url) or {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def supports_conditional(self, url: str) -> bool:
+        entry = self.entries.get(url) or {}
+        return bool(entry.get('conditional', True) and (entry.get('etag') or entry.get('last_modified')))
+
+    def matches(self, url: str, headers: Mapping[str, str]) -> bool:
+        """
+        True when the response headers carry the same validators as the stored
+        entry. Only validators present on both sides are compared, and at least
+        one strong signal (ETag or Last-Modified) must match.
+        """
+        entry = self.entries.get(url)
+        if not entry:
+            return False
+        seen = self.validators_from_headers(headers)
+        compared = False
+        for name in ('etag', 'last_modified', 'content_length'):
+            if entry.get(name) and seen.get(name):
+                if entry[name] != seen[name]:
+                    return False
+                compared = compared or name != 'content_length'
+        return compared
+
+    def update(self, url: str, headers: Mapping[str, str], conditional: Optional[bool] = None) -> None:
+        entry = self.validators_from_headers(headers)
+        previous = self.entries.get(url) or {}
+        entry['conditional'] = previous.get('conditional', True) if conditional is None else conditional
+        if entry != previous:
+            self.entries[url] = entry
+            self.dirty = True
@@ -1,52 +1,286 @@
+import time
+import random
+import inspect
+import threading
 import requests
-from typing import Optional, Dict, Any
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterable
+from layers.bronze.rate_limiter import HostRateLimiter
+from layers.bronze.validators import ValidatorManifest
+from common.metrics import metrics
 
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# A connection error or timeout may strike after the server acted on the
+# request, so only methods that are safe to send twice are resent.
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+################################################################################
+# Errors
+################################################################################
+class WebscraperError(Exception):
+    """Base class for request failures raised by Webscraper."""
+
+    def __init__(self, message: str, url: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+
+class HTTPStatusError(WebscraperError):
+    """The server answered with a non-retryable error status (e.g. 404)."""
+
+class RetriesExhaustedError(WebscraperError):
+    """A retryable failure (5xx, 429, connection reset, timeout) persisted past max_retries."""
+
+################################################################################
+# Webscraper
+################################################################################
 class Webscraper:
 
-    def __init__(self, base_url: str = None, username: Optional[str] = None, password: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+    def __init__(
+        self,
+        base_url: str = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        max_workers: int = 8,
+        max_in_flight_per_host: int = 4,
+        min_request_interval: float = 0.5,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        backoff_max: float = 30.0,
+        pool_maxsize: Optional[int] = None
+    ):
         self.base_url = base_url
         self.username = username
         self.password = password
         self.headers = headers
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(max_in_flight_per_host, min_request_interval)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        # One pooled session for the lifetime of the scraper so TCP/TLS
+        # connections are kept alive and reused across requests.
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        pool_maxsize = pool_maxsize or max(max_workers, max_in_flight_per_host)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-    def get_request(self, url: str, username: Optional[str] = None, password: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> Any:
+    @classmethod
+    def from_config(cls, config: dict, **kwargs) -> "Webscraper":
         """
-        Issues a GET request to the specified URL.
-        Allows optional passing of login credentials and request headers.
+        Build a Webscraper from the `webscraping` section of config.yml.
+        Missing concurrency/http settings fall back to the constructor defaults;
+        unknown ones raise ValueError naming the key.
         """
-        try:
-            if username and password:
-                response = requests.get(url, auth=(username, password), headers=headers)
-            else:
-                response = requests.get(url, headers=headers)
-            response.raise_for_status()  # Raises HTTPError for bad responses
+        webscraping = config.get('webscraping', {})
+        parameters = inspect.signature(cls.__init__).parameters
+        for section in ('concurrency', 'http'):
+            for name, value in (webscraping.get(section) or {}).items():
+                if name == 'self' or name not in parameters:
+                    raise ValueError(f"Unknown setting webscraping.{section}.{name} in config")
+                kwargs.setdefault(name, value)
+        return cls(**kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def fetch_all(self, urls: Iterable[str], headers: Optional[Dict[str, str]] = None, manifest: Optional[ValidatorManifest] = None) -> Dict[str, Any]:
+        """
+        Issues GET requests for all urls concurrently, subject to the per-host
+        rate limits. Returns {url: response} in input order; urls that fail
+        after retries map to None.
+
+        If a validator manifest is given, requests are conditional and urls
+        whose upstream validators are unchanged are left out of the result.
+        """
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        unchanged = object()
+
+        def fetch(url):
+            try:
+                if manifest is None:
+                    return self.get_request(url, headers=headers)
+                response = self.conditional_get(url, manifest, headers=headers)
+                return unchanged if response is None else response
+            except WebscraperError as e:
+                print(f'Failed to fetch {url}: {e}')
+                return None
+
+        workers = max(1, min(self.max_workers, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = zip(urls, executor.map(fetch, urls))
+            return {url: response for url, response in results if response is not unchanged}
+
+    def conditional_get(self, url: str, manifest: ValidatorManifest, headers: Optional[Dict[str, str]] = None, **kwargs) -> Optional[requests.Response]:
+        """
+        Issues a GET only if the resource changed since the validators stored
+        in the manifest. Returns None when it is unchanged.
+
+        Uses If-None-Match/If-Modified-Since when the server honours them, and
+        falls back to comparing the validators of a HEAD request otherwise.
+        The caller records the returned response's validators with
+        manifest.update() once the body has been persisted. Extra kwargs
+        (e.g. stream=True) are passed to the GET.
+        """
+        headers = dict(headers or {})
+        if manifest.get(url) is None:
+            return self.get_request(url, headers=headers, **kwargs)
+
+        if manifest.supports_conditional(url):
+            headers.update(manifest.conditional_headers(url))
+            response = self.get_request(url, headers=headers, **kwargs)
+            if response.status_code == 304:
+                response.close()
+                metrics.incr('http.not_modified')
+                return None
+            if manifest.matches(url, response.headers):
+                # Server ignored the conditional headers; use HEAD next time.
+                manifest.update(url, response.headers, conditional=False)
+                response.close()
+                metrics.incr('http.not_modified')
+                return None
             return response
-        except requests.exceptions.HTTPError as http_err:
-            print(f'HTTP error occurred: {http_err}')
-        except requests.exceptions.ConnectionError as conn_err:
-            print(f'Connection error occurred: {conn_err}')
-        except requests.exceptions.Timeout as timeout_err:
-            print(f'Timeout error occurred: {timeout_err}')
-        except requests.exceptions.RequestException as req_err:
-            print(f'Unexpected error occurred: {req_err}')
 
-    def post_request(self, url: str, username: Optional[str] = None, password: Optional[str] = None, headers: Optional[Dict[str, str]] = None, data: Optional[Dict[str, Any]] = None) -> Any:
+        head = self.request('HEAD', url, headers=headers, allow_redirects=True)
+        head.close()
+        if manifest.matches(url, head.headers):
+            metrics.incr('http.not_modified')
+            return None
+        return self.get_request(url, headers=headers, **kwargs)
+
+    def get_request(self, url: str, username: Optional[str] = None, password: Optional[str] = None, headers: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        """
+        Issues a GET request to the specified URL.
+        Allows optional passing of login credentials and request headers;
+        extra kwargs (e.g. stream=True) are passed to the session.
+        Raises WebscraperError subclasses on failure.
+        """
+        return self.request('GET', url, username=username, password=password, headers=headers, **kwargs)
+
+    def post_request(self, url: str, username: Optional[str] = None, password: Optional[str] = None, headers: Optional[Dict[str, str]] = None, data: Optional[Dict[str, Any]] = None) -> requests.Response:
         """
         Issues a POST request to the specified URL.
         Allows optional passing of login credentials, request headers, and POST data.
+        Raises WebscraperError subclasses on failure.
         """
-        try:
-            if username and password:
-                response = requests.post(url, auth=(username, password), headers=headers, data=data)
+        return self.request('POST', url, username=username, password=password, headers=headers, data=data)
+
+    def request(self, method: str, url: str, username: Optional[str] = None, password: Optional[str] = None, headers: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        """
+        Issues a request on the pooled session, retrying 5xx/429 responses,
+        connection errors and timeouts with exponential backoff and jitter.
+        Connection errors and timeouts are retried only for GET, HEAD and
+        OPTIONS, since e.g. a POST may already have been processed; for other
+        methods they raise RetriesExhaustedError at once. Any other error
+        status raises HTTPStatusError immediately.
+
+        With stream=True the host's rate limiter slot is held until the
+        returned response is closed, so bodies download within the per-host
+        limit; callers must close streamed responses (e.g. `with response`).
+        """
+        username = username or self.username
+        password = password or self.password
+        if username and password:
+            kwargs['auth'] = (username, password)
+        kwargs.setdefault('timeout', self.timeout)
+
+        attempt = 0
+        while True:
+            retry_after = None
+            host = self.rate_limiter.acquire(url)
+            held = False
+            try:
+                metrics.incr('http.requests')
+                # Time to response headers; streamed bodies are timed by the caller.
+                with metrics.timer(f'http.{method.lower()}.seconds'):
+                    response = self.session.request(method, url, headers=headers, **kwargs)
+                if kwargs.get('stream') and response.status_code < 400:
+                    self._release_on_close(response, host)
+                    held = True
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                failure = f'{type(err).__name__}: {err}'
+                status_code = None
+            except requests.exceptions.RequestException as err:
+                raise WebscraperError(f'Unexpected error occurred: {err}', url) from err
             else:
-                response = requests.post(url, headers=headers, data=data)
-            response.raise_for_status()  # Raises HTTPError for bad responses
-            return response
-        except requests.exceptions.HTTPError as http_err:
-            print(f'HTTP error occurred: {http_err}')
-        except requests.exceptions.ConnectionError as conn_err:
-            print(f'Connection error occurred: {conn_err}')
-        except requests.exceptions.Timeout as timeout_err:
-            print(f'Timeout error occurred: {timeout_err}')
-        except requests.exceptions.RequestException as req_err:
-            print(f'Unexpected error occurred: {req_err}')
+                if response.status_code < 400:
+                    return response
+                status_code = response.status_code
+                failure = f'HTTP {status_code} for {url}'
+                if status_code not in RETRYABLE_STATUS_CODES:
+                    response.close()
+                    metrics.incr('http.errors')
+                    raise HTTPStatusError(failure, url, status_code)
+                retry_after = self._parse_retry_after(response.headers.get('Retry-After'))
+                response.close()
+            finally:
+                if not held:
+                    self.rate_limiter.release(host)
+
+            if attempt >= self.max_retries or (status_code is None and method.upper() not in IDEMPOTENT_METHODS):
+                metrics.incr('http.errors')
+                raise RetriesExhaustedError(f'{failure} (gave up after {attempt + 1} attempts)', url, status_code)
+            delay = self._backoff(attempt, retry_after)
+            print(f'{failure}; retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})')
+            metrics.incr('http.retries')
+            time.sleep(delay)
+            attempt += 1
+
+    def _release_on_close(self, response: requests.Response, host: str) -> None:
+        """Releases the host's slot (once) when the streamed response is closed."""
+        close = response.close
+        released = threading.Event()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released.is_set():
+                    released.set()
+                    self.rate_limiter.release(host)
+
+        response.close = close_and_release
+
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a server's Retry-After."""
+        cap = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Retry-After is either delta-seconds or an HTTP date."""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
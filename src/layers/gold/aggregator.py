@@ -0,0 +1,222 @@
+import json
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, List, Iterable, Sequence
+from common.s3_utils import S3Utility
+from common.dataframe_io import read_dataframe
+from layers.silver.processor import SilverProcessor
+from layers.silver.ledger import SilverLedger
+
+################################################################################
+# Gold schema
+################################################################################
+# One row per (table, series, period):
+#   value          silver value
+#   unit           silver unit (when the silver frame has one)
+#   change         value - previous observation
+#   pct_change     value / previous observation - 1
+#   yoy_change     value - value 12 months earlier
+#   yoy_pct        value / value 12 months earlier - 1
+#   rolling_<n>    mean of the last n observations (NaN until n exist)
+GOLD_KEY_COLUMNS = ['table', 'series', 'period']
+GOLD_CARRIED_COLUMNS = ['unit']
+GOLD_CATEGORY_COLUMNS = ['table', 'series', 'unit']
+DEFAULT_WINDOWS = (3, 12)
+
+def compute_aggregates(df: pd.DataFrame, windows: Sequence[int] = DEFAULT_WINDOWS) -> pd.DataFrame:
+    """
+    Vectorized per-series aggregates over a silver frame (table, series,
+    period, value, and optionally unit, which is carried through). Shifts
+    and rolling windows run on groupby over the sorted frame; YoY is a
+    calendar join on period - 12 months, so gaps in a series never pair the
+    wrong periods.
+    """
+    carried = [column for column in GOLD_CARRIED_COLUMNS if column in df.columns]
+    df = df[GOLD_KEY_COLUMNS + ['value'] + carried].astype({'table': object, 'series': object})
+    df = df.sort_values(GOLD_KEY_COLUMNS, ignore_index=True)
+    groups = df.groupby(['table', 'series'], sort=False)['value']
+    previous = groups.shift(1)
+    out = df.assign(
+        change=df['value'] - previous,
+        pct_change=df['value'] / previous - 1,
+    )
+
+    year_ago = df[GOLD_KEY_COLUMNS + ['value']].assign(period=df['period'] + pd.DateOffset(years=1))
+    year_ago = year_ago.rename(columns={'value': 'value_year_ago'})
+    out = out.merge(year_ago, on=GOLD_KEY_COLUMNS, how='left')
+    out['yoy_change'] = out['value'] - out['value_year_ago']
+    out['yoy_pct'] = out['value'] / out['value_year_ago'] - 1
+    out = out.drop(columns='value_year_ago')
+
+    for window in windows:
+        out[f'rolling_{window}'] = (
+            groups.rolling(window, min_periods=window).mean().reset_index(level=[0, 1], drop=True)
+        )
+    # Division by zero gives inf; treat it as undefined.
+    out = out.replace([np.inf, -np.inf], np.nan)
+    return out.astype({column: 'category' for column in GOLD_CATEGORY_COLUMNS if column in out.columns})
+
+def observation_step_months(df: pd.DataFrame) -> int:
+    """Typical months between consecutive observations (1 monthly, 3 quarterly, 12 annual)."""
+    if df.empty:
+        return 1
+    ordered = df.sort_values(['series', 'period'])
+    months = ordered['period'].dt.year * 12 + ordered['period'].dt.month
+    gaps = months.groupby(ordered['series'].astype(object), sort=False).diff().dropna()
+    return int(gaps.median()) if len(gaps) else 1
+
+def join_on_period(frames: Dict[str, pd.DataFrame], column: str = 'value') -> pd.DataFrame:
+    """
+    Cross-table join: one column per '<table>.<series>' indexed by period,
+    for the gold frames given as {name: frame}.
+    """
+    wide = []
+    for frame in frames.values():
+        if frame.empty:
+            continue
+        labels = frame['table'].astype(str) + '.' + frame['series'].astype(str)
+        wide.append(frame.assign(column=labels).pivot_table(index='period', columns='column', values=column, aggfunc='last'))
+    if not wide:
+        return pd.DataFrame()
+    joined = pd.concat(wide, axis=1, join='outer').sort_index()
+    joined.columns.name = None
+    return joined
+
+################################################################################
+# Ledger
+################################################################################
+class GoldLedger:
+    """
+    The silver run each gold table was last built from:
+        {table: {'silver_processed_at': ...}}
+    """
+
+    def __init__(self, entries: Optional[Dict[str, dict]] = None):
+        self.entries = entries or {}
+        self.dirty = False
+
+    @classmethod
+    def load_s3(cls, bucket: str, key: str) -> "GoldLedger":
+        raw = S3Utility.download_obj_s3(bucket, key)
+        return cls(json.loads(raw) if raw else {})
+
+    def save_s3(self, bucket: str, key: str) -> None:
+        if self.dirty:
+            S3Utility.upload_obj_s3(bucket, key, json.dumps(self.entries, indent=1, sort_keys=True))
+            self.dirty = False
+
+    def pending(self, silver_entries: Dict[str, dict]) -> Dict[str, Optional[str]]:
+        """
+        {table: first changed period (ISO date)} for tables with silver runs
+        not yet aggregated. None means recompute the whole table: it is new
+        to gold, or more silver runs happened than the silver ledger keeps.
+        """
+        pending = {}
+        for table, entry in silver_entries.items():
+            seen = (self.entries.get(table) or {}).get('silver_processed_at')
+            if seen == entry['processed_at']:
+                continue
+            if seen is None:
+                pending[table] = None
+                continue
+            changes = entry.get('changes', [])
+            if len(changes) >= SilverLedger.MAX_CHANGES and changes[0]['processed_at'] > seen:
+                # Older runs fell out of the silver ledger's history.
+                pending[table] = None
+                continue
+            unseen = [change['changed_from'] for change in changes if change['processed_at'] > seen]
+            if unseen:
+                pending[table] = min(unseen)
+            else:
+                # Reprocessed without data changes; nothing to recompute.
+                self.record(table, entry['processed_at'])
+        return pending
+
+    def record(self, table: str, silver_processed_at: str) -> None:
+        self.entries[table] = {'silver_processed_at': silver_processed_at}
+        self.dirty = True
+
+################################################################################
+# Aggregator
+################################################################################
+class GoldAggregator:
+    """
+    Maintains gold aggregates incrementally from silver:
+
+        {prefix}aggregates/table={table}/part-0.parquet   per-series aggregates
+        {prefix}joins/{name}.parquet                       cross-table joins on period
+
+    When silver changed a table from period P on, only rows from P on are
+    recomputed. Silver partitions are pruned to the years the lookback needs
+    (12 months for YoY, plus the longest rolling window) and only the
+    series/period/value/unit columns are read.
+    """
+
+    def __init__(self, bucket: str, prefix: str, silver: SilverProcessor, windows: Sequence[int] = DEFAULT_WINDOWS):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.silver = silver
+        self.windows = tuple(windows)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "GoldAggregator":
+        pboc = config['aws']['pboc']
+        gold = config.get('gold') or {}
+        silver = SilverProcessor(config['aws']['s3_bucket'], pboc['s3_silver_key'])
+        return cls(config['aws']['s3_bucket'], pboc['s3_gold_key'], silver, windows=gold.get('rolling_windows', DEFAULT_WINDOWS))
+
+    def aggregate_key(self, table: str) -> str:
+        return f'{self.prefix}aggregates/table={table}/part-0.parquet'
+
+    def join_key(self, name: str) -> str:
+        return f'{self.prefix}joins/{name}.parquet'
+
+    def read_aggregates(self, table: str) -> pd.DataFrame:
+        raw = S3Utility.download_obj_s3(self.bucket, self.aggregate_key(table))
+        if raw is None:
+            return pd.DataFrame()
+        return read_dataframe(raw, 'parquet')
+
+    def _read_silver(self, table: str, changed_from: Optional[pd.Timestamp]) -> pd.DataFrame:
+        columns = ['series', 'period', 'value', 'unit']
+        if changed_from is None:
+            return self.silver.read_table(table, columns=columns)
+        # Last year first: enough to see the series' frequency, and all that
+        # a monthly table needs for a 12-month lookback.
+        recent = self.silver.read_table(table, min_year=changed_from.year - 1, columns=columns)
+        lookback_months = max(12, max(self.windows, default=1) * observation_step_months(recent))
+        first_needed = changed_from - pd.DateOffset(months=lookback_months)
+        if first_needed.year >= changed_from.year - 1:
+            return recent
+        older = self.silver.read_table(table, years=range(first_needed.year, changed_from.year - 1), columns=columns)
+        return pd.concat([older, recent], ignore_index=True)
+
+    def update_table(self, table: str, changed_from: Optional[str] = None) -> int:
+        """
+        Recomputes a table's aggregates from changed_from (ISO date; None for
+        the whole table) and upserts them. Returns the number of rows written.
+        """
+        start = pd.Timestamp(changed_from) if changed_from else None
+        silver = self._read_silver(table, start)
+        if silver.empty:
+            return 0
+        fresh = compute_aggregates(silver, self.windows)
+        if start is not None:
+            fresh = fresh[fresh['period'] >= start]
+            existing = self.read_aggregates(table)
+            if not existing.empty:
+                # Rows before the change depend only on earlier data and stay valid.
+                kept = existing[pd.to_datetime(existing['period']) < start]
+                # Categories differ between the frames, so these concat as object.
+                fresh = pd.concat([kept, fresh], ignore_index=True)
+                fresh = fresh.astype({column: 'category' for column in GOLD_CATEGORY_COLUMNS if column in fresh.columns})
+        fresh = fresh.sort_values(GOLD_KEY_COLUMNS, ignore_index=True)
+        S3Utility.upload_dataframe_s3(fresh, self.bucket, self.aggregate_key(table), 'parquet',
+                                      compression=self.silver.compression, index=False)
+        return len(fresh)
+
+    def update_join(self, name: str, tables: Iterable[str]) -> None:
+        """Rebuilds a cross-table join from the tables' gold aggregates (value column)."""
+        frames = {table: self.read_aggregates(table) for table in tables}
+        joined = join_on_period(frames)
+        S3Utility.upload_dataframe_s3(joined, self.bucket, self.join_key(name), 'parquet', compression=self.silver.compression)
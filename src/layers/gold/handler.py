@@ -0,0 +1,50 @@
+from layers.gold.aggregator import GoldAggregator, GoldLedger
+from layers.silver.ledger import SilverLedger
+from layers.silver import handler as silver_handler
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+
+def run(config: dict, full_rebuild: bool = False) -> dict:
+    """
+    Brings gold aggregates up to date with silver. Only tables with silver
+    runs not yet aggregated are recomputed, from the first period those runs
+    changed; joins are rebuilt when one of their tables changed.
+    """
+    s3_bucket = config['aws']['s3_bucket']
+    pboc = config['aws']['pboc']
+    gold_ledger_key = pboc.get('s3_gold_ledger_key', f"{pboc['s3_gold_key']}_ledger.json")
+    aggregator = GoldAggregator.from_config(config)
+    silver_ledger = SilverLedger.load_s3(s3_bucket, silver_handler.ledger_key(config))
+    gold_ledger = GoldLedger.load_s3(s3_bucket, gold_ledger_key)
+    if full_rebuild:
+        pending = {table: None for table in silver_ledger.entries}
+    else:
+        pending = gold_ledger.pending(silver_ledger.entries)
+    print(f"{len(pending)} of {len(silver_ledger.entries)} tables to aggregate")
+
+    summary = {'updated': {}, 'joins': [], 'failed': {}}
+    for table, changed_from in pending.items():
+        try:
+            rows = aggregator.update_table(table, changed_from)
+            gold_ledger.record(table, silver_ledger.entries[table]['processed_at'])
+            summary['updated'][table] = changed_from or 'all'
+            print(f"Aggregated {table} from {changed_from or 'the start'} ({rows} rows)")
+        except Exception as e:
+            print(f"Failed to aggregate {table}: {e}")
+            summary['failed'][table] = str(e)
+
+    for name, tables in ((config.get('gold') or {}).get('joins') or {}).items():
+        if full_rebuild or set(tables) & set(summary['updated']):
+            try:
+                aggregator.update_join(name, tables)
+                summary['joins'].append(name)
+            except Exception as e:
+                print(f"Failed to build join {name}: {e}")
+                summary['failed'][f'join:{name}'] = str(e)
+    gold_ledger.save_s3(s3_bucket, gold_ledger_key)
+    return summary
+
+def lambda_handler(event, context):
+    config = load_config("common/config.yml")
+    S3Utility.from_config(config)
+    return run(config, full_rebuild=(event or {}).get('mode') == 'full')
@@ -0,0 +1,34 @@
+import re
+import pandas as pd
+from typing import Optional, List, Sequence
+from charts.chart_generator import ChartJob
+
+def chart_name(table: str, series: str) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '_', str(series).lower()).strip('_')
+    return f'{table}/{slug}'
+
+def series_chart_jobs(gold: pd.DataFrame, table: str, years: int = 5,
+                      columns: Sequence[str] = ('value', 'rolling_12'), end: Optional[pd.Timestamp] = None) -> List[ChartJob]:
+    """
+    One line chart per series of a table's gold aggregates, covering the last
+    `years` years. Each job's data slice is exactly what gets drawn, so its
+    cache key changes only when those points do.
+    """
+    if gold.empty:
+        return []
+    gold = gold.assign(period=pd.to_datetime(gold['period']))
+    end = end or gold['period'].max()
+    window = gold[gold['period'] > end - pd.DateOffset(years=years)]
+    columns = [column for column in columns if column in window.columns]
+    jobs = []
+    for series, rows in window.groupby(window['series'].astype(str), sort=True):
+        data = rows.set_index('period').sort_index()[columns]
+        if data.dropna(how='all').empty:
+            continue
+        unit = rows['unit'].dropna().iloc[0] if 'unit' in rows and rows['unit'].notna().any() else ''
+        jobs.append(ChartJob(chart_name(table, series), data, {
+            'title': f'{series}',
+            'y_label': unit,
+            'format': 'png',
+        }))
+    return jobs
@@ -0,0 +1,75 @@
+from typing import Optional, Dict, Iterable
+from layers.silver.processor import SilverProcessor
+from layers.silver.ledger import SilverLedger
+from layers.bronze.content_store import ContentStore, S3Backend
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+
+def bronze_sources(config: dict) -> Dict[str, dict]:
+    """
+    Latest bronze workbook per table: {table: {'key': ..., 'hash': ...}}.
+    Read from the content store index when one is configured, otherwise from
+    the bronze S3 manifest (hash is then the object ETag, i.e. its MD5).
+    """
+    s3_bucket = config['aws']['s3_bucket']
+    pboc = config['aws']['pboc']
+    if pboc.get('s3_content_store_key'):
+        content_store = ContentStore(S3Backend(s3_bucket), prefix=pboc['s3_content_store_key'])
+        return {table: {'key': pointer['object_key'], 'hash': pointer['sha256']}
+                for table, pointer in content_store.index.items()}
+    manifest = S3Utility.load_manifest(s3_bucket, pboc['s3_bronze_key'], pboc.get('s3_manifest_key'))
+    return {table: {'key': manifest.latest(table)['key'], 'hash': manifest.latest(table)['etag']}
+            for table in manifest.tables()}
+
+def ledger_key(config: dict) -> str:
+    pboc = config['aws']['pboc']
+    return pboc.get('s3_silver_ledger_key', f"{pboc['s3_silver_key']}_ledger.json")
+
+def run(config: dict, tables: Optional[Iterable[str]] = None, full_rebuild: bool = False) -> dict:
+    """
+    Parses bronze workbooks (default: all tables) into silver parquet.
+
+    Incremental by default: only tables whose bronze hash differs from the
+    ledger are parsed, and their rows are upserted into the existing
+    partitions. full_rebuild parses every table and overwrites its partitions.
+    """
+    s3_bucket = config['aws']['s3_bucket']
+    pboc = config['aws']['pboc']
+    processor = SilverProcessor(s3_bucket, pboc['s3_silver_key'])
+    ledger = SilverLedger.load_s3(s3_bucket, ledger_key(config))
+    sources = bronze_sources(config)
+    if tables is not None:
+        sources = {table: sources[table] for table in tables if table in sources}
+    pending = list(sources) if full_rebuild else ledger.stale(sources)
+    print(f"{len(pending)} of {len(sources)} tables to process{' (full rebuild)' if full_rebuild else ''}")
+
+    # One workbook in memory at a time.
+    summary = {'processed': {}, 'failed': {}, 'skipped': sorted(set(sources) - set(pending)), 'bytes': 0}
+    for table in pending:
+        source = sources[table]
+        try:
+            body = S3Utility.download_obj_s3(s3_bucket, source['key'])
+            if body is None:
+                raise Exception(f"{source['key']} does not exist")
+            summary['bytes'] += len(body)
+            partitions, changed_from = processor.process(body, table, merge=not full_rebuild)
+            ledger.record(table, source['key'], source['hash'], partitions,
+                          changed_from=changed_from.date().isoformat() if changed_from is not None else None)
+            summary['processed'][table] = partitions
+            print(f"Processed {table} into {len(partitions)} partitions")
+        except Exception as e:
+            print(f"Failed to process {table}: {e}")
+            summary['failed'][table] = str(e)
+    ledger.save_s3(s3_bucket, ledger_key(config))
+    return summary
+
+def lambda_handler(event, context):
+    config = load_config("common/config.yml")
+    S3Utility.from_config(config)
+    event = event or {}
+    summary = run(config, tables=event.get('tables'), full_rebuild=event.get('mode') == 'full')
+    return {
+        'processed': sorted(summary['processed']),
+        'skipped': summary['skipped'],
+        'failed': summary['failed'],
+    }
@@ -0,0 +1,76 @@
+import json
+from datetime import datetime, timezone
+from typing import Optional, Dict, List
+from common.s3_utils import S3Utility
+
+class SilverLedger:
+    """
+    Which bronze workbook each silver table was last built from, so that
+    only new or changed workbooks are parsed again.
+
+    Entries look like:
+        {table: {'bronze_key': ..., 'bronze_hash': ..., 'processed_at': ...,
+                 'partitions': [...], 'changes': [{'processed_at': ..., 'changed_from': ...}]}}
+    where bronze_hash is the bronze object's ETag (its MD5) or, with the
+    content store, its SHA-256. 'changes' keeps the most recent runs and the
+    first period each one changed, so the gold layer can catch up on
+    several silver runs at once.
+    """
+    MAX_CHANGES = 50
+
+    def __init__(self, entries: Optional[Dict[str, dict]] = None):
+        self.entries = entries or {}
+        self.dirty = False
+
+    ############################################################################
+    # Persistence
+    ############################################################################
+    @classmethod
+    def from_json(cls, raw) -> "SilverLedger":
+        if not raw:
+            return cls()
+        try:
+            return cls(json.loads(raw))
+        except ValueError as e:
+            print(f"Ignoring unreadable silver ledger: {e}")
+            return cls()
+
+    def to_json(self) -> str:
+        return json.dumps(self.entries, indent=1, sort_keys=True)
+
+    @classmethod
+    def load_s3(cls, bucket: str, key: str) -> "SilverLedger":
+        return cls.from_json(S3Utility.download_obj_s3(bucket, key))
+
+    def save_s3(self, bucket: str, key: str) -> None:
+        if self.dirty:
+            S3Utility.upload_obj_s3(bucket, key, self.to_json())
+            self.dirty = False
+
+    ############################################################################
+    # Entries
+    ############################################################################
+    def is_current(self, table: str, bronze_hash: str) -> bool:
+        entry = self.entries.get(table)
+        return entry is not None and entry['bronze_hash'] == bronze_hash
+
+    def stale(self, sources: Dict[str, dict]) -> List[str]:
+        """Tables in {table: {'key', 'hash'}} that are new or whose bronze hash changed."""
+        return [table for table, source in sources.items() if not self.is_current(table, source['hash'])]
+
+    def record(self, table: str, bronze_key: str, bronze_hash: str, partitions: List[str],
+               changed_from: Optional[str] = None) -> None:
+        """changed_from is the first period (ISO date) the run changed, or None."""
+        previous = self.entries.get(table) or {}
+        processed_at = datetime.now(timezone.utc).isoformat()
+        changes = previous.get('changes', [])
+        if changed_from is not None:
+            changes = (changes + [{'processed_at': processed_at, 'changed_from': changed_from}])[-self.MAX_CHANGES:]
+        self.entries[table] = {
+            'bronze_key': bronze_key,
+            'bronze_hash': bronze_hash,
+            'processed_at': processed_at,
+            'partitions': sorted(set(previous.get('partitions', [])) | set(partitions)),
+            'changes': changes,
+        }
+        self.dirty = True
@@ -0,0 +1,363 @@
+import io
+import re
+import numbers
+import numpy as np
+import pandas as pd
+from typing import Optional, Dict, List, Iterable, Tuple
+from common.s3_utils import S3Utility
+from common.dataframe_io import write_dataframe, read_dataframe
+
+# calamine (Rust) reads xlsx several times faster than openpyxl; openpyxl in
+# read-only streaming mode is the fallback.
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+SILVER_COLUMNS = ['table', 'series', 'period', 'value', 'unit']
+PARTITION_COLUMNS = ['table', 'year']
+# 2024.01, 2024-1, 2024/01, 2024年1月, or a bare year.
+PERIOD_PATTERN = r'^\s*(\d{4})\s*(?:[.\-/年]\s*(\d{1,2})\s*月?)?\s*$'
+ISO_DATE_PATTERN = r'^\d{4}-\d{2}-\d{2}'
+UNIT_PATTERN = r'(?i)units?\s*[:：]\s*(.+?)\s*$'
+
+################################################################################
+# Reading
+################################################################################
+def read_workbook_grid(body: bytes, sheet: int = 0) -> pd.DataFrame:
+    """
+    Raw cell values of one sheet as an object grid (row/column positions kept,
+    empty cells as NaN).
+    """
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_filelike(io.BytesIO(body))
+        rows = workbook.get_sheet_by_index(sheet).to_python(skip_empty_area=False)
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(body), read_only=True, data_only=True)
+        try:
+            rows = list(workbook.worksheets[sheet].iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    grid = pd.DataFrame(rows, dtype=object)
+    # calamine returns '' for empty cells; whitespace-only cells are empty too.
+    return grid.replace(r'^\s*$', np.nan, regex=True)
+
+################################################################################
+# Normalization
+################################################################################
+def to_number(values: pd.Series) -> pd.Series:
+    """pd.to_numeric for raw cells; dates and other objects become NaN."""
+    is_scalar = values.map(lambda value: isinstance(value, (numbers.Number, str)))
+    return pd.to_numeric(values.where(is_scalar), errors='coerce')
+
+def is_number(values: pd.Series) -> pd.Series:
+    """Cells typed as numbers (not text, dates or booleans), NaN excluded."""
+    return values.map(lambda value: isinstance(value, numbers.Number) and not isinstance(value, bool)) & values.notna()
+
+def month_starts(year: pd.Series, month: pd.Series) -> pd.Series:
+    """Vectorized (year, month) -> datetime64 first of month; NaT where either is missing."""
+    months = (year - 1970) * 12 + (month - 1)
+    valid = months.notna()
+    periods = pd.Series(pd.NaT, index=year.index, dtype='datetime64[ns]')
+    periods[valid] = months[valid].to_numpy(dtype='int64').astype('datetime64[M]').astype('datetime64[ns]')
+    return periods
+
+def parse_periods(values: pd.Series, numeric: bool = True) -> pd.Series:
+    """
+    Vectorized period parsing of raw header cells to datetime64[ns] (first
+    day of the month, or of the year for annual columns); NaT where a cell is
+    not a period. Numeric cells like 2024.1 are read as '2024.10', as Excel
+    stores the PBOC's 'YYYY.MM' headers when they are typed as numbers; with
+    numeric=False cells typed as numbers are never periods.
+    """
+    number = to_number(values)
+    text = values.astype(str).str.strip()
+    is_year_number = number.between(1900, 2100)
+    if not numeric:
+        text = text.mask(is_number(values))
+    elif is_year_number.any():
+        text = text.mask(is_year_number, pd.Series(np.char.mod('%.2f', number.fillna(0).to_numpy()), index=values.index))
+        # Whole numbers are bare years, not month 00.
+        text = text.str.replace(r'^(\d{4})\.00$', r'\1', regex=True)
+    parts = text.str.extract(PERIOD_PATTERN)
+    year = pd.to_numeric(parts[0], errors='coerce')
+    month = pd.to_numeric(parts[1], errors='coerce')
+    valid = year.between(1900, 2100) & (month.isna() | month.between(1, 12))
+    periods = month_starts(year.where(valid), month.fillna(1))
+    # Cells that were real Excel dates.
+    iso = text.str.match(ISO_DATE_PATTERN)
+    if iso.any():
+        dates = pd.to_datetime(text.where(iso), errors='coerce')
+        periods = periods.fillna(dates.dt.to_period('M').dt.to_timestamp())
+    return periods.astype('datetime64[ns]')
+
+def grid_periods(grid: pd.DataFrame) -> pd.DataFrame:
+    """
+    Period of every cell of a sheet (NaT elsewhere). Text and date cells are
+    parsed wherever they are, but numeric cells only count in header cells,
+    so that a data value like 2012.05 is not read as a period: the rows and
+    columns already holding text periods or, for sheets whose header is
+    typed as numbers, the first row (else column) whose numbers are all
+    periods.
+    """
+    text = grid.apply(parse_periods, numeric=False)
+    numbers = grid.apply(is_number)
+    numeric = grid.apply(parse_periods).where(numbers)
+    stray = numbers & numeric.isna()
+
+    header = pd.DataFrame(False, index=grid.index, columns=grid.columns)
+    text_rows = text.notna().sum(axis=1) >= 2
+    text_columns = text.notna().sum(axis=0) >= 2
+    if text_rows.any() or text_columns.any():
+        header.loc[text_rows, :] = True
+        header.loc[:, text_columns] = True
+    else:
+        rows = (numeric.notna().sum(axis=1) >= 2) & ~stray.any(axis=1)
+        columns = (numeric.notna().sum(axis=0) >= 2) & ~stray.any(axis=0)
+        if rows.any():
+            header.loc[rows.idxmax(), :] = True
+        elif columns.any():
+            header.loc[:, columns.idxmax()] = True
+    return text.fillna(numeric.where(header))
+
+def find_unit(grid: pd.DataFrame) -> Optional[str]:
+    """Text after the first 'Unit:' label in the sheet, if any."""
+    cells = pd.Series(grid.to_numpy().ravel()).dropna()
+    units = cells[cells.map(type) == str].astype(str).str.extract(UNIT_PATTERN)[0].dropna()
+    return units.iloc[0] if len(units) else None
+
+def _header_periods(grid: pd.DataFrame, periods: pd.DataFrame, header_row) -> tuple:
+    """
+    Periods for each column of the header, and how many rows the header
+    spans. A merged year cell over a row of month numbers is combined into
+    monthly periods.
+    """
+    header = periods.loc[header_row]
+    positions = list(grid.index)
+    next_position = positions.index(header_row) + 1
+    if next_position < len(positions):
+        # Merged years keep their value in the first cell only; carry it right.
+        years = header.where(header.dt.month == 1).dt.year.ffill()
+        months = to_number(grid.iloc[next_position])
+        is_month = months.between(1, 12) & (months == months.round()) & years.notna()
+        # More month cells than year cells means the years were merged.
+        if is_month.sum() >= 2 and is_month.sum() > header.notna().sum():
+            return month_starts(years.where(is_month), months.where(is_month)), 2
+    return header, 1
+
+def workbook_to_long(grid: pd.DataFrame, table: str) -> pd.DataFrame:
+    """
+    Turns a PBOC sheet into a tidy long table (table, series, period, value,
+    unit, year).
+
+    The header is the row (or column, for sheets laid out with time running
+    down) with the most period cells. Label cells left of the first period
+    column are joined into the series name; non-numeric values are dropped.
+    When a series name repeats, its first occurrence wins.
+    """
+    grid = grid.dropna(how='all').dropna(axis=1, how='all')
+    if grid.empty:
+        raise ValueError(f"{table}: sheet is empty")
+    unit = find_unit(grid)
+    periods = grid_periods(grid)
+    is_period = periods.notna()
+    if is_period.sum(axis=0).max() > is_period.sum(axis=1).max():
+        grid, periods = grid.T, periods.T
+        is_period = periods.notna()
+
+    row_counts = is_period.sum(axis=1)
+    if row_counts.max() < 2:
+        raise ValueError(f"{table}: no period header found")
+    header_row = row_counts.idxmax()
+    header, header_height = _header_periods(grid, periods, header_row)
+    period_columns = header[header.notna()].index
+    label_columns = [c for c in grid.columns if c < period_columns[0]]
+    if not label_columns:
+        raise ValueError(f"{table}: no series label column left of the periods")
+
+    data = grid.iloc[list(grid.index).index(header_row) + header_height:]
+    series = data[label_columns[0]].astype('string').fillna('')
+    for column in label_columns[1:]:
+        series = series.str.cat(data[column].astype('string').fillna(''), sep=' ')
+    series = series.str.split().str.join(' ')
+
+    values = data[period_columns].apply(to_number).to_numpy(dtype='float64')
+    long = pd.DataFrame({
+        'series': np.repeat(series.to_numpy(dtype=object), len(period_columns)),
+        'period': np.tile(header[period_columns].to_numpy(), len(series)),
+        'value': values.ravel(),
+    })
+    long = long[long['value'].notna() & (long['series'] != '')]
+    long = long.drop_duplicates(['series', 'period'], keep='first')
+    return typed_silver_frame(long.assign(table=table, unit=unit))
+
+def typed_silver_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Silver column order and dtypes: dictionary-encoded (categorical) strings,
+    datetime64 periods, float64 values, and the int16 partition year.
+    """
+    df = df.reset_index(drop=True)
+    period = pd.to_datetime(df['period']).astype('datetime64[ns]')
+    return pd.DataFrame({
+        'table': df['table'].astype('category'),
+        'series': df['series'].astype('category'),
+        'period': period,
+        'value': df['value'].astype('float64'),
+        'unit': df['unit'].astype('category'),
+        'year': period.dt.year.astype('int16'),
+    })
+
+def first_changed_period(existing: pd.DataFrame, new: pd.DataFrame) -> Optional[pd.Timestamp]:
+    """
+    Earliest period at which new adds a row or changes a value relative to
+    existing (None if nothing changed). Downstream aggregates only need
+    recomputing from there.
+    """
+    if new.empty:
+        return None
+    if existing.empty:
+        return new['period'].min()
+    keys = ['table', 'series', 'period']
+    old = existing[keys + ['value']].astype({'table': object, 'series': object})
+    old['period'] = pd.to_datetime(old['period']).astype('datetime64[ns]')
+    merged = new[keys + ['value']].astype({'table': object, 'series': object}).merge(
+        old, on=keys, how='left', suffixes=('', '_old'))
+    changed = merged['value_old'].isna() | (merged['value'] != merged['value_old'])
+    return merged.loc[changed, 'period'].min() if changed.any() else None
+
+def upsert_rows(existing: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merges new silver rows into existing ones: on (table, series, period)
+    the new row wins; existing rows absent from new are kept.
+    """
+    if existing.empty:
+        return typed_silver_frame(new)
+    combined = pd.concat([existing[SILVER_COLUMNS].astype(object), new[SILVER_COLUMNS].astype(object)], ignore_index=True)
+    combined = combined.drop_duplicates(['table', 'series', 'period'], keep='last')
+    return typed_silver_frame(combined)
+
+################################################################################
+# Processor
+################################################################################
+class SilverProcessor:
+    """
+    Parses bronze PBOC workbooks into tidy parquet partitioned by table and
+    year under the silver prefix:
+
+        {prefix}table={table}/year={year}/part-0.parquet
+
+    Partition columns are encoded in the path (Hive layout), not in the files.
+    """
+
+    def __init__(self, bucket: str, prefix: str, compression: str = 'snappy'):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.compression = compression
+
+    def partition_key(self, table: str, year: int) -> str:
+        return f'{self.prefix}table={table}/year={year}/part-0.parquet'
+
+    def process_workbook(self, body: bytes, table: str) -> pd.DataFrame:
+        return workbook_to_long(read_workbook_grid(body), table)
+
+    def to_partitions(self, df: pd.DataFrame) -> Dict[str, bytes]:
+        """{S3 key: parquet bytes}, one file per (table, year)."""
+        partitions = {}
+        buffer = io.BytesIO() # Reused by every partition
+        for (table, year), part in df.groupby(PARTITION_COLUMNS, observed=True, sort=True):
+            data = part.drop(columns=PARTITION_COLUMNS).sort_values(['series', 'period'])
+            data['series'] = data['series'].cat.remove_unused_categories()
+            write_dataframe(data, 'parquet', target=buffer, compression=self.compression, index=False)
+            partitions[self.partition_key(table, year)] = buffer.getvalue()
+        return partitions
+
+    def write(self, df: pd.DataFrame) -> List[str]:
+        """Uploads every partition of df concurrently; returns the keys written."""
+        partitions = self.to_partitions(df)
+        S3Utility.upload_many(self.bucket, partitions).raise_for_failures()
+        return list(partitions)
+
+    def process(self, body: bytes, table: str, merge: bool = True) -> Tuple[List[str], Optional[pd.Timestamp]]:
+        """
+        Parses a workbook and writes its partitions, upserting into the
+        existing ones unless merge is False (full rebuild, which replaces
+        the table). Returns the keys written and the first period whose data
+        changed.
+        """
+        df = self.process_workbook(body, table)
+        if merge:
+            return self.upsert(df)
+        return self.replace(df, table), (df['period'].min() if len(df) else None)
+
+    def replace(self, df: pd.DataFrame, table: str) -> List[str]:
+        """
+        Writes df as the table's only partitions: after the upload, partitions
+        of years df no longer covers are deleted. Returns the keys written.
+        """
+        stale = set(self.partition_years(table).values())
+        written = self.write(df)
+        stale.difference_update(written)
+        if stale:
+            S3Utility.delete_objects(self.bucket, sorted(stale)).raise_for_failures()
+        return written
+
+    def upsert(self, df: pd.DataFrame) -> Tuple[List[str], Optional[pd.Timestamp]]:
+        """
+        Merges df into the existing partitions it touches (upsert on table,
+        series, period) and rewrites only those partitions. Returns the keys
+        written and the first period whose data changed.
+        """
+        touched = {self.partition_key(table, year): (table, year)
+                   for (table, year), _ in df.groupby(PARTITION_COLUMNS, observed=True)}
+        existing_keys = set()
+        for table in df['table'].unique():
+            table_prefix = f'{self.prefix}table={table}/'
+            existing_keys.update(obj['Key'] for obj in S3Utility.list_objects(self.bucket, table_prefix))
+        result = S3Utility.download_many(self.bucket, [key for key in touched if key in existing_keys])
+        result.raise_for_failures()
+        frames = [
+            read_dataframe(body, 'parquet').assign(table=touched[key][0])
+            for key, body in result.succeeded.items()
+        ]
+        existing = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SILVER_COLUMNS)
+        changed_from = first_changed_period(existing, df)
+        if changed_from is None:
+            return [], None
+        return self.write(upsert_rows(existing, df)), changed_from
+
+    def partition_years(self, table: str) -> Dict[int, str]:
+        """{year: key} of a table's partitions, from one listing."""
+        table_prefix = f'{self.prefix}table={table}/'
+        years = {}
+        for obj in S3Utility.list_objects(self.bucket, table_prefix):
+            match = re.search(r'/year=(\d+)/[^/]+\.parquet$', obj['Key'])
+            if match:
+                years[int(match.group(1))] = obj['Key']
+        return years
+
+    def read_table(self, table: str, years: Optional[Iterable[int]] = None, min_year: Optional[int] = None,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Reads a table's silver partitions back into one typed frame. Partitions
+        are pruned by years / min_year before anything is downloaded, and only
+        the requested file columns (of series, period, value, unit) are
+        decoded; columns that were not read come back empty.
+        """
+        partitions = self.partition_years(table)
+        if years is not None:
+            wanted = set(years)
+            partitions = {year: key for year, key in partitions.items() if year in wanted}
+        if min_year is not None:
+            partitions = {year: key for year, key in partitions.items() if year >= min_year}
+        keys = [partitions[year] for year in sorted(partitions)]
+        result = S3Utility.download_many(self.bucket, keys)
+        result.raise_for_failures()
+        frames = [read_dataframe(result.succeeded[key], 'parquet', columns=columns) for key in keys]
+        if not frames:
+            return typed_silver_frame(pd.DataFrame(columns=['table', 'series', 'period', 'value', 'unit']))
+        df = pd.concat(frames, ignore_index=True).assign(table=table)
+        for column in SILVER_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+        return typed_silver_frame(df)
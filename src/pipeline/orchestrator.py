@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from datetime import datetime, timezone
+from typing import Optional, Callable, Dict, List, Union
+from common.s3_utils import S3Utility
+from common.config_utils import load_config
+from common.metrics import metrics
+
+################################################################################
+# Definition
+################################################################################
+class PipelineError(Exception):
+    """Raised for an invalid pipeline definition (unknown stage, cycle, bad handler)."""
+
+def resolve_handler(path: str) -> Callable:
+    """'package.module.function' -> the function."""
+    module_name, _, attribute = path.rpartition('.')
+    if not module_name:
+        raise PipelineError(f"Handler must be a dotted path: {path}")
+    try:
+        return getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError) as e:
+        raise PipelineError(f"Cannot load handler {path}: {e}")
+
+class Stage:
+    """
+    One node of the pipeline. The handler is called as
+    handler(config, changed, upstream) and returns a dict with `changed`,
+    `items` and `bytes` (see pipeline.stages). A stage with dependencies is
+    skipped when none of them changed anything, unless always_run is set.
+    """
+
+    def __init__(self, name: str, handler: Union[str, Callable], depends_on: Optional[List[str]] = None, always_run: bool = False):
+        self.name = name
+        self.handler = handler
+        self.depends_on = list(depends_on or [])
+        self.always_run = always_run
+
+    def call(self, config: dict, changed: List[str], upstream: Dict[str, dict]) -> dict:
+        if isinstance(self.handler, str):
+            self.handler = resolve_handler(self.handler)
+        return self.handler(config, changed, upstream) or {}
+
+class Pipeline:
+    """
+    Stages run as a DAG, in dependency order. Only the tables a stage's
+    dependencies changed are passed to it; when they changed nothing (e.g.
+    bronze found no updates) the stage and everything after it are skipped.
+    A failed stage skips its dependents but not unrelated stages.
+
+    Every run is recorded as a JSON run log with per-stage status, wall
+    time, item and byte counts, under run_log.local_dir and, when set,
+    run_log.s3_prefix in the configured bucket.
+    """
+
+    def __init__(self, name: str, stages: List[Stage], run_log: Optional[dict] = None):
+        self.name = name
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise PipelineError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.run_log = run_log or {}
+        self.order = self._topological_order()
+
+    @classmethod
+    def from_dict(cls, definition: dict) -> "Pipeline":
+        stages = [
+            Stage(name, spec['handler'], depends_on=spec.get('depends_on'), always_run=spec.get('always_run', False))
+            for name, spec in (definition.get('stages') or {}).items()
+        ]
+        return cls(definition.get('name', 'pipeline'), stages, run_log=definition.get('run_log'))
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "Pipeline":
+        definition = load_config(path)
+        if not definition:
+            raise PipelineError(f"Empty pipeline definition: {path}")
+        return cls.from_dict(definition)
+
+    def _topological_order(self) -> List[str]:
+        # Kahn's algorithm, keeping definition order among ready stages.
+        for stage in self.stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self.stages:
+                    raise PipelineError(f"{stage.name} depends on unknown stage {dependency}")
+        remaining = {name: set(stage.depends_on) for name, stage in self.stages.items()}
+        order = []
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if not dependencies]
+            if not ready:
+                raise PipelineError(f"Cycle between stages: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+        return order
+
+    ############################################################################
+    # Run
+    ############################################################################
+    def run(self, config: dict) -> dict:
+        """Runs every stage and returns the run log."""
+        started_at = datetime.now(timezone.utc)
+        metrics.reset()
+        run_start = time.perf_counter()
+        outputs = {}
+        records = {}
+        for name in self.order:
+            stage = self.stages[name]
+            records[name] = record = {'stage': name, 'status': None, 'seconds': 0.0,
+                                      'items': 0, 'bytes': 0, 'changed': 0}
+            failed_dependencies = [d for d in stage.depends_on if records[d]['status'] in ('failed', 'blocked')]
+            if failed_dependencies:
+                record['status'] = 'blocked'
+                record['reason'] = f"failed upstream: {', '.join(failed_dependencies)}"
+                print(f"[{name}] blocked by {', '.join(failed_dependencies)}")
+                continue
+            changed = sorted({table for d in stage.depends_on for table in outputs.get(d, {}).get('changed', [])})
+            if stage.depends_on and not changed and not stage.always_run:
+                record['status'] = 'skipped'
+                record['reason'] = 'no upstream changes'
+                print(f"[{name}] skipped; no upstream changes")
+                continue
+
+            print(f"[{name}] running on {len(changed)} changed tables" if stage.depends_on else f"[{name}] running")
+            start = time.perf_counter()
+            try:
+                outputs[name] = output = stage.call(config, changed, outputs)
+                record['status'] = 'succeeded'
+                record['items'] = int(output.get('items', 0))
+                record['bytes'] = int(output.get('bytes', 0))
+                record['changed'] = len(output.get('changed', []))
+                if output.get('failed'):
+                    record['partial_failures'] = output['failed']
+            except Exception as e:
+                print(f"[{name}] failed: {e}")
+                record['status'] = 'failed'
+                record['error'] = f'{type(e).__name__}: {e}'
+            record['seconds'] = round(time.perf_counter() - start, 3)
+            print(f"[{name}] {record['status']} in {record['seconds']:.1f}s "
+                  f"({record['items']} items, {record['bytes'] / 1e6:.1f} MB, {record['changed']} changed)")
+
+        run_log = {
+            'pipeline': self.name,
+            'run_id': started_at.strftime('%Y%m%dT%H%M%SZ'),
+            'started_at': started_at.isoformat(),
+            'seconds': round(time.perf_counter() - run_start, 3),
+            'status': 'failed' if any(r['status'] == 'failed' for r in records.values()) else 'succeeded',
+            'stages': [records[name] for name in self.order],
+            'metrics': metrics.summary(),
+        }
+        self.save_run_log(run_log, config)
+        return run_log
+
+    def save_run_log(self, run_log: dict, config: dict) -> None:
+        body = json.dumps(run_log, indent=1, default=str)
+        filename = f"{run_log['run_id']}.json"
+        local_dir = self.run_log.get('local_dir')
+        if local_dir:
+            os.makedirs(local_dir, exist_ok=True)
+            with open(os.path.join(local_dir, filename), 'w') as file:
+                file.write(body)
+        s3_prefix = self.run_log.get('s3_prefix')
+        if s3_prefix:
+            try:
+                S3Utility.upload_obj_s3(config['aws']['s3_bucket'], f'{s3_prefix}{filename}', body)
+            except Exception as e:
+                print(f"Could not upload run log: {e}")
+
+################################################################################
+# CLI
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline stages defined in pipeline.yml.")
+    parser.add_argument('--pipeline', default='templates/pipeline.yml')
+    parser.add_argument('--config', default='common/config.yml') # Run from base directory
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    S3Utility.from_config(config)
+    pipeline = Pipeline.from_yaml(args.pipeline)
+    run_log = pipeline.run(config)
+    metrics.emit_from_config(config, Pipeline=pipeline.name)
+    sys.exit(0 if run_log['status'] == 'succeeded' else 1)
@@ -0,0 +1,86 @@
+from typing import Dict, List
+
+################################################################################
+# Stage adapters
+################################################################################
+# Each stage is called as stage(config, changed, upstream) where `changed` is
+# the tables its dependencies changed and `upstream` holds the outputs of the
+# stages already run, by name. It returns a dict with:
+#   changed   tables it changed, passed on to the stages that depend on it
+#   items     how many things it produced (workbooks, partitions, charts, ...)
+#   bytes     bytes it read or wrote
+# plus anything later stages need. Handlers are imported inside each adapter
+# so a run only loads the layers it reaches.
+
+def bronze(config: dict, changed: List[str], upstream: Dict[str, dict]) -> dict:
+    from layers.bronze.main import run_bronze
+
+    output = run_bronze(config)
+    result = output['result']
+    return {
+        'changed': sorted(output['updated']),
+        'items': len(output['updated']),
+        'bytes': result.bytes_downloaded,
+        'updated': output['updated'],
+        'diffs': result.diffs, # Sheets/rows changed per table
+        'email_input': output['email_input'],
+        'parent_category_urls': output['parent_category_urls'],
+        'failed': result.failed,
+    }
+
+def silver(config: dict, changed: List[str], upstream: Dict[str, dict]) -> dict:
+    from layers.silver import handler
+
+    summary = handler.run(config, tables=changed)
+    return {
+        'changed': sorted(summary['processed']),
+        'items': sum(len(partitions) for partitions in summary['processed'].values()),
+        'bytes': summary['bytes'],
+        'failed': summary['failed'],
+    }
+
+def gold(config: dict, changed: List[str], upstream: Dict[str, dict]) -> dict:
+    # The gold ledger already limits the work to tables with new silver runs.
+    from layers.gold import handler
+
+    summary = handler.run(config)
+    return {
+        'changed': sorted(summary['updated']),
+        'items': len(summary['updated']) + len(summary['joins']),
+        'bytes': 0,
+        'failed': summary['failed'],
+    }
+
+def charts(config: dict, changed: List[str], upstream: Dict[str, dict]) -> dict:
+    from charts import handler
+
+    keys = handler.run(config, tables=changed)
+    return {
+        'changed': sorted(changed),
+        'items': len(keys),
+        'bytes': 0,
+    }
+
+def email(config: dict, changed: List[str], upstream: Dict[str, dict]) -> dict:
+    from common.emailer import Emailer, attachments_from_s3
+
+    bronze_output = upstream.get('bronze') or {}
+    updated_spreadsheets = bronze_output.get('updated') or {}
+    if not updated_spreadsheets:
+        print("No updates; did not send email.")
+        return {'changed': [], 'items': 0, 'bytes': 0}
+    emailer = Emailer.from_config(config)
+    body = emailer.create_email_body(
+        bronze_output['email_input'], bronze_output['parent_category_urls'], updated_spreadsheets)
+    attachments = []
+    if (config['email'].get('attachments') or {}).get('spreadsheets'):
+        attachments = attachments_from_s3(config['aws']['s3_bucket'], updated_spreadsheets)
+    sent = emailer.send_gmail(
+        recipients=config['email']['recipients'],
+        title="TLG - PBOC data has been updated today",
+        body=body,
+        attachments=attachments,
+    )
+    if not sent:
+        raise Exception("Failed to send email")
+    return {'changed': [], 'items': len(config['email']['recipients']), 'bytes': len(body.encode('utf-8'))}
@@ -0,0 +1,589 @@
+import io
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import zipfile
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock, patch
+from layers.bronze.rate_limiter import HostRateLimiter
+from layers.bronze.webscraper import Webscraper, HTTPStatusError, RetriesExhaustedError
+from layers.bronze.validators import ValidatorManifest
+from layers.bronze.pipeline import BronzePipeline
+from layers.bronze.links import BACKENDS, extract_links
+from layers.bronze.content_store import ContentStore, LocalBackend
+from layers.bronze.scheduler import PollingPolicy, PollingState, listing_hash
+from layers.bronze.fingerprint import FingerprintStore, FingerprintError, fingerprint_workbook, diff_fingerprints
+from layers.bronze.retention import RetentionPolicy, BronzeCompactor
+from layers.bronze.sources import Source, PbocSource, load_source
+from common.s3_utils import S3Manifest, S3Utility
+import requests
+
+class TestHostRateLimiter(unittest.TestCase):
+
+    def test_max_in_flight_per_host(self):
+        limiter = HostRateLimiter(max_in_flight=2, min_interval=0)
+        in_flight = {'current': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def request():
+            with limiter.slot('http://www.pbc.gov.cn/page.htm'):
+                with lock:
+                    in_flight['current'] += 1
+                    in_flight['peak'] = max(in_flight['peak'], in_flight['current'])
+                time.sleep(0.02)
+                with lock:
+                    in_flight['current'] -= 1
+
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(in_flight['peak'], 2)
+
+    def test_min_interval_between_starts(self):
+        limiter = HostRateLimiter(max_in_flight=4, min_interval=0.05)
+        starts = []
+        for _ in range(3):
+            with limiter.slot('http://www.pbc.gov.cn/a.xlsx'):
+                starts.append(time.monotonic())
+        gaps = [b - a for a, b in zip(starts, starts[1:])]
+        self.assertTrue(all(gap >= 0.045 for gap in gaps), gaps)
+
+    def test_hosts_are_independent(self):
+        limiter = HostRateLimiter(max_in_flight=1, min_interval=1)
+        start = time.monotonic()
+        with limiter.slot('http://a.example.com/x'):
+            with limiter.slot('http://b.example.com/x'):
+                pass
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+class TestWebscraperFetchAll(unittest.TestCase):
+
+    def test_from_config(self):
+        config = {'webscraping': {'concurrency': {'max_workers': 3, 'min_request_interval': 0}}}
+        webscraper = Webscraper.from_config(config)
+        self.assertEqual(webscraper.max_workers, 3)
+        self.assertEqual(webscraper.rate_limiter.min_interval, 0)
+        self.assertEqual(webscraper.rate_limiter.max_in_flight, 4)
+        with self.assertRaisesRegex(ValueError, r'webscraping\.http\.max_retry'):
+            Webscraper.from_config({'webscraping': {'http': {'max_retry': 2}}})
+
+    def test_fetch_all_preserves_order(self):
+        webscraper = Webscraper(max_workers=4, min_request_interval=0)
+        webscraper.session.request = MagicMock(
+            side_effect=lambda method, url, **kwargs: MagicMock(url=url, status_code=200))
+        urls = [f'http://www.pbc.gov.cn/{i}.xlsx' for i in range(10)]
+        responses = webscraper.fetch_all(urls)
+        self.assertEqual(list(responses.keys()), urls)
+        self.assertEqual([r.url for r in responses.values()], urls)
+
+    def test_fetch_all_maps_failures_to_none(self):
+        webscraper = Webscraper(min_request_interval=0)
+        webscraper.session.request = MagicMock(return_value=MagicMock(status_code=404, headers={}))
+        responses = webscraper.fetch_all(['http://www.pbc.gov.cn/missing.xlsx'])
+        self.assertIsNone(responses['http://www.pbc.gov.cn/missing.xlsx'])
+
+
+class TestWebscraperRetries(unittest.TestCase):
+
+    def setUp(self):
+        self.webscraper = Webscraper(min_request_interval=0, max_retries=2, backoff_factor=0.01)
+        self.url = 'http://www.pbc.gov.cn/page.htm'
+
+    def test_retries_server_errors_then_succeeds(self):
+        self.webscraper.session.request = MagicMock(side_effect=[
+            MagicMock(status_code=503, headers={}),
+            requests.exceptions.ConnectionError('reset'),
+            MagicMock(status_code=200),
+        ])
+        response = self.webscraper.get_request(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.webscraper.session.request.call_count, 3)
+
+    def test_raises_after_retries_exhausted(self):
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=500, headers={}))
+        with self.assertRaises(RetriesExhaustedError) as ctx:
+            self.webscraper.get_request(self.url)
+        self.assertEqual(ctx.exception.status_code, 500)
+        self.assertEqual(self.webscraper.session.request.call_count, 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=404, headers={}))
+        with self.assertRaises(HTTPStatusError):
+            self.webscraper.get_request(self.url)
+        self.assertEqual(self.webscraper.session.request.call_count, 1)
+
+    def test_connection_errors_are_not_retried_for_post(self):
+        self.webscraper.session.request = MagicMock(side_effect=requests.exceptions.Timeout('read timed out'))
+        with self.assertRaises(RetriesExhaustedError):
+            self.webscraper.post_request(self.url, data={'q': 1})
+        self.assertEqual(self.webscraper.session.request.call_count, 1)
+
+        self.webscraper.session.request = MagicMock(side_effect=[MagicMock(status_code=503, headers={}),
+                                                                 MagicMock(status_code=200)])
+        self.assertEqual(self.webscraper.post_request(self.url).status_code, 200)  # The server refused; safe to resend
+
+    def test_passes_timeout(self):
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=200))
+        self.webscraper.get_request(self.url)
+        self.assertEqual(self.webscraper.session.request.call_args.kwargs['timeout'], (5.0, 30.0))
+
+    def test_streamed_response_holds_host_slot_until_closed(self):
+        webscraper = Webscraper(max_in_flight_per_host=1, min_request_interval=0)
+        webscraper.session.request = MagicMock(return_value=MagicMock(status_code=200))
+        response = webscraper.get_request(self.url, stream=True)
+        semaphore = webscraper.rate_limiter._semaphore('www.pbc.gov.cn')
+        self.assertFalse(semaphore.acquire(blocking=False))
+        response.close()
+        response.close()
+        self.assertTrue(semaphore.acquire(blocking=False))
+        semaphore.release()
+
+    def test_backoff_honours_retry_after(self):
+        self.webscraper.backoff_max = 10
+        self.assertEqual(self.webscraper._parse_retry_after('7'), 7.0)
+        self.assertGreaterEqual(self.webscraper._backoff(0, retry_after=7.0), 7.0)
+        self.assertLessEqual(self.webscraper._backoff(0, retry_after=60.0), 10)
+        self.assertIsNone(self.webscraper._parse_retry_after('not a date'))
+
+
+class TestConditionalGet(unittest.TestCase):
+
+    def setUp(self):
+        self.url = 'http://www.pbc.gov.cn/table.xlsx'
+        self.headers = {'ETag': '"abc"', 'Last-Modified': 'Mon, 01 Jul 2024 00:00:00 GMT', 'Content-Length': '100'}
+        self.webscraper = Webscraper(min_request_interval=0)
+        self.manifest = ValidatorManifest()
+
+    def test_unknown_url_downloads(self):
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=200, headers=self.headers))
+        response = self.webscraper.conditional_get(self.url, self.manifest)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('If-None-Match', self.webscraper.session.request.call_args.kwargs['headers'])
+
+    def test_not_modified_returns_none(self):
+        self.manifest.update(self.url, self.headers)
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=304, headers={}))
+        self.assertIsNone(self.webscraper.conditional_get(self.url, self.manifest))
+        sent = self.webscraper.session.request.call_args.kwargs['headers']
+        self.assertEqual(sent['If-None-Match'], '"abc"')
+        self.assertEqual(sent['If-Modified-Since'], self.headers['Last-Modified'])
+
+    def test_server_ignoring_conditionals_switches_to_head(self):
+        self.manifest.update(self.url, self.headers)
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=200, headers=self.headers))
+        self.assertIsNone(self.webscraper.conditional_get(self.url, self.manifest))
+        self.assertFalse(self.manifest.supports_conditional(self.url))
+
+        self.webscraper.session.request.reset_mock()
+        self.assertIsNone(self.webscraper.conditional_get(self.url, self.manifest))
+        self.assertEqual(self.webscraper.session.request.call_args.args[0], 'HEAD')
+
+    def test_changed_validators_download(self):
+        self.manifest.update(self.url, self.headers, conditional=False)
+        changed = dict(self.headers, ETag='"def"')
+        self.webscraper.session.request = MagicMock(return_value=MagicMock(status_code=200, headers=changed))
+        response = self.webscraper.conditional_get(self.url, self.manifest)
+        self.assertIsNotNone(response)
+        methods = [c.args[0] for c in self.webscraper.session.request.call_args_list]
+        self.assertEqual(methods, ['HEAD', 'GET'])
+
+    def test_fetch_all_omits_unchanged(self):
+        other = 'http://www.pbc.gov.cn/other.xlsx'
+        self.manifest.update(self.url, self.headers)
+        self.webscraper.session.request = MagicMock(
+            side_effect=lambda method, url, **kwargs: MagicMock(status_code=304 if url == self.url else 200, headers={}))
+        responses = self.webscraper.fetch_all([self.url, other], manifest=self.manifest)
+        self.assertEqual(list(responses), [other])
+
+    def test_manifest_round_trip(self):
+        self.manifest.update(self.url, self.headers)
+        self.assertTrue(self.manifest.dirty)
+        restored = ValidatorManifest.from_json(self.manifest.to_json())
+        self.assertTrue(restored.matches(self.url, self.headers))
+        self.assertFalse(restored.matches(self.url, dict(self.headers, **{'Content-Length': '101'})))
+
+
+class TestExtractLinks(unittest.TestCase):
+
+    def setUp(self):
+        path = os.path.join(os.path.dirname(__file__), 'fixtures', 'pboc_category_2024.htm')
+        with open(path, 'r', encoding='utf-8') as file:
+            self.html = file.read()
+
+    def test_single_pass_extracts_every_extension(self):
+        links = extract_links(self.html, ['xlsx', 'htm'], backend='html.parser')
+        self.assertEqual(len(links['xlsx']), 12)
+        self.assertEqual(list(links['xlsx']), list(links['htm']))
+        self.assertEqual(links['xlsx']['Money Supply'], '/eportal/fileDir/defaultCurSource/20240000/20240000.xlsx')
+        # Entities are decoded; links outside the data_table are ignored.
+        self.assertIn('Sources & Uses of Credit Funds of Financial Institutions (RMB)', links['htm'])
+        self.assertNotIn('/en/sitemap.htm', links['htm'].values())
+
+    def test_unclosed_cells(self):
+        html = '<table class="data_table"><tr><td>Money Supply<td><a href="/a.xlsx">x</a><tr><td>Other<td><a href="/b.htm">y</a></table>'
+        self.assertEqual(extract_links(html, ['xlsx', 'htm'], backend='html.parser'),
+                         {'xlsx': {'Money Supply': '/a.xlsx'}, 'htm': {'Other': '/b.htm'}})
+
+    def test_backends_agree(self):
+        expected = extract_links(self.html, ['xlsx', 'htm'], backend='html.parser')
+        for backend in BACKENDS:
+            self.assertEqual(extract_links(self.html, ['xlsx', 'htm'], backend=backend), expected, backend)
+
+
+class TestSources(unittest.TestCase):
+
+    def test_load_source(self):
+        self.assertIsInstance(load_source({}), PbocSource)
+        self.assertIsInstance(load_source({'webscraping': {'source': 'pboc'}}), PbocSource)
+        with self.assertRaises(ValueError):
+            load_source({'webscraping': {'source': 'ecb'}})
+        with self.assertRaisesRegex(ValueError, r'webscraping\.source'):
+            load_source({'webscraping': {'sources': ['pboc', 'ecb']}})
+
+    def test_sources_must_implement_listing(self):
+        class Partial(Source):
+            name = 'partial'
+
+            def category_urls(self):
+                return {}
+
+        with self.assertRaises(TypeError):
+            Partial({})
+
+
+class TestBronzePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.prefix = 'bronze/'
+        self.s3_manifest = S3Manifest('test-bucket', self.prefix)
+        modified = datetime(2024, 7, 1, tzinfo=timezone.utc)
+        self.s3_manifest.add(f'{self.prefix}money_supply_20240701.xlsx', hashlib.md5(b'old').hexdigest(), 3, modified)
+        self.s3_manifest.add(f'{self.prefix}reserve_money_20240701.xlsx', hashlib.md5(b'same').hexdigest(), 4, modified)
+        self.webscraper = Webscraper(min_request_interval=0)
+        self.bodies = {
+            'http://www.pbc.gov.cn/money_supply.xlsx': b'new body',
+            'http://www.pbc.gov.cn/reserve_money.xlsx': b'same',
+            'http://www.pbc.gov.cn/unknown.xlsx': b'never fetched',
+        }
+
+        def respond(method, url, **kwargs):
+            body = self.bodies[url]
+            chunks = [body[i:i + 3] for i in range(0, len(body), 3)]
+            response = MagicMock(status_code=200, headers={'ETag': f'"{url}"'})
+            response.iter_content = MagicMock(return_value=iter(chunks))
+            response.__enter__.return_value = response
+            response.__exit__.side_effect = lambda *exc: response.close()
+            return response
+
+        self.webscraper.session.request = MagicMock(side_effect=respond)
+
+    @patch('layers.bronze.pipeline.S3Utility.upload_obj_s3')
+    def test_uploads_only_changed_bodies(self, upload_obj_s3):
+        uploaded = {}
+        upload_obj_s3.side_effect = lambda bucket, key, body: uploaded.update({key: body.read()})
+        validator_manifest = ValidatorManifest()
+        pipeline = BronzePipeline(self.webscraper, 'test-bucket', self.s3_manifest,
+                                  validator_manifest=validator_manifest, queue_size=1, chunk_size=3)
+        result = pipeline.run({
+            'money_supply': 'http://www.pbc.gov.cn/money_supply.xlsx',
+            'reserve_money': 'http://www.pbc.gov.cn/reserve_money.xlsx',
+            'unknown': 'http://www.pbc.gov.cn/unknown.xlsx',
+        })
+
+        self.assertEqual(list(result.updated), ['money_supply'])
+        self.assertEqual(result.unchanged, ['reserve_money'])
+        self.assertEqual(result.missing, ['unknown'])
+        self.assertEqual(list(uploaded.values()), [b'new body'])
+        self.assertEqual(self.s3_manifest.latest('money_supply')['etag'], hashlib.md5(b'new body').hexdigest())
+        self.assertEqual(self.webscraper.session.request.call_count, 2)
+        self.assertTrue(self.webscraper.session.request.call_args.kwargs['stream'])
+        self.assertEqual(sorted(validator_manifest.entries),
+                         ['http://www.pbc.gov.cn/money_supply.xlsx', 'http://www.pbc.gov.cn/reserve_money.xlsx'])
+
+    @patch('layers.bronze.pipeline.S3Utility.upload_obj_s3', side_effect=Exception('S3 down'))
+    def test_failed_upload_keeps_validators(self, upload_obj_s3):
+        validator_manifest = ValidatorManifest()
+        pipeline = BronzePipeline(self.webscraper, 'test-bucket', self.s3_manifest, validator_manifest=validator_manifest)
+        result = pipeline.run({'money_supply': 'http://www.pbc.gov.cn/money_supply.xlsx'})
+        self.assertIn('money_supply', result.failed)
+        self.assertEqual(validator_manifest.entries, {})
+
+    def test_unexpected_fetch_errors_are_recorded(self):
+        self.webscraper.session.request = MagicMock(side_effect=ValueError('bad url'))
+        pipeline = BronzePipeline(self.webscraper, 'test-bucket', self.s3_manifest)
+        result = pipeline.run({'money_supply': 'http://www.pbc.gov.cn/money_supply.xlsx'})
+        self.assertEqual(result.failed, {'money_supply': 'ValueError: bad url'})
+        semaphore = self.webscraper.rate_limiter._semaphore('www.pbc.gov.cn')
+        self.assertTrue(semaphore.acquire(blocking=False))
+        semaphore.release()
+
+    @patch('layers.bronze.main.PollingState.load_s3', return_value=PollingState())
+    @patch('layers.bronze.main.Webscraper.from_config')
+    def test_run_bronze_closes_its_webscraper_on_failure(self, from_config, load_s3):
+        from layers.bronze.main import run_bronze
+
+        from_config.return_value.fetch_all.side_effect = RuntimeError('boom')
+        source = MagicMock(storage={'s3_bronze_key': 'bronze/'}, category_urls=MagicMock(return_value={}))
+        source.name = 'pboc'
+        with self.assertRaises(RuntimeError):
+            run_bronze({'aws': {'s3_bucket': 'test-bucket'}}, source=source, force=True)
+        from_config.return_value.close.assert_called_once()
+
+    def test_content_store_mode(self):
+        with tempfile.TemporaryDirectory() as root:
+            content_store = ContentStore(LocalBackend(root), prefix='bronze/content/')
+            content_store.put('reserve_money', b'same', label='20240701')
+            pipeline = BronzePipeline(self.webscraper, 'test-bucket', None, content_store=content_store)
+            result = pipeline.run({
+                'money_supply': 'http://www.pbc.gov.cn/money_supply.xlsx',
+                'reserve_money': 'http://www.pbc.gov.cn/reserve_money.xlsx',
+            })
+            self.assertEqual(result.unchanged, ['reserve_money'])
+            self.assertEqual(result.updated['money_supply'], content_store.object_key(hashlib.sha256(b'new body').hexdigest()))
+            self.assertEqual(content_store.get('money_supply'), b'new body')
+
+
+def make_xlsx(rows, strings, creator='PBOC', date_time=(2024, 7, 1, 0, 0, 0)) -> bytes:
+    """
+    Minimal xlsx: rows are lists of cell XML; creator and zip timestamps are
+    the metadata a re-export changes.
+    """
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    rel_ns = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    parts = {
+        'docProps/core.xml': f'<coreProperties><creator>{creator}</creator></coreProperties>',
+        'xl/workbook.xml': f'<workbook {ns} {rel_ns}><sheets><sheet name="Data" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        'xl/_rels/workbook.xml.rels': (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="worksheet"/></Relationships>'),
+        'xl/sharedStrings.xml': f'<sst {ns}>' + ''.join(f'<si><t>{s}</t></si>' for s in strings) + '</sst>',
+        'xl/worksheets/sheet1.xml': f'<worksheet {ns}><sheetData>' + ''.join(
+            f'<row r="{i}">{cells}</row>' for i, cells in enumerate(rows, start=1)) + '</sheetData></worksheet>',
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, xml in parts.items():
+            archive.writestr(zipfile.ZipInfo(name, date_time), xml)
+    return buffer.getvalue()
+
+class TestFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.original = make_xlsx(
+            ['<c r="A1" t="s"><v>0</v></c>', '<c r="A2" t="s"><v>1</v></c><c r="B2"><v>100</v></c>'],
+            ['Money Supply', 'M2'])
+
+    def test_cosmetic_rewrite_keeps_fingerprint(self):
+        # New zip timestamps and metadata, reordered shared strings, styles, 100 written as 100.0.
+        rewrite = make_xlsx(
+            ['<c r="A1" t="s" s="3"><v>1</v></c>', '<c r="A2" t="s"><v>0</v></c><c r="B2" s="1"><v>100.0</v></c><c r="C2" s="2"/>'],
+            ['M2', 'Money Supply'], creator='Someone else', date_time=(2024, 8, 1, 12, 0, 0))
+        self.assertNotEqual(hashlib.sha256(rewrite).digest(), hashlib.sha256(self.original).digest())
+        self.assertEqual(fingerprint_workbook(rewrite)['fingerprint'], fingerprint_workbook(self.original)['fingerprint'])
+
+    def test_changed_cells_and_diff(self):
+        revised = make_xlsx(
+            ['<c r="A1" t="s"><v>0</v></c>', '<c r="A2" t="s"><v>1</v></c><c r="B2"><v>101</v></c>',
+             '<c r="A3" t="inlineStr"><is><t>M1</t></is></c>'],
+            ['Money Supply', 'M2'])
+        old, new = fingerprint_workbook(self.original), fingerprint_workbook(revised)
+        self.assertNotEqual(old['fingerprint'], new['fingerprint'])
+        self.assertEqual(diff_fingerprints(old, new), {
+            'sheets_added': [], 'sheets_removed': [],
+            'sheets': {'Data': {'rows_changed': [2], 'rows_added': [3], 'rows_removed': []}},
+        })
+
+    def test_not_a_workbook(self):
+        with self.assertRaises(FingerprintError):
+            fingerprint_workbook(b'<html>not a spreadsheet</html>')
+
+    def test_pipeline_skips_cosmetic_rewrites(self):
+        webscraper = Webscraper(min_request_interval=0)
+        rewrite = make_xlsx(
+            ['<c r="A1" t="s"><v>0</v></c>', '<c r="A2" t="s"><v>1</v></c><c r="B2"><v>100</v></c>'],
+            ['Money Supply', 'M2'], creator='Re-export')
+        response = MagicMock(status_code=200, headers={})
+        response.iter_content = MagicMock(return_value=iter([rewrite]))
+        response.__enter__.return_value = response
+        webscraper.session.request = MagicMock(return_value=response)
+        with tempfile.TemporaryDirectory() as root:
+            backend = LocalBackend(root)
+            content_store = ContentStore(backend, prefix='bronze/content/')
+            fingerprints = FingerprintStore(backend, prefix='bronze/_fingerprints/')
+            fingerprints.put('money_supply', fingerprint_workbook(self.original))
+            content_store.put('money_supply', self.original, label='20240701')
+            pipeline = BronzePipeline(webscraper, 'test-bucket', None, content_store=content_store, fingerprints=fingerprints)
+            result = pipeline.run({'money_supply': 'http://www.pbc.gov.cn/money_supply.xlsx'})
+            self.assertEqual(result.cosmetic, ['money_supply'])
+            self.assertEqual(result.updated, {})
+            self.assertEqual(content_store.get('money_supply'), self.original)
+
+
+class TestPollingScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = PollingPolicy(hot_window_days=3, cold_interval_days=7, recheck_days=7, min_releases=3)
+        # Monetary statistics: released around the 12th-14th.
+        self.entry = {'releases': ['2024-04-12', '2024-05-14', '2024-06-13'], 'last_polled': '2024-07-01'}
+
+    def test_new_categories_are_polled_while_learning(self):
+        self.assertEqual(self.policy.due(None, date(2024, 7, 2)), (True, 'learning'))
+        self.assertEqual(self.policy.due({'releases': ['2024-06-13']}, date(2024, 7, 2)), (True, 'learning'))
+
+    def test_hot_near_usual_release_day(self):
+        self.assertEqual(self.policy.due(self.entry, date(2024, 7, 11)), (True, 'hot'))
+        self.assertEqual(self.policy.due(self.entry, date(2024, 7, 3)), (False, 'cold'))
+        # Cold categories are still polled once the cold interval elapses.
+        self.assertEqual(self.policy.due(self.entry, date(2024, 7, 8)), (True, 'cold interval elapsed'))
+
+    def test_not_hot_after_this_cycles_release(self):
+        entry = dict(self.entry, releases=self.entry['releases'] + ['2024-07-12'], last_polled='2024-07-12')
+        self.assertEqual(self.policy.due(entry, date(2024, 7, 14)), (False, 'cold'))
+
+    def test_unchanged_listing_skips_spreadsheets(self):
+        listing = listing_hash({'money_supply': 'http://x/1.xlsx'}, {'Money Supply': '/1.htm'})
+        state = PollingState()
+        self.assertEqual(self.policy.check_tables(state.get('pboc/Money'), listing, date(2024, 7, 1)), (True, 'listing changed'))
+        state.record_check('pboc/Money', listing, date(2024, 7, 1))
+        self.assertEqual(self.policy.check_tables(state.get('pboc/Money'), listing, date(2024, 7, 2)), (False, 'listing unchanged'))
+        self.assertEqual(self.policy.check_tables(state.get('pboc/Money'), listing, date(2024, 7, 8)),
+                         (True, 'recheck interval elapsed'))
+        moved = listing_hash({'money_supply': 'http://x/2.xlsx'}, {'Money Supply': '/1.htm'})
+        self.assertEqual(self.policy.check_tables(state.get('pboc/Money'), moved, date(2024, 7, 2)), (True, 'listing changed'))
+
+    def test_learns_releases_from_table_history(self):
+        state = PollingState()
+        state.record_poll('pboc/Money', 'http://x', ['money_supply', 'reserve_money'], {}, date(2024, 7, 1))
+        state.learn({'money_supply': ['2024-05-14', '2024-06-13'], 'reserve_money': ['2024-06-13'], 'other': ['2024-06-01']})
+        self.assertEqual(state.get('pboc/Money')['releases'], ['2024-05-14', '2024-06-13'])
+        self.assertTrue(state.history_loaded)
+
+
+class TestRetention(unittest.TestCase):
+
+    def versions(self, *stamps):
+        return [{'key': f'bronze/money_supply_{stamp}.xlsx', 'date': datetime.strptime(stamp, '%Y%m%d').date(),
+                 'etag': stamp, 'size': 10} for stamp in stamps]
+
+    def test_policy_keeps_latest_month_ends_and_recent(self):
+        versions = self.versions('20240105', '20240120', '20240203', '20240214', '20240301', '20240310', '20240312')
+        policy = RetentionPolicy(keep_latest=2, keep_month_end=True, keep_within_days=5)
+        kept, superseded = policy.select(versions, date(2024, 3, 14))
+        self.assertEqual([v['etag'] for v in kept], ['20240120', '20240214', '20240310', '20240312'])
+        self.assertEqual([v['etag'] for v in superseded], ['20240105', '20240203', '20240301'])
+
+        strict = RetentionPolicy(keep_latest=0, keep_month_end=False, keep_within_days=None,
+                                 tables={'reserve_money': {'keep_latest': 5}})
+        kept, _ = strict.select(versions, date(2024, 3, 14))
+        self.assertEqual([v['etag'] for v in kept], ['20240312'])  # The latest always stays
+        self.assertEqual(strict.for_table('reserve_money').keep_latest, 5)
+
+    def test_compaction_archives_then_deletes_in_batches(self):
+        import boto3
+        from moto import mock_aws
+        from common.dataframe_io import read_dataframe
+
+        with mock_aws():
+            s3_client = boto3.client('s3', region_name='us-east-1')
+            s3_client.create_bucket(Bucket='bucket')
+            S3Utility.set_client(None)
+            try:
+                for day in range(1, 6):
+                    rows = [f'<c r="A1" t="s"><v>0</v></c><c r="B1"><v>{day}</v></c>'] if day > 1 else [] # Day 1 is blank
+                    body = make_xlsx(rows, ['M2'])
+                    s3_client.put_object(Bucket='bucket', Key=f'bronze/money_supply_202406{day:02d}.xlsx', Body=body)
+                s3_client.put_object(Bucket='bucket', Key='bronze/reserve_money_20240601.xlsx', Body=b'not a workbook')
+                s3_client.put_object(Bucket='bucket', Key='bronze/reserve_money_20240603.xlsx', Body=b'newer')
+                s3_client.put_object(Bucket='bucket', Key='bronze/reserve_money_20240602.xlsx', Body=b'kept')
+                s3_client.put_object(Bucket='bucket', Key='bronze/_manifests/http_validators.json', Body=b'{}')
+                compactor = BronzeCompactor('bucket', 'bronze/', 'bronze/_archive/',
+                                            RetentionPolicy(keep_latest=2, keep_month_end=False, keep_within_days=None))
+
+                report = compactor.run(dry_run=True, today=date(2024, 7, 1))
+                self.assertEqual(report['deleted'], 4)
+                self.assertEqual(len(S3Utility.list_objects('bucket', 'bronze/')), 9)  # Nothing touched
+
+                with patch.object(S3Utility, 'delete_objects', wraps=S3Utility.delete_objects) as delete:
+                    report = compactor.run(today=date(2024, 7, 1))
+                delete.assert_called_once()
+                self.assertEqual(report['tables']['money_supply']['deleted'],
+                                 [f'bronze/money_supply_2024060{day}.xlsx' for day in (1, 2, 3)])
+                self.assertEqual(report['tables']['reserve_money']['unarchivable'], ['bronze/reserve_money_20240601.xlsx'])
+                self.assertEqual(report['deleted'], 3)
+                remaining = sorted(obj['Key'] for obj in S3Utility.list_objects('bucket', 'bronze/'))
+                self.assertIn('bronze/money_supply_20240605.xlsx', remaining)
+                self.assertIn('bronze/reserve_money_20240601.xlsx', remaining)
+                self.assertNotIn('bronze/money_supply_20240601.xlsx', remaining)
+
+                archive = read_dataframe(S3Utility.download_obj_s3('bucket', 'bronze/_archive/money_supply.parquet'), 'parquet')
+                self.assertEqual(sorted(archive['version'].unique()), ['20240601', '20240602', '20240603'])
+                values = archive[archive['column'] == 'B'].sort_values('version')['value'].tolist()
+                self.assertEqual(values, ['2', '3'])
+                marker = archive[archive['version'] == '20240601']
+                self.assertEqual(len(marker), 1)
+                self.assertTrue(marker[['sheet', 'row', 'column', 'value']].isna().all(axis=None))
+                self.assertEqual(set(archive.loc[archive['column'] == 'A', 'value']), {'M2'})
+
+                # The batch helper splits large deletes into requests of at most 1000 keys
+                with patch.object(S3Utility.client(), 'delete_objects', return_value={}) as request:
+                    result = S3Utility.delete_objects('bucket', [f'k{i}' for i in range(2500)])
+                self.assertEqual([len(call.kwargs['Delete']['Objects']) for call in request.call_args_list], [1000, 1000, 500])
+                self.assertEqual(len(result.succeeded), 2500)
+            finally:
+                S3Utility.set_client(None)
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = LocalBackend(self.tmp.name)
+        self.store = ContentStore(self.backend, prefix='bronze/content/')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_identical_payloads_stored_once(self):
+        first = self.store.put('money_supply', b'workbook', label='2023')
+        second = self.store.put('reserve_money', b'workbook', label='2023')
+        self.assertTrue(first['stored'])
+        self.assertFalse(second['stored'])
+        self.assertEqual(first['object_key'], second['object_key'])
+        blobs = os.listdir(os.path.join(self.tmp.name, 'bronze', 'content', 'objects', 'sha256', first['sha256'][:2]))
+        self.assertEqual(len(blobs), 1)
+
+    def test_changed_is_an_index_lookup(self):
+        sha256 = hashlib.sha256(b'v1').hexdigest()
+        self.assertTrue(self.store.changed('money_supply', sha256))
+        self.store.put('money_supply', b'v1', label='20240701')
+        self.assertFalse(self.store.changed('money_supply', sha256))
+        self.store.put('money_supply', b'v0', label='2023') # Older label does not become latest
+        self.store.put('reserve_money', b'v0', label='20240101')
+        self.store.put('reserve_money', b'v1', label='2024') # Years compare as YYYY0101
+        self.assertEqual(self.store.latest('reserve_money')['label'], '2024')
+        self.store.save_index()
+
+        reloaded = ContentStore(self.backend, prefix='bronze/content/')
+        self.assertFalse(reloaded.changed('money_supply', sha256))
+        self.assertEqual(reloaded.get('money_supply'), b'v1')
+        self.assertEqual(reloaded.get('money_supply', label='2023'), b'v0')
+
+    def test_concurrent_first_access_loads_index_once(self):
+        self.store.put('money_supply', b'v1', label='20240701')
+        self.store.save_index()
+        backend = MagicMock(wraps=self.backend)
+        reloaded = ContentStore(backend, prefix='bronze/content/')
+        threads = [threading.Thread(target=reloaded.latest, args=('money_supply',)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(backend.get.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
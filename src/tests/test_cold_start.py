@@ -0,0 +1,63 @@
+import os
+import sys
+import subprocess
+import unittest
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets for importing the bronze Lambda handler in a fresh interpreter.
+# Generous enough for a slow CI machine; pulling pandas (or boto3/botocore) back in
+# at import time blows through both.
+IMPORT_BUDGET_MS = 750
+RSS_BUDGET_MB = 100
+# Heavy modules the bronze import path must not load.
+LAZY_MODULES = ['pandas', 'numpy', 'boto3', 'botocore', 'common.emailer']
+
+def import_profile(module: str):
+    """Imports module under -X importtime; returns ({module: cumulative us}, peak RSS in MB)."""
+    # Peak RSS from /proc (VmHWM) where available: ru_maxrss survives exec on
+    # Linux, so it would report the (much larger) test runner that forked us.
+    code = (
+        f"import {module}, os, resource, sys\n"
+        "if os.path.exists('/proc/self/status'):\n"
+        "    hwm = [line for line in open('/proc/self/status') if line.startswith('VmHWM:')][0]\n"
+        "    print(int(hwm.split()[1]) / 1024)\n"
+        "else:\n"
+        "    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "    print(rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024)\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=SRC_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise AssertionError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, microseconds, name = line.split('|')
+        cumulative[name.strip()] = int(microseconds)
+    return cumulative, float(completed.stdout.strip().splitlines()[-1])
+
+@unittest.skipUnless(sys.platform != 'win32', "resource module is POSIX-only")
+class TestBronzeColdStart(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.imports, cls.rss_mb = import_profile('layers.bronze.handler')
+
+    def test_heavy_modules_stay_lazy(self):
+        loaded = [module for module in LAZY_MODULES if module in self.imports]
+        self.assertEqual(loaded, [], f"loaded at import time: {loaded}")
+
+    def test_import_time_budget(self):
+        elapsed_ms = self.imports['layers.bronze.handler'] / 1000
+        self.assertLess(elapsed_ms, IMPORT_BUDGET_MS,
+                        f"importing the bronze handler took {elapsed_ms:.0f} ms")
+
+    def test_rss_budget(self):
+        self.assertLess(self.rss_mb, RSS_BUDGET_MB, f"peak RSS after import was {self.rss_mb:.0f} MB")
+
+if __name__ == '__main__':
+    unittest.main()
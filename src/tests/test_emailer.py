@@ -0,0 +1,109 @@
+import io
+import email
+import socket
+import zipfile
+import unittest
+from unittest.mock import patch, MagicMock
+from common.emailer import Emailer, Attachment
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+class RecordingHandler:
+    """aiosmtpd handler that keeps every message and counts connections."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return '250 OK'
+
+@unittest.skipIf(Controller is None, "aiosmtpd is not installed")
+class TestEmailerDelivery(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=port)
+        self.controller.start()
+        self.emailer = Emailer('sender@example.com', None, host='127.0.0.1', port=port, use_ssl=False)
+
+    def tearDown(self):
+        self.controller.stop()
+
+    def test_batch_shares_one_session(self):
+        messages = [self.emailer.build_message([f'r{i}@example.com'], f'Update {i}', '<p>hi</p>') for i in range(3)]
+        self.assertEqual(self.emailer.send_many(messages), [True, True, True])
+        self.assertEqual([message['Subject'] for message in self.handler.messages], ['Update 0', 'Update 1', 'Update 2'])
+        self.assertEqual(len(self.handler.sessions), 1)
+
+    def test_send_gmail_with_zipped_in_memory_attachments(self):
+        self.emailer.zip_attachments = True
+        attachments = [Attachment('money_supply.xlsx', b'PK workbook'), Attachment('chart.png', io.BytesIO(b'png'))]
+        self.assertTrue(self.emailer.send_gmail(['r@example.com'], 'Title', '<p>body</p>', attachments=attachments))
+        parts = [part for part in self.handler.messages[0].walk() if part.get_filename()]
+        self.assertEqual([part.get_filename() for part in parts], ['attachments.zip'])
+        with zipfile.ZipFile(io.BytesIO(parts[0].get_payload(decode=True))) as bundle:
+            self.assertEqual(bundle.read('money_supply.xlsx'), b'PK workbook')
+            self.assertEqual(bundle.read('chart.png'), b'png')
+
+class TestEmailer(unittest.TestCase):
+
+    def test_connection_is_reused_and_reopened_after_disconnect(self):
+        import smtplib
+
+        server = MagicMock()
+        server.send_message.side_effect = [None, smtplib.SMTPServerDisconnected(), None]
+        emailer = Emailer('sender@example.com', 'password')
+        with patch('common.emailer.smtplib.SMTP_SSL', return_value=server) as connect:
+            messages = [emailer.build_message(['r@example.com'], 'T', 'b') for _ in range(2)]
+            self.assertEqual(emailer.send_many(messages), [True, True])
+        self.assertEqual(connect.call_count, 2)  # Once, then once more after the drop
+        server.close.assert_called_once()  # The dropped connection is closed first
+        server.login.assert_called_with('sender@example.com', 'password')
+
+    def test_oversized_attachments_become_links(self):
+        emailer = Emailer('sender@example.com', None, max_attachment_bytes=10, link_bucket='bucket')
+        with patch.object(Emailer, '_upload_link', return_value='https://example.com/big.xlsx') as upload:
+            message = emailer.build_message(['r@example.com'], 'T', '<p>b</p>',
+                                            attachments=[Attachment('small.csv', b'12345'), Attachment('big.xlsx', b'x' * 20)])
+        upload.assert_called_once()
+        self.assertEqual([part.get_filename() for part in message.walk() if part.get_filename()], ['small.csv'])
+        self.assertIn('https://example.com/big.xlsx', message.get_body(('html',)).get_content())
+
+    @patch('common.s3_utils.S3Utility.client')
+    @patch('common.s3_utils.S3Utility.upload_buffer_s3')
+    def test_link_keys_include_content_hash(self, upload, client):
+        client.return_value.generate_presigned_url.side_effect = lambda *args, Params, **kwargs: Params['Key']
+        emailer = Emailer('sender@example.com', None, link_bucket='bucket')
+        keys = [emailer._upload_link(Attachment('big.xlsx', body)) for body in (b'one', b'two')]
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertTrue(all(key.startswith('email/attachments/') and key.endswith('/big.xlsx') for key in keys))
+
+    @patch('common.s3_utils.S3Utility.upload_buffer_s3')
+    def test_failed_link_upload_is_noted(self, upload):
+        from botocore.exceptions import ClientError
+
+        upload.side_effect = ClientError({'Error': {'Code': 'AccessDenied', 'Message': 'denied'}}, 'PutObject')
+        emailer = Emailer('sender@example.com', None, max_attachment_bytes=10, link_bucket='bucket')
+        message = emailer.build_message(['r@example.com'], 'T', '<p>b</p>', attachments=[Attachment('big.xlsx', b'x' * 20)])
+        self.assertIn('<li>big.xlsx (unavailable)</li>', message.get_body(('html',)).get_content())
+
+    def test_create_email_body(self):
+        body = Emailer('s', None).create_email_body(
+            {'Monetary Statistics': {'Money Supply': '/a.htm', 'Reserve Money & Co': '/b.htm'}},
+            {'Monetary Statistics': 'http://www.pbc.gov.cn/m.htm'},
+            {'money_supply': 'bronze/money_supply_20240701.xlsx'})
+        self.assertIn('<li><b>(New!)</b> Money Supply (<a href="http://www.pbc.gov.cn/a.htm">view</a>)</li>', body)
+        self.assertIn('<li>Reserve Money &amp; Co (<a href="http://www.pbc.gov.cn/b.htm">view</a>)</li>', body)
+        self.assertIn('Monetary Statistics (<a href="http://www.pbc.gov.cn/m.htm">link</a>)', body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pandas as pd
+from layers.gold.aggregator import compute_aggregates, observation_step_months, join_on_period, GoldLedger
+from layers.gold.visualizer import series_chart_jobs
+from charts.chart_generator import ChartGenerator
+
+def silver_frame(table, series, periods, values):
+    return pd.DataFrame({
+        'table': table,
+        'series': series,
+        'period': pd.to_datetime(periods),
+        'value': values,
+    })
+
+class TestComputeAggregates(unittest.TestCase):
+
+    def setUp(self):
+        periods = pd.date_range('2023-01-01', '2024-03-01', freq='MS')
+        self.df = pd.concat([
+            silver_frame('money_supply', 'M2', periods, np.arange(1.0, len(periods) + 1)),
+            silver_frame('money_supply', 'M1', periods[::-1], np.full(len(periods), 5.0)),
+        ], ignore_index=True)
+
+    def test_changes_and_yoy(self):
+        out = compute_aggregates(self.df, windows=(3,))
+        m2 = out[out['series'] == 'M2'].set_index('period')
+        self.assertEqual(m2.loc['2024-02-01', 'change'], 1.0)
+        self.assertAlmostEqual(m2.loc['2024-02-01', 'pct_change'], 14 / 13 - 1)
+        self.assertEqual(m2.loc['2024-02-01', 'yoy_change'], 12.0)
+        self.assertTrue(np.isnan(m2.loc['2023-02-01', 'yoy_change']))
+        self.assertEqual(m2.loc['2023-03-01', 'rolling_3'], 2.0)
+        self.assertTrue(np.isnan(m2.loc['2023-02-01', 'rolling_3']))
+        # Series are computed independently of input order.
+        m1 = out[out['series'] == 'M1']
+        self.assertTrue((m1['change'].dropna() == 0).all())
+
+    def test_unit_is_carried(self):
+        out = compute_aggregates(self.df.assign(unit='100 million Yuan'), windows=(3,))
+        self.assertEqual(out['unit'].unique().tolist(), ['100 million Yuan'])
+        self.assertEqual(len(out), len(self.df))
+        jobs = series_chart_jobs(out, 'money_supply', years=1)
+        self.assertEqual({job.spec['y_label'] for job in jobs}, {'100 million Yuan'})
+
+    def test_yoy_respects_gaps(self):
+        df = silver_frame('t', 's', ['2022-12-01', '2024-01-01'], [1.0, 2.0])
+        out = compute_aggregates(df, windows=())
+        self.assertTrue(out['yoy_change'].isna().all())
+        self.assertEqual(out['change'].iloc[1], 1.0)
+
+    def test_observation_step(self):
+        self.assertEqual(observation_step_months(self.df), 1)
+        annual = silver_frame('t', 's', ['2020-01-01', '2021-01-01', '2022-01-01'], [1.0, 2.0, 3.0])
+        self.assertEqual(observation_step_months(annual), 12)
+
+    def test_join_on_period(self):
+        other = silver_frame('reserve_money', 'Reserve Money', ['2024-01-01', '2024-04-01'], [7.0, 8.0])
+        joined = join_on_period({'money_supply': self.df, 'reserve_money': other})
+        self.assertIn('money_supply.M2', joined.columns)
+        self.assertEqual(joined.loc['2024-04-01', 'reserve_money.Reserve Money'], 8.0)
+        self.assertTrue(np.isnan(joined.loc['2024-04-01', 'money_supply.M2']))
+
+
+class TestGoldLedger(unittest.TestCase):
+
+    def test_pending_uses_earliest_unseen_change(self):
+        silver = {
+            'money_supply': {'processed_at': '2024-07-03', 'changes': [
+                {'processed_at': '2024-07-01', 'changed_from': '2024-01-01'},
+                {'processed_at': '2024-07-02', 'changed_from': '2024-05-01'},
+                {'processed_at': '2024-07-03', 'changed_from': '2024-03-01'},
+            ]},
+            'reserve_money': {'processed_at': '2024-07-03', 'changes': []},
+            'new_table': {'processed_at': '2024-07-03', 'changes': []},
+        }
+        ledger = GoldLedger({
+            'money_supply': {'silver_processed_at': '2024-07-01'},
+            'reserve_money': {'silver_processed_at': '2024-07-02'},
+        })
+        self.assertEqual(ledger.pending(silver), {'money_supply': '2024-03-01', 'new_table': None})
+        self.assertEqual(ledger.entries['reserve_money']['silver_processed_at'], '2024-07-03')
+
+
+class TestCharts(unittest.TestCase):
+
+    def setUp(self):
+        periods = pd.date_range('2018-01-01', '2024-06-01', freq='MS')
+        self.gold = compute_aggregates(pd.concat([
+            silver_frame('money_supply', 'M2', periods, np.arange(len(periods), dtype=float)),
+            silver_frame('money_supply', 'M1 (narrow)', periods, np.ones(len(periods))),
+        ], ignore_index=True))
+
+    def test_jobs_cover_recent_years(self):
+        jobs = series_chart_jobs(self.gold, 'money_supply', years=2)
+        self.assertEqual([job.name for job in jobs], ['money_supply/m1_narrow', 'money_supply/m2'])
+        self.assertEqual(len(jobs[0].data), 24)
+        self.assertEqual(list(jobs[0].data.columns), ['value', 'rolling_12'])
+
+    def test_cache_key_tracks_data_and_spec(self):
+        job = series_chart_jobs(self.gold, 'money_supply', years=2)[1]
+        same = series_chart_jobs(self.gold, 'money_supply', years=2)[1]
+        self.assertEqual(job.cache_key(), same.cache_key())
+        same.spec = dict(same.spec, title='Other')
+        self.assertNotEqual(job.cache_key(), same.cache_key())
+        changed = self.gold.copy()
+        changed.loc[changed.index[-1], 'value'] = -1.0
+        self.assertNotEqual(job.cache_key(), series_chart_jobs(changed, 'money_supply', years=2)[1].cache_key())
+
+    @patch('charts.chart_generator.render_chart', return_value=b'png')
+    @patch('charts.chart_generator.S3Utility')
+    def test_generate_skips_cached_charts(self, s3_utility, render_chart):
+        jobs = series_chart_jobs(self.gold, 'money_supply', years=2)
+        generator = ChartGenerator('bucket', 'charts/', max_workers=1)
+        cached_key = generator.object_key(jobs[0].cache_key(), 'png')
+        s3_utility.list_objects.return_value = [{'Key': cached_key}]
+        s3_utility.download_obj_s3.return_value = None
+        keys = generator.generate(jobs)
+        self.assertEqual(keys['money_supply/m1_narrow'], cached_key)
+        render_chart.assert_called_once()
+        uploaded = s3_utility.upload_many.call_args.args[1]
+        self.assertEqual(sorted(uploaded), sorted([keys['money_supply/m2'], 'charts/index.json']))
+
+    @patch('charts.chart_generator.render_chart', return_value=b'png')
+    @patch('charts.chart_generator.S3Utility')
+    def test_index_keeps_charts_of_other_tables(self, s3_utility, render_chart):
+        stored = {}
+        s3_utility.list_objects.return_value = []
+        s3_utility.download_obj_s3.side_effect = lambda bucket, key: stored.get(key)
+        s3_utility.upload_many.side_effect = lambda bucket, uploads: stored.update(uploads) or MagicMock()
+        generator = ChartGenerator('bucket', 'charts/', max_workers=1)
+        reserves = self.gold.assign(table='reserve_money')
+        first = generator.generate(series_chart_jobs(self.gold, 'money_supply', years=2))
+        second = generator.generate(series_chart_jobs(reserves, 'reserve_money', years=2))
+        index = json.loads(stored['charts/index.json'])
+        self.assertEqual(index, dict(first, **second))
+        self.assertEqual(len(index), 4)
+
+if __name__ == '__main__':
+    unittest.main()
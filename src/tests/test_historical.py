@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from historical.ingest_pboc import BackfillJournal, BackfillRunner
+
+PAGE = """
+<table class="data_table">
+  <tr><td>Money Supply</td><td><a href="/files/money_supply.xlsx">xlsx</a></td></tr>
+  <tr><td>Reserve Money</td><td><a href="/files/reserve_money.xlsx">xlsx</a></td></tr>
+</table>
+"""
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.config = {'webscraping': {'urls': {'pboc': {
+            'base': 'http://www.pbc.gov.cn',
+            '2023': {'base': 'http://www.pbc.gov.cn/2023/index.html', 'extensions': {'money': 'money'}},
+            '2024': {'base': 'http://www.pbc.gov.cn/2024/index.html', 'extensions': {'money': 'money'}},
+        }}}}
+        self.webscraper = MagicMock(max_workers=4)
+        self.webscraper.fetch_all.side_effect = lambda urls: {url: MagicMock(text=PAGE) for url in urls}
+        self.webscraper.get_request.side_effect = lambda url: MagicMock(content=url.encode('utf-8'))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.tmp.name, 'journal.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def runner(self):
+        journal = BackfillJournal.load_local(self.journal_path)
+        return BackfillRunner(self.webscraper, self.config, 'test-bucket', 'historical/', journal, checkpoint_every=1)
+
+    @patch('historical.ingest_pboc.S3Utility.upload_obj_s3')
+    def test_backfill_and_resume(self, upload_obj_s3):
+        stats = self.runner().run(range(2022, 2025))
+        self.assertEqual(stats['tables'], 4)
+        keys = sorted(call.args[1] for call in upload_obj_s3.call_args_list)
+        self.assertEqual(keys[0], 'historical/2023/money_supply.xlsx')
+
+        upload_obj_s3.reset_mock()
+        self.webscraper.get_request.reset_mock()
+        stats = self.runner().run(range(2022, 2025))
+        self.assertEqual((stats['tables'], stats['skipped']), (0, 4))
+        self.webscraper.get_request.assert_not_called()
+        upload_obj_s3.assert_not_called()
+
+    @patch('historical.ingest_pboc.S3Utility.upload_obj_s3')
+    def test_failures_are_retried_next_run(self, upload_obj_s3):
+        upload_obj_s3.side_effect = Exception('S3 down')
+        stats = self.runner().run([2024])
+        self.assertEqual((stats['tables'], stats['failed']), (0, 2))
+
+        upload_obj_s3.side_effect = None
+        stats = self.runner().run([2024])
+        self.assertEqual(stats['tables'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
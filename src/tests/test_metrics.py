@@ -0,0 +1,57 @@
+import io
+import json
+import unittest
+from common.metrics import Metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_counters_and_timers(self):
+        self.metrics.incr('http.requests')
+        self.metrics.incr('http.requests', 2)
+
+        @self.metrics.timed('work.seconds')
+        def work():
+            return 'done'
+
+        self.assertEqual(work(), 'done')
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('work.seconds'):
+                raise ValueError()
+        summary = self.metrics.summary()
+        self.assertEqual(summary['counters']['http.requests'], 3)
+        self.assertEqual(summary['histograms']['work.seconds']['count'], 2)
+
+    def test_percentiles(self):
+        for value in range(1, 101):
+            self.metrics.observe('s3.put.bytes', value, unit='Bytes')
+        described = self.metrics.summary()['histograms']['s3.put.bytes']
+        self.assertEqual((described['min'], described['p50'], described['p99'], described['max']), (1, 51, 100, 100))
+        self.assertEqual(described['sum'], 5050)
+
+    def test_emf_documents(self):
+        self.metrics.incr('bronze.updated', 2)
+        for value in range(150):
+            self.metrics.observe('http.get.seconds', value / 1000, unit='Seconds')
+        documents = self.metrics.emf_documents('TLG/Test', {'Pipeline': 'bronze'})
+        # 150 values need two documents of at most 100 values each.
+        self.assertEqual(len(documents), 2)
+        first = documents[0]
+        directive = first['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(directive['Namespace'], 'TLG/Test')
+        self.assertEqual(directive['Dimensions'], [['Pipeline']])
+        self.assertIn({'Name': 'http.get.seconds', 'Unit': 'Seconds'}, directive['Metrics'])
+        self.assertEqual(first['Pipeline'], 'bronze')
+        self.assertEqual(first['bronze.updated'], 2)
+        self.assertEqual(len(first['http.get.seconds']) + len(documents[1]['http.get.seconds']), 150)
+
+    def test_emit_json(self):
+        self.metrics.incr('bronze.updated')
+        stream = io.StringIO()
+        self.metrics.emit('json', stream=stream)
+        self.assertEqual(json.loads(stream.getvalue())['metrics']['counters'], {'bronze.updated': 1})
+
+if __name__ == '__main__':
+    unittest.main()
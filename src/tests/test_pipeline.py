@@ -0,0 +1,79 @@
+import os
+import json
+import tempfile
+import unittest
+from pipeline.orchestrator import Pipeline, Stage, PipelineError
+
+class Recorder:
+    """Stage handler returning a fixed output and remembering its calls."""
+
+    def __init__(self, changed=(), fail=False):
+        self.changed = list(changed)
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, config, changed, upstream):
+        self.calls.append((changed, sorted(upstream)))
+        if self.fail:
+            raise Exception("boom")
+        return {'changed': self.changed, 'items': len(self.changed), 'bytes': 100}
+
+class TestPipeline(unittest.TestCase):
+
+    def build(self, **handlers):
+        dependencies = {'bronze': [], 'silver': ['bronze'], 'gold': ['silver'], 'email': ['bronze', 'gold']}
+        return Pipeline('test', [Stage(name, handlers[name], depends_on=dependencies[name]) for name in handlers])
+
+    def test_topological_order(self):
+        stages = [Stage('gold', None, ['silver']), Stage('silver', None, ['bronze']), Stage('bronze', None)]
+        self.assertEqual(Pipeline('test', stages).order, ['bronze', 'silver', 'gold'])
+
+    def test_invalid_definitions(self):
+        with self.assertRaises(PipelineError):
+            Pipeline('test', [Stage('a', None, ['b']), Stage('b', None, ['a'])])
+        with self.assertRaises(PipelineError):
+            Pipeline('test', [Stage('a', None, ['missing'])])
+
+    def test_changed_tables_propagate(self):
+        silver, gold, email = Recorder(['t1']), Recorder(['t1']), Recorder()
+        run_log = self.build(bronze=Recorder(['t1', 't2']), silver=silver, gold=gold, email=email).run({})
+        self.assertEqual(silver.calls[0][0], ['t1', 't2'])
+        self.assertEqual(gold.calls[0][0], ['t1'])
+        # Union of its dependencies' changes.
+        self.assertEqual(email.calls[0], (['t1', 't2'], ['bronze', 'gold', 'silver']))
+        self.assertEqual(run_log['status'], 'succeeded')
+        self.assertEqual([s['bytes'] for s in run_log['stages']], [100, 100, 100, 100])
+
+    def test_no_bronze_updates_short_circuits(self):
+        silver, gold, email = Recorder(['t1']), Recorder(['t1']), Recorder()
+        run_log = self.build(bronze=Recorder(), silver=silver, gold=gold, email=email).run({})
+        self.assertEqual((silver.calls, gold.calls, email.calls), ([], [], []))
+        self.assertEqual([s['status'] for s in run_log['stages']], ['succeeded', 'skipped', 'skipped', 'skipped'])
+
+    def test_failure_blocks_dependents(self):
+        gold, email = Recorder(['t1']), Recorder()
+        run_log = self.build(bronze=Recorder(['t1']), silver=Recorder(fail=True), gold=gold, email=email).run({})
+        self.assertEqual(gold.calls, [])
+        self.assertEqual(email.calls, [])
+        statuses = {s['stage']: s['status'] for s in run_log['stages']}
+        self.assertEqual(statuses, {'bronze': 'succeeded', 'silver': 'failed', 'gold': 'blocked', 'email': 'blocked'})
+        self.assertEqual(run_log['status'], 'failed')
+
+    def test_run_log_written(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pipeline = Pipeline.from_dict({
+                'name': 'test',
+                'run_log': {'local_dir': tmp},
+                'stages': {'only': {'handler': 'tests.test_pipeline.noop_stage'}},
+            })
+            run_log = pipeline.run({})
+            with open(os.path.join(tmp, f"{run_log['run_id']}.json")) as file:
+                saved = json.load(file)
+        self.assertEqual(saved['stages'][0]['stage'], 'only')
+        self.assertEqual(saved['stages'][0]['items'], 3)
+
+def noop_stage(config, changed, upstream):
+    return {'changed': [], 'items': 3, 'bytes': 0}
+
+if __name__ == '__main__':
+    unittest.main()
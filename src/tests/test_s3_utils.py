@@ -1,3 +1,4 @@
+import hashlib
 import unittest
 from unittest.mock import patch
 from moto import mock_aws
@@ -20,20 +21,48 @@ class TestS3Utility(unittest.TestCase):
         self.prefix = 'test'
         self.s3_client = boto3.client('s3', region_name='us-east-1')
         self.s3_client.create_bucket(Bucket=self.bucket)
+        S3Utility.set_client(None)
         self.test_key = f'{self.prefix}/file.csv'
         self.local_file_path = 'test_file.csv'
         self.df = pd.DataFrame({'col1': [1, 2], 'col2': [3, 4]})
 
     @mock_aws
     def tearDown(self):
+        S3Utility.set_client(None)
         self.mock_aws.stop()
 
     @mock_aws
     def test_get_latest_file(self):
         self.s3_client.put_object(Bucket=self.bucket, Key=self.test_key, Body='Test content')
-        latest_file = S3Utility.get_latest_file(self.bucket, self.prefix, self.s3_client)
+        latest_file = S3Utility.get_latest_file_key(self.bucket, self.prefix)
         self.assertEqual(latest_file, self.test_key)
 
+    @mock_aws
+    def test_list_objects_paginates(self):
+        for i in range(1005):
+            self.s3_client.put_object(Bucket=self.bucket, Key=f'{self.prefix}/many/{i:04d}.csv', Body=b'')
+        self.assertEqual(len(S3Utility.list_objects(self.bucket, f'{self.prefix}/many/')), 1005)
+
+    @mock_aws
+    def test_build_manifest(self):
+        prefix = f'{self.prefix}/bronze/'
+        self.s3_client.put_object(Bucket=self.bucket, Key=f'{prefix}money_supply_20240601.xlsx', Body=b'old')
+        self.s3_client.put_object(Bucket=self.bucket, Key=f'{prefix}money_supply_20240701.xlsx', Body=b'new')
+        self.s3_client.put_object(Bucket=self.bucket, Key=f'{prefix}reserve_money_20240701.xlsx', Body=b'rm')
+        self.s3_client.put_object(Bucket=self.bucket, Key=f'{prefix}_manifests/http_validators.json', Body=b'{}')
+
+        manifest = S3Utility.build_manifest(self.bucket, prefix)
+        self.assertEqual(manifest.tables(), ['money_supply', 'reserve_money'])
+        latest = manifest.latest('money_supply')
+        self.assertEqual(latest['key'], f'{prefix}money_supply_20240701.xlsx')
+        self.assertEqual(latest['etag'], hashlib.md5(b'new').hexdigest())
+        self.assertEqual(latest['size'], 3)
+
+        manifest.record_upload(f'{prefix}reserve_money_20240801.xlsx', 'abc', 10)
+        manifest.save(f'{prefix}_manifests/objects.json')
+        loaded = S3Utility.load_manifest(self.bucket, prefix, f'{prefix}_manifests/objects.json')
+        self.assertEqual(loaded.latest('reserve_money')['key'], f'{prefix}reserve_money_20240801.xlsx')
+
     @mock_aws
     def test_upload_local_file_to_s3(self):
         with open(self.local_file_path, 'w') as f:
@@ -71,5 +100,199 @@ class TestS3Utility(unittest.TestCase):
         df_from_s3 = pd.read_csv(StringIO(content))
         pd.testing.assert_frame_equal(df_from_s3, self.df)
 
+    @mock_aws
+    def test_dataframe_formats_round_trip(self):
+        df = pd.DataFrame({'col1': [1, 2], 'col2': ['a', 'b']})
+        for key in ('file.csv.gz', 'file.jsonl', 'file.jsonl.gz', 'file.parquet', 'file.xlsx', 'file.json'):
+            with self.subTest(key=key):
+                S3Utility.upload_dataframe_s3(df, self.bucket, f'{self.prefix}/{key}')
+                pd.testing.assert_frame_equal(S3Utility.download_s3_to_dataframe(self.bucket, f'{self.prefix}/{key}'), df)
+
+        body = self.s3_client.get_object(Bucket=self.bucket, Key=f'{self.prefix}/file.csv.gz')['Body'].read()
+        self.assertEqual(body[:2], b'\x1f\x8b')  # gzip magic
+        body = self.s3_client.get_object(Bucket=self.bucket, Key=f'{self.prefix}/file.xlsx')['Body'].read()
+        self.assertEqual(body[:2], b'PK')  # A real workbook, not None
+        with self.assertRaises(Exception):
+            S3Utility.upload_dataframe_s3(df, self.bucket, f'{self.prefix}/file.txt')
+
+    @mock_aws
+    def test_parquet_projection_and_filters_use_ranged_reads(self):
+        import pyarrow.parquet as pq
+        from common.dataframe_io import write_dataframe
+        from common.metrics import metrics
+
+        n = 200_000
+        df = pd.DataFrame({
+            'period': pd.date_range('2000-01-01', periods=n, freq='min'),
+            'series': pd.Categorical(['m0', 'm1', 'm2', 'm3'] * (n // 4)),
+            'value': range(n),
+            'note': [f'row {i} ' * 4 for i in range(n)],
+        })
+        key = f'{self.prefix}/big.parquet'
+        body = write_dataframe(df, 'parquet', row_group_size=50_000)
+        metadata = pq.ParquetFile(body).metadata
+        self.assertEqual(metadata.num_row_groups, 4)
+        self.assertEqual(metadata.row_group(0).column(0).compression, 'ZSTD')
+        self.assertTrue(metadata.row_group(0).column(1).has_dictionary_page)
+        size = body.seek(0, 2)
+        body.seek(0)
+        S3Utility.upload_buffer_s3(self.bucket, key, body)
+
+        cutoff = df['period'][150_000]
+        S3Utility.configure(multipart_threshold=1024)
+        metrics.reset()
+        try:
+            result = S3Utility.download_s3_to_dataframe(self.bucket, key, columns=['period', 'value'],
+                                                        filters=[('period', '>=', cutoff)], dtype={'value': 'int32'})
+        finally:
+            S3Utility.configure(multipart_threshold=8 * 1024 * 1024)
+        self.assertEqual(list(result.columns), ['period', 'value'])
+        self.assertEqual(len(result), 50_000)
+        self.assertEqual(result['value'].dtype, 'int32')
+        summary = metrics.summary()
+        self.assertGreater(summary['counters']['s3.get.ranges'], 0)
+        self.assertLess(summary['histograms']['s3.get.bytes']['sum'], size / 2)
+
+    @mock_aws
+    def test_range_reader_reads_only_requested_bytes(self):
+        from common.dataframe_io import S3RangeReader
+
+        self.s3_client.put_object(Bucket=self.bucket, Key=self.test_key, Body=b'0123456789')
+        reader = S3RangeReader(S3Utility.client(), self.bucket, self.test_key)
+        self.assertEqual(reader.size, 10)
+        reader.seek(-3, 2)
+        self.assertEqual(reader.read(), b'789')
+        reader.seek(2)
+        self.assertEqual(reader.read(3), b'234')
+        self.assertEqual((reader.requests, reader.bytes_read), (2, 6))
+
+    @mock_aws
+    def test_read_through_cache(self):
+        import tempfile
+        from common.metrics import metrics
+
+        with tempfile.TemporaryDirectory() as directory:
+            S3Utility.configure_cache(directory=directory, max_bytes=25)
+            try:
+                cache = S3Utility.cache
+                self.s3_client.put_object(Bucket=self.bucket, Key=self.test_key, Body=b'0123456789')
+                self.assertEqual(S3Utility.download_buffer_s3(self.bucket, self.test_key), b'0123456789')
+                self.assertEqual(S3Utility.download_buffer_s3(self.bucket, self.test_key), b'0123456789')
+                self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+                # A new version is fetched again; the conditional GET does not match
+                self.s3_client.put_object(Bucket=self.bucket, Key=self.test_key, Body=b'abcdefghij')
+                self.assertEqual(S3Utility.download_buffer_s3(self.bucket, self.test_key), b'abcdefghij')
+                self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+                # Within max_age no request is made at all
+                cache.max_age_seconds = 60
+                with patch.object(self.s3_client, 'get_object', side_effect=AssertionError('no request expected')):
+                    S3Utility.set_client(self.s3_client)
+                    S3Utility.download_s3_file_to_local(self.local_file_path, self.bucket, self.test_key)
+                with open(self.local_file_path, 'rb') as f:
+                    self.assertEqual(f.read(), b'abcdefghij')
+                cache.max_age_seconds = 0
+
+                # LRU: a third 10-byte object pushes out the least recently used one
+                for name in ('a.csv', 'b.csv'):
+                    self.s3_client.put_object(Bucket=self.bucket, Key=f'{self.prefix}/{name}', Body=b'x' * 10)
+                S3Utility.download_buffer_s3(self.bucket, f'{self.prefix}/a.csv')
+                S3Utility.download_buffer_s3(self.bucket, f'{self.prefix}/b.csv')
+                self.assertEqual(cache.evictions, 1)
+                self.assertLessEqual(cache.usage(), 25)
+                self.assertIsNone(cache._entry(self.bucket, self.test_key))
+
+                # An eviction racing a read refetches instead of failing
+                real_path, paths = cache.path, []
+
+                def evicted_after_path(bucket, key):
+                    paths.append(real_path(bucket, key))
+                    if len(paths) == 1:
+                        cache.invalidate(bucket, key)
+                    return paths[-1]
+
+                with patch.object(cache, 'path', side_effect=evicted_after_path):
+                    self.assertEqual(cache.get(self.bucket, f'{self.prefix}/b.csv'), b'x' * 10)
+                self.assertEqual(len(paths), 2)
+
+                # Uploads through S3Utility drop the cached copy
+                S3Utility.upload_obj_s3(self.bucket, f'{self.prefix}/b.csv', b'new')
+                self.assertIsNone(cache._entry(self.bucket, f'{self.prefix}/b.csv'))
+
+                df_key = f'{self.prefix}/frame.parquet'
+                S3Utility.upload_dataframe_s3(self.df, self.bucket, df_key)
+                cache.memory_map = True
+                metrics.reset()
+                for _ in range(2):
+                    pd.testing.assert_frame_equal(S3Utility.download_s3_to_dataframe(self.bucket, df_key), self.df)
+                self.assertEqual(metrics.summary()['counters']['s3.cache.hits'], 1)
+            finally:
+                S3Utility.configure_cache(enabled=False)
+
+    @mock_aws
+    def test_download_obj_s3(self):
+        self.s3_client.put_object(Bucket=self.bucket, Key=self.test_key, Body=b'Test content')
+        self.assertEqual(S3Utility.download_obj_s3(self.bucket, self.test_key), b'Test content')
+        self.assertIsNone(S3Utility.download_obj_s3(self.bucket, f'{self.prefix}/missing.csv'))
+
+    @mock_aws
+    def test_client_is_cached_and_configurable(self):
+        client = S3Utility.client()
+        self.assertIs(S3Utility.client(), client)
+
+        S3Utility.from_config({'aws': {'region': 'eu-west-1', 's3_client': {'max_pool_connections': 4}}})
+        try:
+            configured = S3Utility.client()
+            self.assertIsNot(configured, client)
+            self.assertEqual(configured.meta.region_name, 'eu-west-1')
+            self.assertEqual(configured.meta.config.max_pool_connections, 4)
+        finally:
+            S3Utility.region_name = None
+            S3Utility.configure(max_pool_connections=32)
+
+    @mock_aws
+    def test_transfer_config_from_config(self):
+        S3Utility.from_config({'aws': {'s3_transfer': {'multipart_chunksize': 5 * 1024 * 1024, 'max_concurrency': 1}}})
+        try:
+            transfer_config = S3Utility.transfer_config()
+            self.assertEqual(transfer_config.multipart_chunksize, 5 * 1024 * 1024)
+            self.assertEqual(transfer_config.max_request_concurrency, 1)
+            self.assertFalse(transfer_config.use_threads)
+        finally:
+            S3Utility.configure(multipart_chunksize=8 * 1024 * 1024, max_concurrency=10)
+
+    @mock_aws
+    def test_multipart_buffer_round_trip(self):
+        S3Utility.configure(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024)
+        try:
+            body = b'x' * (6 * 1024 * 1024)
+            S3Utility.upload_buffer_s3(self.bucket, self.test_key, body)
+            etag = self.s3_client.head_object(Bucket=self.bucket, Key=self.test_key)['ETag']
+            self.assertTrue(etag.strip('"').endswith('-2'))  # Two parts
+            self.assertEqual(S3Utility.download_buffer_s3(self.bucket, self.test_key), body)
+        finally:
+            S3Utility.configure(multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024)
+
+    @mock_aws
+    def test_upload_and_download_many(self):
+        objects = {f'{self.prefix}/batch/{i}.csv': f'body {i}' for i in range(5)}
+        result = S3Utility.upload_many(self.bucket, objects)
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(result.succeeded), sorted(objects))
+
+        missing = f'{self.prefix}/batch/missing.csv'
+        result = S3Utility.download_many(self.bucket, list(objects) + [missing])
+        self.assertEqual(result.succeeded, {k: v.encode('utf-8') for k, v in objects.items()})
+        self.assertEqual(list(result.failed), [missing])
+        with self.assertRaises(Exception):
+            result.raise_for_failures()
+
+    @mock_aws
+    def test_set_client(self):
+        S3Utility.set_client(self.s3_client)
+        self.s3_client.put_object(Bucket=self.bucket, Key=self.test_key, Body=b'x')
+        self.assertEqual(S3Utility.download_obj_s3(self.bucket, self.test_key), b'x')
+
 if __name__ == '__main__':
     unittest.main()
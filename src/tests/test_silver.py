@@ -0,0 +1,135 @@
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from layers.silver.processor import SilverProcessor, parse_periods, workbook_to_long, find_unit, upsert_rows
+from layers.silver.ledger import SilverLedger
+
+def grid(rows):
+    return pd.DataFrame(rows, dtype=object).replace({None: np.nan})
+
+class TestParsePeriods(unittest.TestCase):
+
+    def test_formats(self):
+        values = pd.Series(['2024.01', '2024-2', '2024年3月', 2024.1, 2023, pd.Timestamp('2024-05-17'), 'Item', 2024.45],
+                           dtype=object)
+        expected = ['2024-01-01', '2024-02-01', '2024-03-01', '2024-10-01', '2023-01-01', '2024-05-01', None, None]
+        pd.testing.assert_series_equal(parse_periods(values), pd.Series(pd.to_datetime(expected)).astype('datetime64[ns]'),
+                                       check_names=False)
+        self.assertTrue(parse_periods(values, numeric=False)[[3, 4]].isna().all())
+
+
+class TestWorkbookToLong(unittest.TestCase):
+
+    def test_monthly_columns(self):
+        df = workbook_to_long(grid([
+            ['Money Supply', None, None, None],
+            ['Unit: 100 million Yuan', None, None, None],
+            [None, 'Item', '2024.01', '2024.02'],
+            [None, 'Money and quasi-money (M2)', 2976250.1, 2992100.4],
+            [None, 'Money (M1)', 659975.3, '--'],
+        ]), 'money_supply')
+        self.assertEqual(list(df.columns), ['table', 'series', 'period', 'value', 'unit', 'year'])
+        self.assertEqual(len(df), 3)  # '--' is dropped
+        self.assertEqual(df['unit'].iloc[0], '100 million Yuan')
+        self.assertEqual(str(df['series'].dtype), 'category')
+        m2 = df[df['series'] == 'Money and quasi-money (M2)']
+        self.assertEqual(list(m2['period']), list(pd.to_datetime(['2024-01-01', '2024-02-01'])))
+
+    def test_merged_year_header(self):
+        df = workbook_to_long(grid([
+            ['Item', 2023, None, 2024, None],
+            [None, 11, 12, 1, 2],
+            ['Reserve Money', 1.0, 2.0, 3.0, 4.0],
+        ]), 'reserve_money')
+        self.assertEqual(list(df['period'].dt.strftime('%Y-%m')), ['2023-11', '2023-12', '2024-01', '2024-02'])
+        self.assertEqual(list(df['year']), [2023, 2023, 2024, 2024])
+
+    def test_periods_down_rows(self):
+        df = workbook_to_long(grid([
+            ['Period', 'Exchange rate', 'Reserves'],
+            ['2024.01', 7.1, 3.2],
+            ['2024.02', 7.2, 3.3],
+            ['2024.03', 7.3, 3.4],
+        ]), 'rates')
+        self.assertEqual(sorted(df['series'].unique()), ['Exchange rate', 'Reserves'])
+        self.assertEqual(len(df), 6)
+
+    def test_year_like_values_are_not_periods(self):
+        df = workbook_to_long(grid([
+            ['Item', '2024.01', '2024.02'],
+            ['Gold reserves', 2012.05, 2013.4],
+            ['Silver reserves', 2010.1, 2011.3],
+            ['Platinum reserves', 2010.5, 2010.6],
+        ]), 'reserves')
+        self.assertEqual(sorted(df['series'].unique()), ['Gold reserves', 'Platinum reserves', 'Silver reserves'])
+        self.assertEqual(df.loc[df['series'] == 'Gold reserves', 'value'].tolist(), [2012.05, 2013.4])
+
+    def test_no_header_raises(self):
+        with self.assertRaises(ValueError):
+            workbook_to_long(grid([['a', 'b'], ['c', 1]]), 'bad')
+
+    def test_find_unit(self):
+        self.assertEqual(find_unit(grid([['Unit：%'], [1]])), '%')
+        self.assertIsNone(find_unit(grid([['x'], [1]])))
+
+
+class TestSilverPartitions(unittest.TestCase):
+
+    def test_partition_round_trip(self):
+        df = workbook_to_long(grid([
+            ['Item', '2023.12', '2024.01'],
+            ['M2', 1.0, 2.0],
+        ]), 'money_supply')
+        partitions = SilverProcessor('bucket', 'silver/').to_partitions(df)
+        self.assertEqual(sorted(partitions), ['silver/table=money_supply/year=2023/part-0.parquet',
+                                              'silver/table=money_supply/year=2024/part-0.parquet'])
+        part = pd.read_parquet(io.BytesIO(partitions['silver/table=money_supply/year=2024/part-0.parquet']))
+        self.assertEqual(list(part.columns), ['series', 'period', 'value', 'unit'])
+        self.assertEqual(part['value'].tolist(), [2.0])
+
+    def test_full_rebuild_deletes_stale_partitions(self):
+        import boto3
+        from moto import mock_aws
+        from common.s3_utils import S3Utility
+
+        with mock_aws():
+            boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='bucket')
+            S3Utility.set_client(None)
+            try:
+                processor = SilverProcessor('bucket', 'silver/')
+                processor.write(workbook_to_long(grid([['Item', '2022.12', '2023.12', '2024.01'], ['M2', 1.0, 2.0, 3.0]]),
+                                                 'money_supply'))
+                processor.write(workbook_to_long(grid([['Item', '2022.12', '2022.11'], ['M1', 1.0, 2.0]]), 'money_stock'))
+                written = processor.replace(
+                    workbook_to_long(grid([['Item', '2023.12', '2024.01'], ['M2', 2.5, 3.0]]), 'money_supply'), 'money_supply')
+                self.assertEqual(sorted(processor.partition_years('money_supply')), [2023, 2024])
+                self.assertEqual(sorted(processor.partition_years('money_supply').values()), sorted(written))
+                self.assertEqual(sorted(processor.partition_years('money_stock')), [2022])
+            finally:
+                S3Utility.set_client(None)
+
+class TestIncrementalSilver(unittest.TestCase):
+
+    def test_upsert_rows(self):
+        existing = workbook_to_long(grid([['Item', '2024.01', '2024.02'], ['M1', 1.0, 2.0], ['M2', 5.0, 6.0]]), 'money_supply')
+        new = workbook_to_long(grid([['Item', '2024.02', '2024.03'], ['M1', 2.5, 3.0]]), 'money_supply')
+        merged = upsert_rows(existing, new)
+        m1 = merged[merged['series'] == 'M1'].sort_values('period')
+        self.assertEqual(m1['value'].tolist(), [1.0, 2.5, 3.0])
+        self.assertEqual(len(merged[merged['series'] == 'M2']), 2)
+        self.assertEqual(str(merged['series'].dtype), 'category')
+
+    def test_ledger_only_reprocesses_changed_tables(self):
+        ledger = SilverLedger()
+        sources = {'money_supply': {'key': 'bronze/money_supply_20240701.xlsx', 'hash': 'aaa'},
+                   'reserve_money': {'key': 'bronze/reserve_money_20240701.xlsx', 'hash': 'bbb'}}
+        self.assertEqual(ledger.stale(sources), ['money_supply', 'reserve_money'])
+        ledger.record('money_supply', 'bronze/money_supply_20240701.xlsx', 'aaa', ['p1'])
+        ledger.record('reserve_money', 'bronze/reserve_money_20240701.xlsx', 'bbb', ['p2'])
+        sources['reserve_money']['hash'] = 'ccc'
+        restored = SilverLedger.from_json(ledger.to_json())
+        self.assertEqual(restored.stale(sources), ['reserve_money'])
+
+if __name__ == '__main__':
+    unittest.main()